@@ -0,0 +1,160 @@
+"""
+Translator throughput benchmarks on a synthetic VM workload.
+
+    python -m benchmarks.bench_translator --scale large --output results.json
+    python -m benchmarks.bench_translator --compare results.json
+
+Every benchmark runs in a fresh interpreter so peak RSS is per benchmark.
+"""
+
+import argparse
+import json
+import platform
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from multiprocessing import get_context
+from pathlib import Path
+
+from benchmarks.workload import SCALES, WorkloadGenerator
+from vm_translator.code_writer import CodeWriter, SNIPPET_CACHE_SIZE
+from vm_translator.parser import Parser
+from vm_translator.VMTranslator import Compiler
+
+
+def bench_parser(project_dir: Path, output_dir: Path):
+    vm_files = sorted(project_dir.glob("*.vm"))
+    start = time.perf_counter()
+    for vm_file in vm_files:
+        for _ in Parser(vm_file):
+            pass
+    return 0, time.perf_counter() - start
+
+
+def bench_code_writer(
+    project_dir: Path, output_dir: Path, snippet_cache_size=SNIPPET_CACHE_SIZE
+):
+    parsed_files = [
+        (vm_file.name, list(Parser(vm_file)))
+        for vm_file in sorted(project_dir.glob("*.vm"))
+    ]
+    asm_file_path = output_dir / "code_writer.asm"
+    start = time.perf_counter()
+    writer = CodeWriter(asm_file_path, True, snippet_cache_size=snippet_cache_size)
+    for file_name, cmds in parsed_files:
+        writer.file_name = file_name
+        for cmd in cmds:
+            writer.write_cmd(cmd)
+    writer.close_file()
+    return asm_file_path.stat().st_size, time.perf_counter() - start
+
+
+def bench_code_writer_without_memo(project_dir: Path, output_dir: Path):
+    return bench_code_writer(project_dir, output_dir, snippet_cache_size=0)
+
+
+def bench_end_to_end(project_dir: Path, output_dir: Path):
+    asm_file_path = output_dir / "end_to_end.asm"
+    start = time.perf_counter()
+    Compiler(project_dir, asm_file_path, rom_budget=None).compile_and_write_asm()
+    return asm_file_path.stat().st_size, time.perf_counter() - start
+
+
+BENCHMARKS = {
+    "parser": bench_parser,
+    "code_writer": bench_code_writer,
+    "code_writer_no_memo": bench_code_writer_without_memo,
+    "end_to_end": bench_end_to_end,
+}
+
+
+def _run_in_child(name: str, project_dir: Path, output_dir: Path) -> dict:
+    output_bytes, seconds = BENCHMARKS[name](project_dir, output_dir)
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        peak_rss //= 1024
+    return {"seconds": seconds, "peak_rss_kb": peak_rss, "output_bytes": output_bytes}
+
+
+def run_benchmark(name: str, project_dir: Path, lines: int, repeat: int) -> dict:
+    runs = []
+    with tempfile.TemporaryDirectory() as output_dir:
+        for _ in range(repeat):
+            with ProcessPoolExecutor(1, mp_context=get_context("spawn")) as executor:
+                runs.append(
+                    executor.submit(
+                        _run_in_child, name, project_dir, Path(output_dir)
+                    ).result()
+                )
+    best = min(runs, key=lambda run: run["seconds"])
+    return {
+        **best,
+        "lines_per_sec": lines / best["seconds"],
+        "peak_rss_kb": max(run["peak_rss_kb"] for run in runs),
+        "all_seconds": [run["seconds"] for run in runs],
+    }
+
+
+def run_suite(scale: str, repeat: int, names=None) -> dict:
+    spec = SCALES[scale]
+    with tempfile.TemporaryDirectory() as project_dir:
+        project_dir = Path(project_dir)
+        lines = WorkloadGenerator(spec).write(project_dir)
+        results = {
+            name: run_benchmark(name, project_dir, lines, repeat)
+            for name in names or BENCHMARKS
+        }
+    return {
+        "meta": {
+            "date": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "scale": scale,
+            "workload": spec.__dict__,
+            "vm_lines": lines,
+            "repeat": repeat,
+        },
+        "benchmarks": results,
+    }
+
+
+def format_results(results: dict, previous: dict = None) -> str:
+    lines = [
+        f"{results['meta']['vm_lines']} VM lines ({results['meta']['scale']})",
+        f"{'benchmark':<20}{'seconds':>10}{'lines/sec':>14}{'peak RSS KB':>14}"
+        f"{'output bytes':>14}{'speedup':>10}",
+    ]
+    if previous and previous["meta"]["scale"] != results["meta"]["scale"]:
+        lines.append(f"not comparable with {previous['meta']['scale']} results")
+        previous = None
+    for name, result in results["benchmarks"].items():
+        speedup = ""
+        previous_result = (previous or {}).get("benchmarks", {}).get(name)
+        if previous_result:
+            speedup = f"{previous_result['seconds'] / result['seconds']:.2f}x"
+        lines.append(
+            f"{name:<20}{result['seconds']:>10.3f}{result['lines_per_sec']:>14.0f}"
+            f"{result['peak_rss_kb']:>14}{result['output_bytes']:>14}{speedup:>10}"
+        )
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument("--scale", choices=SCALES, default="large")
+    arg_parser.add_argument("--repeat", type=int, default=3)
+    arg_parser.add_argument("--benchmark", action="append", choices=BENCHMARKS)
+    arg_parser.add_argument("--output", type=Path, help="save results as JSON")
+    arg_parser.add_argument(
+        "--compare", type=Path, help="JSON results of a previous run to compare with"
+    )
+    args = arg_parser.parse_args()
+
+    suite_results = run_suite(args.scale, args.repeat, args.benchmark)
+    previous_results = json.loads(args.compare.read_text()) if args.compare else None
+    print(format_results(suite_results, previous_results))
+    if args.output:
+        args.output.write_text(json.dumps(suite_results, indent=2) + "\n")
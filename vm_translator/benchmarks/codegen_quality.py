@@ -0,0 +1,187 @@
+"""
+Generated code quality gate: static ROM words per VM command type and
+dynamic cycles of every sample program, compared against stored baselines.
+
+    python -m benchmarks.codegen_quality            # fails on regressions
+    python -m benchmarks.codegen_quality --update   # accept current numbers
+"""
+
+import argparse
+import json
+import sys
+import tempfile
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from benchmarks.workload import SCALES, WorkloadGenerator
+from vm_translator.assembler import AsmProgram
+from vm_translator.emulator import Emulator
+from vm_translator.VMTranslator import Compiler
+
+RESOURCE_DIR = Path(__file__).parent.parent / "tests" / "resources"
+BASELINE_PATH = Path(__file__).parent / "baselines" / "codegen_quality.json"
+DEFAULT_THRESHOLD = 0.01
+MAX_CYCLES = 1_000_000
+
+
+@dataclass(frozen=True)
+class Sample:
+    """
+    Program translated by the gate, ram is the initial RAM of the test script
+    of the program, samples without ram are only measured statically.
+    """
+
+    name: str
+    vm_path: Path = None
+    ram: dict = field(default=None, hash=False)
+    workload_scale: str = None
+
+
+SAMPLES = (
+    Sample("SimpleAdd", RESOURCE_DIR / "SimpleAdd.vm", {0: 256}),
+    Sample("PointerTest", RESOURCE_DIR / "PointerTest.vm", {0: 256}),
+    Sample(
+        "BasicLoop",
+        RESOURCE_DIR / "BasicLoop.vm",
+        {0: 256, 1: 300, 2: 400, 400: 3},
+    ),
+    Sample(
+        "FibonacciSeries",
+        RESOURCE_DIR / "FibonacciSeries.vm",
+        {0: 256, 1: 300, 2: 400, 400: 6, 401: 3000},
+    ),
+    Sample(
+        "SimpleFunction",
+        RESOURCE_DIR / "SimpleFunction.vm",
+        {
+            0: 317,
+            1: 317,
+            2: 310,
+            3: 3000,
+            4: 4000,
+            310: 1234,
+            311: 37,
+            312: 1000,
+            313: 305,
+            314: 300,
+            315: 3010,
+            316: 4010,
+        },
+    ),
+    Sample("NestedCall", RESOURCE_DIR / "nested_call", {}),
+    Sample("SyntheticSmall", workload_scale="small"),
+)
+CONFIGURATIONS = {
+    "default": {},
+    "size": {"optimize_size": True},
+}
+
+
+def measure_sample(sample: Sample, configuration: str, work_dir: Path) -> dict:
+    vm_path = sample.vm_path
+    if sample.workload_scale:
+        vm_path = work_dir / sample.name
+        if not vm_path.exists():
+            WorkloadGenerator(SCALES[sample.workload_scale]).write(vm_path)
+    asm_file_path = work_dir / f"{sample.name}.{configuration}.asm"
+    compiler = Compiler(
+        vm_path, asm_file_path, rom_budget=None, **CONFIGURATIONS[configuration]
+    )
+    compiler.compile_and_write_asm()
+    metrics = {
+        "rom_total": compiler.code_size.total,
+        "rom_by_kind": dict(sorted(compiler.code_size.by_kind.items())),
+    }
+    if sample.ram is not None:
+        emulator = Emulator(AsmProgram.from_file(asm_file_path), sample.ram)
+        metrics["cycles"] = emulator.run(MAX_CYCLES)
+    return metrics
+
+
+def measure_all(samples=SAMPLES, configurations=CONFIGURATIONS) -> dict:
+    results = {}
+    with tempfile.TemporaryDirectory() as work_dir:
+        for sample in samples:
+            for configuration in configurations:
+                results[f"{sample.name}/{configuration}"] = measure_sample(
+                    sample, configuration, Path(work_dir)
+                )
+    return results
+
+
+def find_regressions(
+    baseline: dict, current: dict, threshold: float = DEFAULT_THRESHOLD
+) -> list:
+    regressions = []
+    for name, baseline_metrics in baseline.items():
+        metrics = current.get(name)
+        if metrics is None:
+            regressions.append(f"{name}: sample is missing")
+            continue
+        for metric, baseline_value, value in _compared_values(
+            baseline_metrics, metrics
+        ):
+            if value > baseline_value * (1 + threshold):
+                regressions.append(
+                    f"{name}: {metric} grew from {baseline_value} to {value}"
+                )
+    return regressions
+
+
+def find_improvements(baseline: dict, current: dict) -> list:
+    improvements = []
+    for name, baseline_metrics in baseline.items():
+        for metric, baseline_value, value in _compared_values(
+            baseline_metrics, current.get(name, {})
+        ):
+            if value < baseline_value:
+                improvements.append(
+                    f"{name}: {metric} dropped from {baseline_value} to {value}"
+                )
+    return improvements
+
+
+def _compared_values(baseline_metrics: dict, metrics: dict):
+    for metric in ("rom_total", "cycles"):
+        if metric in baseline_metrics and metric in metrics:
+            yield metric, baseline_metrics[metric], metrics[metric]
+    baseline_kinds = baseline_metrics.get("rom_by_kind", {})
+    kinds = metrics.get("rom_by_kind", {})
+    for kind in sorted(set(baseline_kinds) | set(kinds)):
+        yield f"rom[{kind}]", baseline_kinds.get(kind, 0), kinds.get(kind, 0)
+
+
+def load_baseline(baseline_path: Path = BASELINE_PATH) -> dict:
+    return json.loads(baseline_path.read_text())
+
+
+def save_baseline(results: dict, baseline_path: Path = BASELINE_PATH):
+    baseline_path.parent.mkdir(parents=True, exist_ok=True)
+    baseline_path.write_text(json.dumps(results, indent=2, sort_keys=True) + "\n")
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    arg_parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    arg_parser.add_argument(
+        "--update", action="store_true", help="store current numbers as the baseline"
+    )
+    args = arg_parser.parse_args()
+
+    current_results = measure_all()
+    if args.update:
+        save_baseline(current_results, args.baseline)
+        print(f"Baseline saved to {args.baseline}")
+        sys.exit(0)
+    baseline_results = load_baseline(args.baseline)
+    for improvement in find_improvements(baseline_results, current_results):
+        print(f"improved  {improvement}")
+    found_regressions = find_regressions(
+        baseline_results, current_results, args.threshold
+    )
+    for regression in found_regressions:
+        print(f"REGRESSED {regression}")
+    if found_regressions:
+        sys.exit(1)
+    print(f"{len(current_results)} samples within {args.threshold:.1%} of the baseline")
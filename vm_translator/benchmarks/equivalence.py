@@ -0,0 +1,882 @@
+"""
+Differential equivalence harness: every program is translated with the
+baseline code generation and with every optimization mode, run in the
+emulator from the same initial RAM and the observable final states are
+compared. Failing random programs are shrunk to a minimal reproducer.
+
+    python -m benchmarks.equivalence                    # resources + 200 random programs
+    python -m benchmarks.equivalence --random 1000 --seed 7 --mode size
+    python -m benchmarks.equivalence --python          # also the Python backend
+"""
+
+import argparse
+import bisect
+import io
+import random
+import sys
+from dataclasses import dataclass, field, replace
+from pathlib import Path
+
+from benchmarks.codegen_quality import SAMPLES
+from vm_translator.assembler import AsmProgram
+from vm_translator.code_writer import COMPACT_SHAPE, FAST_SHAPE, CodeShape, CodeWriter
+from vm_translator.context import RETURN_VARIABLES
+from vm_translator.emulator import WORD_MASK, Emulator
+from vm_translator.frames import FRAME_SLOT_PREFIX
+from vm_translator.parser import Parser
+from vm_translator.python_backend import (
+    PythonExecutor,
+    translate_to_python,
+)
+from vm_translator.sinks import MemorySink
+from vm_translator.symbols import SymbolShortener
+from vm_translator.VMTranslator import Compiler
+
+MAX_CYCLES = 2_000_000
+STACK_BASE_ADDRESS = 256
+HEAP_BASE_ADDRESS = 2048
+HEAP_END_ADDRESS = 16384
+# THIS, THAT and temp: SP, LCL and ARG depend on the frame sizes, which are
+# compared through the live frames, R13-R15 are scratch registers
+OBSERVED_REGISTERS = range(3, 13)
+# divisors of the random Math.divide calls, the library handles y <= 16384
+DIVISORS = (1, 2, 3, 4, 8, 16, 32, 256, 1024, 16384)
+# Math.multiply and Math.divide of the random programs with the semantics
+# of the Jack OS: 16 bit products and quotients rounded towards zero
+MATH_VM = """
+function Math.multiply 3
+push constant 1
+pop local 1
+push argument 0
+pop local 2
+label Math.multiply$LOOP
+push local 1
+push constant 0
+eq
+if-goto Math.multiply$END
+push argument 1
+push local 1
+and
+push constant 0
+eq
+if-goto Math.multiply$SKIP
+push local 0
+push local 2
+add
+pop local 0
+label Math.multiply$SKIP
+push local 2
+push local 2
+add
+pop local 2
+push local 1
+push local 1
+add
+pop local 1
+goto Math.multiply$LOOP
+label Math.multiply$END
+push local 0
+return
+function Math.divide 4
+push argument 0
+pop local 2
+push argument 0
+push constant 0
+lt
+if-goto Math.divide$NEGATIVE
+goto Math.divide$START
+label Math.divide$NEGATIVE
+push argument 0
+neg
+pop local 2
+label Math.divide$START
+push constant 16
+pop local 3
+label Math.divide$LOOP
+push local 3
+push constant 0
+eq
+if-goto Math.divide$END
+push local 1
+push local 1
+add
+push local 2
+push constant 0
+lt
+sub
+pop local 1
+push local 2
+push local 2
+add
+pop local 2
+push local 0
+push local 0
+add
+pop local 0
+push local 1
+push argument 1
+lt
+if-goto Math.divide$NEXT
+push local 1
+push argument 1
+sub
+pop local 1
+push local 0
+push constant 1
+add
+pop local 0
+label Math.divide$NEXT
+push local 3
+push constant 1
+sub
+pop local 3
+goto Math.divide$LOOP
+label Math.divide$END
+push argument 0
+push constant 0
+lt
+if-goto Math.divide$NEGATE
+push local 0
+return
+label Math.divide$NEGATE
+push local 0
+neg
+return
+"""
+# strings of the random programs: [length, capacity, characters...] from
+# RAM 7000 on, allocated by bumping static 0
+STRING_HEAP_ADDRESS = 7000
+STRING_VM = f"""
+function String.new 1
+push constant {STRING_HEAP_ADDRESS}
+push static 0
+add
+pop local 0
+push local 0
+pop pointer 0
+push constant 0
+pop this 0
+push argument 0
+pop this 1
+push static 0
+push argument 0
+add
+push constant 2
+add
+pop static 0
+push local 0
+return
+function String.appendChar 0
+push argument 0
+pop pointer 0
+push this 0
+push constant 2
+add
+push argument 0
+add
+pop pointer 1
+push argument 1
+pop that 0
+push this 0
+push constant 1
+add
+pop this 0
+push argument 0
+return
+"""
+STRING_LITERALS = ("x", "Hi", "Hello, world", "Score: ", "{0}")
+
+
+@dataclass(frozen=True)
+class Mode:
+    """
+    Code generation options of one translation:
+    - default_shape, mixed_shapes: CodeShape of the functions, mixed_shapes
+      makes every other function compact like a profile guided plan
+    - allocate_statics, short_labels: see CodeWriter and SymbolShortener
+    - static_frames: see frames.plan_static_frames
+    - strength_reduction: see strength.reduce_strength
+    - pool_strings: see literals.pool_string_literals
+    - fuse_arrays: see fusion.fuse_array_access
+    """
+
+    default_shape: CodeShape = FAST_SHAPE
+    mixed_shapes: bool = False
+    allocate_statics: bool = False
+    short_labels: bool = False
+    static_frames: bool = False
+    strength_reduction: bool = False
+    pool_strings: bool = False
+    fuse_arrays: bool = False
+
+
+BASELINE = Mode()
+MODES = {
+    "size": Mode(COMPACT_SHAPE),
+    "mixed_shapes": Mode(mixed_shapes=True),
+    "allocated_statics": Mode(allocate_statics=True),
+    "short_labels": Mode(short_labels=True),
+    "static_frames": Mode(static_frames=True),
+    "strength_reduction": Mode(strength_reduction=True),
+    "pool_strings": Mode(pool_strings=True),
+    "fused_arrays": Mode(fuse_arrays=True),
+    "all": Mode(
+        COMPACT_SHAPE,
+        allocate_statics=True,
+        short_labels=True,
+        static_frames=True,
+        strength_reduction=True,
+        pool_strings=True,
+        fuse_arrays=True,
+    ),
+}
+
+
+@dataclass
+class Program:
+    """
+    VM sources {file name: code} translated together, with the initial RAM
+    of the run. Without bootstrap the RAM has to set up the segments.
+    """
+
+    name: str
+    sources: dict
+    bootstrap: bool = True
+    ram: dict = field(default_factory=dict)
+
+
+@dataclass
+class Build:
+    """
+    Assembled program, the RAM address of every static and the entry
+    address -> number of locals on the stack of every function.
+    """
+
+    program: AsmProgram
+    statics: dict
+    stack_locals: dict = field(default_factory=dict)
+
+    def stack_locals_at(self, code_address: int) -> int:
+        """
+        Locals on the stack of the function containing code_address.
+        """
+        if code_address >= len(self.program.instructions):
+            return 0
+        entries = sorted(self.stack_locals)
+        position = bisect.bisect_right(entries, code_address)
+        return self.stack_locals[entries[position - 1]] if position else 0
+
+
+class ProgramCompiler(Compiler):
+    """
+    Compiler of the in-memory sources of a Program with the options of a Mode.
+    """
+
+    def __init__(self, program: Program, mode: Mode):
+        self.memory_sink = MemorySink()
+        super().__init__(
+            Path(program.name),
+            Path(f"{program.name}.asm"),
+            sink=self.memory_sink,
+            symbol_shortener=SymbolShortener() if mode.short_labels else None,
+            allocate_statics=mode.allocate_statics,
+            static_frames=mode.static_frames,
+            strength_reduction=mode.strength_reduction,
+            pool_strings=mode.pool_strings,
+            fuse_arrays=mode.fuse_arrays,
+        )
+        self.is_dir = False
+        self.program = program
+        self.mode = mode
+
+    def compile_program(self) -> CodeWriter:
+        writer = self._create_writer(self.program.bootstrap)
+        for file_name, code in self.program.sources.items():
+            writer.begin_file(file_name)
+            for cmd in self._optimize(Parser(io.StringIO(code)), self.reduced_calls):
+                writer.write_cmd(cmd)
+        writer.close_file()
+        return writer
+
+    def _code_shapes(self, write_header) -> dict:
+        function_shapes = {}
+        if self.mode.mixed_shapes:
+            functions = [
+                cmd.arg_1 for cmd in self._iter_cmds() if cmd.cmd_type == "C_FUNCTION"
+            ]
+            function_shapes = dict.fromkeys(functions[::2], COMPACT_SHAPE)
+        return {
+            "default_shape": self.mode.default_shape,
+            "function_shapes": function_shapes,
+        }
+
+    def _iter_cmds(self):
+        for code in self.program.sources.values():
+            yield from Parser(io.StringIO(code))
+
+
+def translate_program(program: Program, mode: Mode) -> Build:
+    """
+    Returns the assembled program and the RAM address of every static.
+    """
+    compiler = ProgramCompiler(program, mode)
+    writer = compiler.compile_program()
+    asm_program = AsmProgram.from_lines(compiler.memory_sink.getvalue().splitlines())
+    return Build(
+        asm_program,
+        _static_addresses(writer, asm_program, compiler.symbol_shortener),
+        _stack_locals(compiler, writer, asm_program),
+    )
+
+
+def _static_addresses(
+    writer: CodeWriter, asm_program: AsmProgram, shortener: SymbolShortener
+) -> dict:
+    statics = {}
+    for symbol, address in writer.context.statics.addresses.items():
+        if symbol in RETURN_VARIABLES or symbol.startswith(FRAME_SLOT_PREFIX):
+            continue
+        if not writer.allocate_statics:
+            name = shortener.names[symbol] if shortener else symbol
+            address = asm_program.symbols[name]
+        statics[symbol] = address
+    return statics
+
+
+def _stack_locals(
+    compiler: ProgramCompiler, writer: CodeWriter, asm_program: AsmProgram
+) -> dict:
+    shortener = compiler.symbol_shortener
+    stack_locals = {}
+    for cmd in compiler._iter_cmds():
+        if cmd.cmd_type != "C_FUNCTION":
+            continue
+        label = shortener.names[cmd.arg_1] if shortener else cmd.arg_1
+        stack_locals[asm_program.labels[label]] = (
+            0 if cmd.arg_1 in writer.static_frames else cmd.arg_2
+        )
+    return stack_locals
+
+
+def run_program(program: Program, mode: Mode, max_cycles: int = MAX_CYCLES) -> dict:
+    """
+    Observable final state: halting, registers, live frames, heap and statics.
+    """
+    build = translate_program(program, mode)
+    emulator = Emulator(build.program, program.ram)
+    emulator.run(max_cycles)
+    ram = emulator.ram
+    return {
+        "halted": emulator.halted,
+        "registers": [ram[address] for address in OBSERVED_REGISTERS],
+        "stack": _frame_values(ram, emulator.pc, build.stack_locals_at),
+        "heap": ram[HEAP_BASE_ADDRESS:HEAP_END_ADDRESS],
+        "statics": {symbol: ram[address] for symbol, address in build.statics.items()},
+    }
+
+
+def run_python_program(program: Program, max_steps: int = MAX_CYCLES) -> dict:
+    """
+    Observable final state of the run with the Python backend, the return
+    addresses of its frames are call site numbers.
+    """
+    python_program = translate_to_python(
+        {
+            file_name: Parser(io.StringIO(code))
+            for file_name, code in program.sources.items()
+        },
+        program.bootstrap,
+    )
+    executor = PythonExecutor(python_program, program.ram)
+    executor.run(max_steps)
+    ram = [value & WORD_MASK for value in executor.ram]
+
+    def stack_locals_at(call_site: int) -> int:
+        if call_site == _HALTED_FUNCTION:
+            function = executor.halted_in
+        elif call_site < len(python_program.return_sites):
+            function = python_program.return_sites[call_site]
+        else:
+            function = None
+        return python_program.n_locals.get(function, 0)
+
+    return {
+        "halted": executor.halted,
+        "registers": [ram[address] for address in OBSERVED_REGISTERS],
+        "stack": _frame_values(ram, _HALTED_FUNCTION, stack_locals_at),
+        "heap": ram[HEAP_BASE_ADDRESS:HEAP_END_ADDRESS],
+        "statics": {
+            symbol: ram[address] for symbol, address in python_program.statics.items()
+        },
+    }
+
+
+# code address of the innermost frame of a Python backend run
+_HALTED_FUNCTION = -1
+
+
+def _frame_values(ram: list, code_address: int, stack_locals_at) -> list:
+    """
+    Values pushed in every live frame from the innermost one, the frames
+    are found by following the saved LCL of every frame. Saved return
+    addresses and pointers depend on the code layout and locals may live
+    in static frames, so a frame's values are the ones above its locals.
+    code_address is in the innermost function, stack_locals_at tells the
+    number of locals on the stack of the function at a code address.
+    """
+    frames = []
+    top, frame = max(ram[0], STACK_BASE_ADDRESS), ram[1]
+    while STACK_BASE_ADDRESS + 5 <= frame <= top and len(frames) < ram[0]:
+        frames.append(ram[frame + stack_locals_at(code_address) : top])
+        code_address, top, frame = ram[frame - 5], frame - 5, ram[frame - 4]
+    frames.append(ram[STACK_BASE_ADDRESS:top])
+    return frames
+
+
+def compare_states(expected: dict, actual: dict) -> list:
+    differences = []
+    for part in ("halted", "registers", "stack", "statics"):
+        if expected[part] != actual[part]:
+            differences.append(f"{part}: {expected[part]} != {actual[part]}")
+    if expected["heap"] != actual["heap"]:
+        address = next(
+            HEAP_BASE_ADDRESS + offset
+            for offset, (value, other) in enumerate(
+                zip(expected["heap"], actual["heap"])
+            )
+            if value != other
+        )
+        differences.append(f"heap differs first at RAM[{address}]")
+    return differences
+
+
+def check_program(program: Program, modes: dict = None) -> dict:
+    """
+    Returns {mode name: differences from the baseline} of the failing modes.
+    """
+    expected = run_program(program, BASELINE)
+    if not expected["halted"]:
+        return {"baseline": [f"does not halt within {MAX_CYCLES} cycles"]}
+    failures = {}
+    for name, mode in (modes or MODES).items():
+        try:
+            differences = compare_states(expected, run_program(program, mode))
+        except Exception as error:
+            differences = [f"{type(error).__name__}: {error}"]
+        if differences:
+            failures[name] = differences
+    return failures
+
+
+def check_python_backend(program: Program) -> list:
+    """
+    Returns the differences of the Python backend run from the baseline.
+    """
+    expected = run_program(program, BASELINE)
+    try:
+        return compare_states(expected, run_python_program(program))
+    except Exception as error:
+        return [f"{type(error).__name__}: {error}"]
+
+
+def resource_programs() -> list:
+    programs = []
+    for sample in SAMPLES:
+        if sample.ram is None:
+            continue
+        vm_files = (
+            sorted(sample.vm_path.glob("**/*.vm"))
+            if sample.vm_path.is_dir()
+            else [sample.vm_path]
+        )
+        programs.append(
+            Program(
+                sample.name,
+                {vm_file.name: vm_file.read_text() for vm_file in vm_files},
+                sample.vm_path.is_dir(),
+                sample.ram,
+            )
+        )
+    return programs
+
+
+@dataclass
+class RandomFunction:
+    name: str
+    n_args: int
+    n_locals: int
+    statements: list = field(default_factory=list)
+    result_local: int = 0
+    halts: bool = False
+
+    def lines(self) -> list:
+        ending = [f"push local {self.result_local}", "return"]
+        if self.halts:
+            ending = [f"label {self.name}$HALT", f"goto {self.name}$HALT"]
+        return [
+            f"function {self.name} {self.n_locals}",
+            "push constant 3000",
+            "pop pointer 0",
+            "push constant 4000",
+            "pop pointer 1",
+            *(line for statement in self.statements for line in statement),
+            *ending,
+        ]
+
+
+@dataclass
+class RandomProgram:
+    """
+    Files of RandomFunctions, a statement is a stack balanced list of VM lines,
+    so any of them can be removed while shrinking. The programs come with
+    the Math.vm and String.vm libraries.
+    """
+
+    files: dict
+    seed: int = None
+
+    def to_program(self) -> Program:
+        sources = {
+            file_name: "\n".join(
+                line for function in functions for line in function.lines()
+            )
+            + "\n"
+            for file_name, functions in self.files.items()
+        }
+        sources["Math.vm"] = MATH_VM
+        sources["String.vm"] = STRING_VM
+        return Program(f"Random{self.seed}", sources)
+
+    def statement_count(self) -> int:
+        return sum(
+            len(function.statements)
+            for functions in self.files.values()
+            for function in functions
+        )
+
+    def without_statements(self, start: int, count: int = 1) -> "RandomProgram":
+        """
+        Removes count statements from the start-th one, counted across functions.
+        """
+        files = {}
+        for file_name, functions in self.files.items():
+            files[file_name] = []
+            for function in functions:
+                statements = [
+                    statement
+                    for position, statement in enumerate(function.statements, -start)
+                    if not 0 <= position < count
+                ]
+                start -= len(function.statements)
+                files[file_name].append(replace(function, statements=statements))
+        return RandomProgram(files, self.seed)
+
+
+class RandomProgramGenerator:
+    """
+    Small terminating VM programs: calls only go to functions defined later
+    (no recursion), loops count the last local down from a small constant,
+    this and that point into the heap and arrays are indexed with small
+    offsets. Functions return one of their other locals.
+    """
+
+    def __init__(self, seed: int, files: int = 2, functions_per_file: int = 3):
+        self.random = random.Random(seed)
+        self.seed = seed
+        self.files = files
+        self.functions_per_file = functions_per_file
+        self._labels = 0
+
+    def generate(self) -> RandomProgram:
+        functions = [
+            RandomFunction(
+                f"File{file_index}.f{function_index}",
+                self.random.randint(0, 3),
+                self.random.randint(2, 4),
+            )
+            for file_index in range(self.files)
+            for function_index in range(self.functions_per_file)
+        ]
+        for index, function in enumerate(functions):
+            function.result_local = self.random.randrange(function.n_locals - 1)
+            for _ in range(self.random.randint(2, 10)):
+                function.statements.append(
+                    self._statement(function, functions[index + 1 :])
+                )
+        entry = functions[0]
+        sys_init = RandomFunction("Sys.init", 0, 1, halts=True)
+        sys_init.statements = [
+            [f"push constant {self.random.randint(0, 99)}"] * entry.n_args
+            + [f"call {entry.name} {entry.n_args}", "pop static 0"],
+        ]
+        files = {"Sys.vm": [sys_init]}
+        for function in functions:
+            files.setdefault(f"{function.name.split('.')[0]}.vm", []).append(function)
+        return RandomProgram(files, self.seed)
+
+    def _statement(self, function: RandomFunction, callees: list) -> list:
+        kind = self.random.choices(
+            (
+                "binary",
+                "unary",
+                "comparison",
+                "array",
+                "if",
+                "loop",
+                "call",
+                "math",
+                "string",
+            ),
+            (30, 10, 12, 12, 10, 8, 18 if callees else 0, 10, 6),
+        )[0]
+        if kind == "binary":
+            return self._binary(function)
+        if kind == "unary":
+            return [
+                self._push(function),
+                self.random.choice(("neg", "not")),
+                self._pop(function),
+            ]
+        if kind == "comparison":
+            return [
+                self._push(function),
+                self._push(function),
+                self.random.choice(("eq", "gt", "lt")),
+                self._pop(function),
+            ]
+        if kind == "array":
+            return self._array(function)
+        if kind == "if":
+            true_label, end_label = self._label(), self._label()
+            return [
+                *self._condition(function, callees),
+                f"if-goto {true_label}",
+                *self._binary(function),
+                f"goto {end_label}",
+                f"label {true_label}",
+                *self._binary(function),
+                f"label {end_label}",
+            ]
+        if kind == "loop":
+            return self._loop(function)
+        if kind == "math":
+            return self._math(function)
+        if kind == "string":
+            return self._string(function)
+        callee = self.random.choice(callees)
+        return [
+            *(self._push(function) for _ in range(callee.n_args)),
+            f"call {callee.name} {callee.n_args}",
+            self._pop(function),
+        ]
+
+    def _condition(self, function: RandomFunction, callees: list) -> list:
+        """
+        A comparison or, sometimes, the result of a call.
+        """
+        if callees and self.random.random() < 0.3:
+            callee = self.random.choice(callees)
+            return [
+                *(self._push(function) for _ in range(callee.n_args)),
+                f"call {callee.name} {callee.n_args}",
+            ]
+        return [
+            self._push(function),
+            self._push(function),
+            self.random.choice(("eq", "gt", "lt")),
+        ]
+
+    def _binary(self, function: RandomFunction) -> list:
+        return [
+            self._push(function),
+            self._push(function),
+            self.random.choice(("add", "sub", "and", "or")),
+            self._pop(function),
+        ]
+
+    def _array(self, function: RandomFunction) -> list:
+        base = f"push constant {self.random.choice((5000, 6000))}"
+        index = f"push constant {self.random.randrange(16)}"
+        if self.random.random() < 0.5:
+            return [
+                base,
+                index,
+                "add",
+                "pop pointer 1",
+                "push that 0",
+                self._pop(function),
+            ]
+        return [
+            base,
+            index,
+            "add",
+            self._push(function),
+            "pop temp 0",
+            "pop pointer 1",
+            "push temp 0",
+            "pop that 0",
+        ]
+
+    def _math(self, function: RandomFunction) -> list:
+        operand = self._push(function)
+        if self.random.random() < 0.4:
+            divisor = self.random.choice(DIVISORS)
+            pushes = [operand, f"push constant {divisor}"]
+            call = "call Math.divide 2"
+        else:
+            pushes = [operand, self._push(function)]
+            self.random.shuffle(pushes)
+            call = "call Math.multiply 2"
+        return [*pushes, call, self._pop(function)]
+
+    def _string(self, function: RandomFunction) -> list:
+        text = self.random.choice(STRING_LITERALS)
+        lines = [f"push constant {len(text)}", "call String.new 1"]
+        for character in text:
+            lines += [f"push constant {ord(character)}", "call String.appendChar 2"]
+        return [*lines, self._pop(function)]
+
+    def _loop(self, function: RandomFunction) -> list:
+        start, end = self._label(), self._label()
+        counter = f"local {function.n_locals - 1}"
+        body = []
+        for _ in range(self.random.randint(1, 3)):
+            body += self._binary(function)
+        return [
+            f"push constant {self.random.randint(0, 5)}",
+            f"pop {counter}",
+            f"label {start}",
+            f"push {counter}",
+            "push constant 0",
+            "eq",
+            f"if-goto {end}",
+            *body,
+            f"push {counter}",
+            "push constant 1",
+            "sub",
+            f"pop {counter}",
+            f"goto {start}",
+            f"label {end}",
+        ]
+
+    def _push(self, function: RandomFunction) -> str:
+        segments = ["constant", "local", "static", "this", "that", "temp", "pointer"]
+        if function.n_args:
+            segments.append("argument")
+        segment = self.random.choice(segments)
+        return f"push {segment} {self._index(segment, function)}"
+
+    def _pop(self, function: RandomFunction) -> str:
+        segments = ["local", "static", "this", "that", "temp"]
+        if function.n_args:
+            segments.append("argument")
+        segment = self.random.choice(segments)
+        index = self._index(segment, function)
+        # the last local counts the loops
+        if segment == "local" and index == function.n_locals - 1:
+            index -= 1
+        return f"pop {segment} {index}"
+
+    def _index(self, segment: str, function: RandomFunction) -> int:
+        if segment == "constant":
+            return self.random.choice(
+                (0, 1, 2, 7, 255, 32767, self.random.randrange(32768))
+            )
+        if segment == "local":
+            return self.random.randrange(function.n_locals)
+        if segment == "argument":
+            return self.random.randrange(function.n_args)
+        if segment == "pointer":
+            return self.random.randrange(2)
+        if segment == "temp":
+            return self.random.randrange(8)
+        return self.random.randrange(6)
+
+    def _label(self) -> str:
+        self._labels += 1
+        return f"L{self._labels}"
+
+
+def shrink(random_program: RandomProgram, fails) -> RandomProgram:
+    """
+    Removes statements for as long as fails(program) stays true, in chunks
+    halved down to single statements (delta debugging).
+    """
+    chunk = max(1, random_program.statement_count() // 2)
+    while True:
+        shrunk = False
+        start = 0
+        while start < random_program.statement_count():
+            candidate = random_program.without_statements(start, chunk)
+            if fails(candidate.to_program()):
+                random_program, shrunk = candidate, True
+            else:
+                start += chunk
+        if chunk == 1 and not shrunk:
+            return random_program
+        chunk = max(1, chunk // 2)
+
+
+def check_random_programs(count: int, seed: int = 0, modes: dict = None) -> list:
+    """
+    Returns (shrunk program, failures) of every failing random program.
+    """
+    modes = modes or MODES
+    failing = []
+    for program_seed in range(seed, seed + count):
+        random_program = RandomProgramGenerator(program_seed).generate()
+        failures = check_program(random_program.to_program(), modes)
+        if not failures:
+            continue
+        failing_modes = {name: modes[name] for name in failures if name in modes}
+        if failing_modes:
+            random_program = shrink(
+                random_program,
+                lambda program: bool(check_program(program, failing_modes)),
+            )
+            failures = check_program(random_program.to_program(), failing_modes)
+        failing.append((random_program, failures))
+    return failing
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument("--random", type=int, default=200, help="random programs")
+    arg_parser.add_argument("--seed", type=int, default=0, help="first random seed")
+    arg_parser.add_argument("--mode", action="append", choices=MODES)
+    arg_parser.add_argument(
+        "--python", action="store_true", help="also check the Python backend"
+    )
+    args = arg_parser.parse_args()
+    checked_modes = {name: MODES[name] for name in args.mode or MODES}
+
+    failed = False
+    for resource_program in resource_programs():
+        for mode_name, mode_differences in check_program(
+            resource_program, checked_modes
+        ).items():
+            failed = True
+            print(f"FAIL {resource_program.name}/{mode_name}: {mode_differences}")
+    for shrunk_program, program_failures in check_random_programs(
+        args.random, args.seed, checked_modes
+    ):
+        failed = True
+        print(f"FAIL random seed {shrunk_program.seed}: {program_failures}")
+        for vm_file_name, vm_code in shrunk_program.to_program().sources.items():
+            print(f"// {vm_file_name}\n{vm_code}")
+    if args.python:
+        python_programs = resource_programs() + [
+            RandomProgramGenerator(program_seed).generate().to_program()
+            for program_seed in range(args.seed, args.seed + args.random)
+        ]
+        for checked_program in python_programs:
+            python_differences = check_python_backend(checked_program)
+            if python_differences:
+                failed = True
+                print(f"FAIL {checked_program.name}/python: {python_differences}")
+    if failed:
+        sys.exit(1)
+    print(
+        f"{len(resource_programs())} resource and {args.random} random programs"
+        f" equivalent in {len(checked_modes)} modes"
+    )
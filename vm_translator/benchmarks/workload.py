@@ -0,0 +1,235 @@
+import random
+from dataclasses import dataclass
+from pathlib import Path
+
+
+BINARY_OPS = ("add", "sub", "and", "or")
+UNARY_OPS = ("neg", "not")
+COMPARISONS = ("eq", "gt", "lt")
+STATICS_PER_FILE = 8
+
+
+@dataclass(frozen=True)
+class WorkloadSpec:
+    files: int = 40
+    functions_per_file: int = 25
+    statements_per_function: int = 40
+    max_args: int = 3
+    max_locals: int = 6
+    seed: int = 2023
+
+
+SCALES = {
+    "tiny": WorkloadSpec(files=3, functions_per_file=4, statements_per_function=8),
+    "small": WorkloadSpec(files=10, functions_per_file=10, statements_per_function=20),
+    "large": WorkloadSpec(),
+    "huge": WorkloadSpec(files=120, functions_per_file=40, statements_per_function=60),
+}
+
+
+@dataclass(frozen=True)
+class _Function:
+    name: str
+    n_args: int
+    n_locals: int
+
+
+class WorkloadGenerator:
+    """
+    Deterministic generator of large VM programs shaped like Jack compiler
+    output: classes with many functions, a layered call graph (functions only
+    call into later files, so call chains are as deep as the number of files),
+    all memory segments, array accesses and comparison heavy loops.
+    """
+
+    def __init__(self, spec: WorkloadSpec = WorkloadSpec()):
+        self.spec = spec
+        self.random = random.Random(spec.seed)
+        self.functions = [
+            [
+                _Function(
+                    f"Class{file_index}.f{function_index}",
+                    self.random.randint(0, spec.max_args),
+                    self.random.randint(1, spec.max_locals),
+                )
+                for function_index in range(spec.functions_per_file)
+            ]
+            for file_index in range(spec.files)
+        ]
+        self._label_count = 0
+
+    def generate(self) -> dict:
+        """
+        Returns {file name: VM lines}, Sys.vm contains the Sys.init entry point.
+        """
+        files = {"Sys.vm": self._generate_sys_file()}
+        for file_index, functions in enumerate(self.functions):
+            lines = []
+            for function in functions:
+                lines += self._generate_function(file_index, function)
+            files[f"Class{file_index}.vm"] = lines
+        return files
+
+    def write(self, directory: Path) -> int:
+        directory.mkdir(parents=True, exist_ok=True)
+        total_lines = 0
+        for file_name, lines in self.generate().items():
+            (directory / file_name).write_text("\n".join(lines) + "\n")
+            total_lines += len(lines)
+        return total_lines
+
+    def _generate_sys_file(self) -> list:
+        entry = self.functions[0][0]
+        lines = ["function Sys.init 0"]
+        lines += ["push constant 0"] * entry.n_args
+        lines += [f"call {entry.name} {entry.n_args}", "pop temp 0"]
+        lines += ["label Sys.init$HALT", "goto Sys.init$HALT"]
+        return lines
+
+    def _generate_function(self, file_index: int, function: _Function) -> list:
+        lines = [
+            f"// {function.name}",
+            f"function {function.name} {function.n_locals}",
+            "push argument 0" if function.n_args else "push constant 2048",
+            "pop pointer 0",
+            "push constant 4096",
+            "pop pointer 1",
+        ]
+        generators = (
+            (self._generate_assignment, 30),
+            (self._generate_unary_assignment, 8),
+            (self._generate_array_read, 12),
+            (self._generate_array_write, 12),
+            (self._generate_loop, 14),
+            (self._generate_if, 12),
+            (self._generate_call, 12),
+        )
+        statements, weights = zip(*generators)
+        for _ in range(self.spec.statements_per_function):
+            statement = self.random.choices(statements, weights)[0]
+            lines += statement(file_index, function)
+        lines += [*self._push_operand(file_index, function), "return"]
+        return lines
+
+    def _generate_assignment(self, file_index, function) -> list:
+        return [
+            *self._push_operand(file_index, function),
+            *self._push_operand(file_index, function),
+            self.random.choice(BINARY_OPS),
+            self._pop_target(file_index, function),
+        ]
+
+    def _generate_unary_assignment(self, file_index, function) -> list:
+        return [
+            *self._push_operand(file_index, function),
+            self.random.choice(UNARY_OPS),
+            self._pop_target(file_index, function),
+        ]
+
+    def _generate_array_read(self, file_index, function) -> list:
+        return [
+            f"push local {self.random.randrange(function.n_locals)}",
+            *self._push_operand(file_index, function),
+            "add",
+            "pop pointer 1",
+            "push that 0",
+            self._pop_target(file_index, function),
+        ]
+
+    def _generate_array_write(self, file_index, function) -> list:
+        return [
+            f"push local {self.random.randrange(function.n_locals)}",
+            *self._push_operand(file_index, function),
+            "add",
+            *self._push_operand(file_index, function),
+            "pop temp 0",
+            "pop pointer 1",
+            "push temp 0",
+            "pop that 0",
+        ]
+
+    def _generate_loop(self, file_index, function) -> list:
+        start, end = self._new_label(function), self._new_label(function)
+        counter = f"local {self.random.randrange(function.n_locals)}"
+        body = []
+        for _ in range(self.random.randint(1, 3)):
+            body += self._generate_assignment(file_index, function)
+        return [
+            "push constant 0",
+            f"pop {counter}",
+            f"label {start}",
+            f"push {counter}",
+            f"push constant {self.random.randint(2, 20)}",
+            "lt",
+            "not",
+            f"if-goto {end}",
+            *body,
+            f"push {counter}",
+            "push constant 1",
+            "add",
+            f"pop {counter}",
+            f"goto {start}",
+            f"label {end}",
+        ]
+
+    def _generate_if(self, file_index, function) -> list:
+        true_label, end_label = self._new_label(function), self._new_label(function)
+        return [
+            *self._push_operand(file_index, function),
+            *self._push_operand(file_index, function),
+            self.random.choice(COMPARISONS),
+            f"if-goto {true_label}",
+            *self._generate_assignment(file_index, function),
+            f"goto {end_label}",
+            f"label {true_label}",
+            *self._generate_assignment(file_index, function),
+            f"label {end_label}",
+        ]
+
+    def _generate_call(self, file_index, function) -> list:
+        if file_index + 1 >= len(self.functions):
+            return self._generate_assignment(file_index, function)
+        callee_file = self.random.randint(
+            file_index + 1, min(file_index + 3, len(self.functions) - 1)
+        )
+        callee = self.random.choice(self.functions[callee_file])
+        lines = []
+        for _ in range(callee.n_args):
+            lines += self._push_operand(file_index, function)
+        return [
+            *lines,
+            f"call {callee.name} {callee.n_args}",
+            self._pop_target(file_index, function),
+        ]
+
+    def _push_operand(self, file_index, function) -> list:
+        segment = self.random.choices(
+            ("constant", "local", "argument", "static", "this", "that", "temp"),
+            (30, 25, 15, 10, 8, 7, 5),
+        )[0]
+        if segment == "argument" and not function.n_args:
+            segment = "local"
+        return [f"push {segment} {self._segment_index(segment, function)}"]
+
+    def _pop_target(self, file_index, function) -> str:
+        segment = self.random.choices(
+            ("local", "static", "this", "that", "temp"), (50, 20, 12, 10, 8)
+        )[0]
+        return f"pop {segment} {self._segment_index(segment, function)}"
+
+    def _segment_index(self, segment: str, function: _Function) -> int:
+        if segment == "constant":
+            return self.random.randint(0, 32767)
+        if segment == "local":
+            return self.random.randrange(function.n_locals)
+        if segment == "argument":
+            return self.random.randrange(function.n_args)
+        if segment == "static":
+            return self.random.randrange(STATICS_PER_FILE)
+        if segment == "temp":
+            return self.random.randrange(8)
+        return self.random.randrange(16)
+
+    def _new_label(self, function: _Function) -> str:
+        self._label_count += 1
+        return f"{function.name.replace('.', '_')}_L{self._label_count}"
@@ -0,0 +1,56 @@
+import asyncio
+import os
+import shutil
+from pathlib import Path
+
+from vm_translator.batch import read_manifest, run_batch
+
+resource_dir = Path(os.path.dirname(__file__)) / "resources/"
+
+
+def test_read_manifest_skips_comments_and_resolves_paths(tmp_path):
+    manifest = tmp_path / "manifest.txt"
+    manifest.write_text("# projects\nnested_call\n\n  SimpleAdd.vm  \n")
+
+    assert read_manifest(manifest) == [
+        tmp_path / "nested_call",
+        tmp_path / "SimpleAdd.vm",
+    ]
+
+
+def test_run_batch_streams_results_and_summarises(tmp_path):
+    shutil.copytree(resource_dir / "nested_call", tmp_path / "nested_call")
+    shutil.copy(resource_dir / "SimpleAdd.vm", tmp_path)
+    (tmp_path / "Bad.vm").write_text("jump 3\n")
+    paths = [tmp_path / "nested_call", tmp_path / "SimpleAdd.vm", tmp_path / "Bad.vm"]
+    streamed = []
+
+    summary = asyncio.run(run_batch(paths, 2, streamed.append, rom_budget=None))
+
+    assert streamed == summary.results
+    results = {result.path.name: result for result in summary.results}
+    assert results["SimpleAdd.vm"].asm_path == tmp_path / "SimpleAdd.asm"
+    assert results["SimpleAdd.vm"].vm_lines > 0
+    assert (tmp_path / "nested_call" / "nested_call.asm").exists()
+    assert summary.failed == [results["Bad.vm"]]
+    assert "UnknownCommand" in results["Bad.vm"].error
+    assert summary.report().startswith("2 of 3 projects translated, 1 failed")
+
+
+def test_run_batch_reports_the_sizes_and_optimizations_of_every_project(tmp_path):
+    shutil.copytree(resource_dir / "nested_call", tmp_path / "nested_call")
+    shutil.copy(resource_dir / "SimpleAdd.vm", tmp_path)
+    paths = [tmp_path / "nested_call", tmp_path / "SimpleAdd.vm"]
+
+    summary = asyncio.run(
+        run_batch(
+            paths, 2, size_report=True, strength_reduction=True, pool_strings=True
+        )
+    )
+
+    for result in summary.results:
+        report = result.report()
+        assert report.startswith("ok   ")
+        assert "\nROM words: " in report
+        assert "\nstrength reduced call sites: " in report
+        assert "\nstring literals: " in report
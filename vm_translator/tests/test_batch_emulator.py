@@ -0,0 +1,114 @@
+import os
+import random
+from pathlib import Path
+
+import pytest
+
+from vm_translator.assembler import AsmProgram
+from vm_translator.emulator import Emulator, InvalidAddressError
+from vm_translator.VMTranslator import Compiler
+
+np = pytest.importorskip("numpy")
+from vm_translator.batch_emulator import BatchEmulator  # noqa: E402
+
+resource_dir = Path(os.path.dirname(__file__)) / "resources/"
+
+# R3 = |R0 - R1|, counted while R2 is decremented from it to 0
+DIVERGENT_PROGRAM = [
+    "@R0",
+    "D=M",
+    "@R1",
+    "D=D-M",
+    "@POSITIVE",
+    "D;JGE",
+    "D=-D",
+    "(POSITIVE)",
+    "@R2",
+    "M=D",
+    "(LOOP)",
+    "@R2",
+    "D=M",
+    "@END",
+    "D;JLE",
+    "@R3",
+    "M=M+1",
+    "@R2",
+    "MD=M-1",
+    "@LOOP",
+    "D;JGT",
+    "(END)",
+    "@END",
+    "0;JMP",
+]
+
+
+def _assert_lanes_match(batch, program, rams, addresses):
+    for lane, ram in enumerate(rams):
+        emulator = Emulator(program, ram)
+        emulator.run()
+        assert batch.halted[lane] == emulator.halted
+        assert batch.cycles[lane] == emulator.cycles
+        assert batch.pc[lane] == emulator.pc
+        for address in addresses:
+            assert batch.read(address)[lane] == emulator.read(address)
+
+
+def test_divergent_lanes_match_scalar_emulator():
+    program = AsmProgram.from_lines(DIVERGENT_PROGRAM)
+    generator = random.Random(3)
+    rams = [
+        {0: generator.randint(-40, 40), 1: generator.randint(-40, 40)}
+        for _ in range(64)
+    ]
+    batch = BatchEmulator(program, len(rams), rams)
+
+    batch.run()
+
+    _assert_lanes_match(batch, program, rams, range(4))
+    assert batch.steps < sum(batch.cycles)
+
+
+def test_alu_wraps_around_like_scalar_emulator():
+    program = AsmProgram.from_lines(
+        ["@R0", "D=M", "@R1", "M=D+M", "D=!D", "@R2", "M=D-1", "D=-D", "@R3", "M=D&A"]
+    )
+    rams = [{0: value, 1: 32767} for value in (-32768, -1, 0, 1, 32767)]
+    batch = BatchEmulator(program, len(rams), rams)
+
+    batch.run()
+
+    assert batch.ram.dtype == np.int16
+    _assert_lanes_match(batch, program, rams, range(4))
+
+
+def test_lanes_stop_after_max_cycles():
+    program = AsmProgram.from_lines(["(LOOP)", "@R0", "M=M+1", "@LOOP", "D;JMP"])
+    batch = BatchEmulator(program, 3)
+
+    cycles = batch.run(max_cycles=10)
+
+    assert list(cycles) == [10, 10, 10]
+    assert not batch.halted.any()
+    assert list(batch.read(0)) == [3, 3, 3]
+
+
+def test_addresses_outside_of_the_ram_are_rejected():
+    program = AsmProgram.from_lines(["@R0", "A=M", "M=1"])
+    batch = BatchEmulator(program, 2, [{0: 100}, {0: 32768}])
+
+    with pytest.raises(InvalidAddressError, match="instruction 2 accesses RAM 32768"):
+        batch.run()
+
+
+def test_batch_runs_translated_nested_call(tmp_path):
+    asm_path = tmp_path / "NestedCall.asm"
+    Compiler(resource_dir / "nested_call", asm_path).compile_and_write_asm()
+    program = AsmProgram.from_file(asm_path)
+    batch = BatchEmulator(program, 4)
+
+    batch.run()
+
+    assert batch.halted.all()
+    assert list(batch.read(0)) == [261] * 4
+    assert list(batch.read(5)) == [135] * 4
+    assert batch.steps == batch.cycles[0]
@@ -4,7 +4,33 @@ from unittest.mock import patch
 import pytest
 
 from vm_translator.parser import Command
-from vm_translator.code_writer import CodeWriter, UnrecognisedCmdError
+from vm_translator.code_size import RomBudgetExceededError
+from vm_translator.assembler import AsmProgram
+from vm_translator.code_writer import (
+    CodeWriter,
+    UnrecognisedCmdError,
+    COMPACT_SHAPE,
+    FAST_SHAPE,
+    STATIC_OVERFLOW_ERROR,
+    StaticSegmentOverflowError,
+    StaticSegmentOverflowWarning,
+    UndefinedFunctionError,
+    count_instructions,
+)
+from vm_translator.emulator import Emulator
+from vm_translator.sinks import MemorySink
+
+SEGMENTS = (
+    "constant",
+    "local",
+    "argument",
+    "this",
+    "that",
+    "temp",
+    "static",
+    "pointer",
+)
+ARITHMETIC_COMMANDS = ("add", "sub", "neg", "eq", "gt", "lt", "and", "or", "not")
 
 
 def test_code_writer_init(mockdata_time):
@@ -64,11 +90,10 @@ def test_code_writer_with_wrong_cmd_raises_proper_exception():
 def test_code_writer_writes_arithmetic_commands_properly(command, asm_expected_code):
     mock_file = Path("tmp_path/mocked.asm")
 
-    with patch("builtins.open") as mocked_open:
-        code_writer = CodeWriter(mock_file)
-        code_writer.write_cmd(command)
+    code_writer = CodeWriter(mock_file, sink=MemorySink())
+    code_writer.write_cmd(command)
 
-        mocked_open().writelines.assert_called_with(asm_expected_code)
+    assert code_writer.sink.getvalue() == asm_expected_code
 
 
 @pytest.mark.parametrize(
@@ -113,11 +138,10 @@ def test_code_writer_writes_arithmetic_commands_properly(command, asm_expected_c
 )
 def test_code_writer_writes_push_commands_properly(command, asm_expected_code):
     mock_file = Path("tmp_path/mocked.asm")
-    with patch("builtins.open") as mocked_open:
-        code_writer = CodeWriter(mock_file)
-        code_writer.write_cmd(command)
+    code_writer = CodeWriter(mock_file, sink=MemorySink())
+    code_writer.write_cmd(command)
 
-        mocked_open().writelines.assert_called_with(asm_expected_code)
+    assert code_writer.sink.getvalue() == asm_expected_code
 
 
 @pytest.mark.parametrize(
@@ -137,11 +161,10 @@ def test_code_writer_writes_push_commands_properly(command, asm_expected_code):
 )
 def test_code_writer_writes_pop_commands_properly(command, asm_expected_code):
     mock_file = Path("tmp_path/mocked.asm")
-    with patch("builtins.open") as mocked_open:
-        code_writer = CodeWriter(mock_file)
-        code_writer.write_cmd(command)
+    code_writer = CodeWriter(mock_file, sink=MemorySink())
+    code_writer.write_cmd(command)
 
-        mocked_open().writelines.assert_called_with(asm_expected_code)
+    assert code_writer.sink.getvalue() == asm_expected_code
 
 
 @pytest.mark.parametrize(
@@ -163,11 +186,10 @@ def test_code_writer_writes_pop_commands_properly(command, asm_expected_code):
 )
 def test_code_writer_writes_branching_commands_properly(command, asm_expected_code):
     mock_file = Path("tmp_path/mocked.asm")
-    with patch("builtins.open") as mocked_open:
-        code_writer = CodeWriter(mock_file)
-        code_writer.write_cmd(command)
+    code_writer = CodeWriter(mock_file, sink=MemorySink())
+    code_writer.write_cmd(command)
 
-        mocked_open().writelines.assert_called_with(asm_expected_code)
+    assert code_writer.sink.getvalue() == asm_expected_code
 
 
 def test_label_indexes_are_incremented_properly_for_gt_cmd():
@@ -199,3 +221,202 @@ def test_label_indexes_are_incremented_properly_for_gt_cmd():
 def mockdata_time():
     with patch("vm_translator.code_writer.datetime") as mocked_datatime:
         yield mocked_datatime
+
+
+@pytest.mark.parametrize(
+    "command, asm_expected_code",
+    [
+        (
+            Command("C_ARITHMETIC", "gt"),
+            "\n// gt\n@gt0\nD=A\n@$$GT\n0;JMP\n(gt0)",
+        ),
+        (
+            Command("C_CALL", "Main.f", 2),
+            "\n// Command(cmd_type='C_CALL', arg_1='Main.f', arg_2=2)"
+            "\n@2\nD=A\n@R14\nM=D\n@Main.f\nD=A\n@R13\nM=D"
+            "\n@mocked$ret.1\nD=A\n@$$CALL\n0;JMP\n(mocked$ret.1)",
+        ),
+        (
+            Command("C_RETURN"),
+            "\n// Command(cmd_type='C_RETURN', arg_1=None, arg_2=None)\n@$$RETURN\n0;JMP",
+        ),
+        (
+            Command("C_FUNCTION", "Main.f", 3),
+            "\n// Command(cmd_type='C_FUNCTION', arg_1='Main.f', arg_2=3)"
+            "\n(Main.f)\n@3\nD=A\n(Main.f$initLocals)\n@SP\nAM=M+1\nA=A-1\nM=0"
+            "\nD=D-1\n@Main.f$initLocals\nD;JGT",
+        ),
+    ],
+)
+def test_code_writer_writes_compact_shape_commands_properly(command, asm_expected_code):
+    mock_file = Path("tmp_path/mocked.asm")
+    code_writer = CodeWriter(mock_file, default_shape=COMPACT_SHAPE, sink=MemorySink())
+    code_writer.write_cmd(command)
+
+    assert code_writer.sink.getvalue() == asm_expected_code
+
+
+def test_code_writer_appends_used_shared_routines_on_close():
+    mock_file = Path("tmp_path/mocked.asm")
+    code_writer = CodeWriter(
+        mock_file,
+        function_shapes={"Main.compact": COMPACT_SHAPE},
+        sink=MemorySink(),
+    )
+    code_writer.write_cmd(Command("C_FUNCTION", "Main.fast", 0))
+    code_writer.write_cmd(Command("C_ARITHMETIC", "eq"))
+    code_writer.write_cmd(Command("C_FUNCTION", "Main.compact", 0))
+    code_writer.write_cmd(Command("C_ARITHMETIC", "lt"))
+    code_writer.close_file()
+
+    routines = code_writer.sink.getvalue().split("($$HALT)")[1]
+    assert "($$LT)" in routines
+    assert "($$EQ)" not in routines
+    assert "($$CALL)" not in routines
+    assert code_writer.sink.closed
+
+
+def test_count_instructions_skips_labels_and_comments():
+    assert count_instructions("\n// add\n(LOOP)\n@SP\nAM=M-1\n\nD=M") == 3
+
+
+def test_code_writer_accounts_code_size_per_function_file_and_kind():
+    mock_file = Path("tmp_path/mocked.asm")
+    with patch("builtins.open"):
+        code_writer = CodeWriter(mock_file)
+        code_writer.write_cmd(Command("C_PUSH", "constant", 1))
+        code_writer.write_cmd(Command("C_FUNCTION", "Main.f", 1))
+        code_writer.file_name = "Main.vm"
+        code_writer.write_cmd(Command("C_ARITHMETIC", "add"))
+
+    assert code_writer.code_size.total == 7 + 5 + 5
+    assert code_writer.code_size.by_function == {"[top]": 7, "Main.f": 10}
+    assert code_writer.code_size.by_file == {"mocked": 12, "Main.vm": 5}
+    assert code_writer.code_size.by_kind == {
+        "C_PUSH": 7,
+        "C_FUNCTION": 5,
+        "C_ARITHMETIC": 5,
+    }
+
+
+def test_code_writer_fails_fast_when_rom_budget_is_exceeded():
+    mock_file = Path("tmp_path/mocked.asm")
+    code_writer = CodeWriter(mock_file, rom_budget=10, sink=MemorySink())
+    code_writer.write_cmd(Command("C_PUSH", "constant", 1))
+    with pytest.raises(RomBudgetExceededError, match="Main.f"):
+        code_writer.write_cmd(Command("C_FUNCTION", "Main.f", 1))
+
+    assert code_writer.sink.closed
+
+
+@pytest.mark.parametrize("shape", [FAST_SHAPE, COMPACT_SHAPE])
+def test_precomputed_snippet_sizes_match_generated_code(shape):
+    code_writer = CodeWriter(
+        Path("tmp_path/mocked.asm"), default_shape=shape, sink=MemorySink()
+    )
+    cmds = [
+        Command("C_FUNCTION", "Main.f", 3),
+        Command("C_FUNCTION", "Main.g", 0),
+        *(Command("C_PUSH", segment, 1) for segment in SEGMENTS),
+        *(
+            Command("C_POP", segment, 1)
+            for segment in SEGMENTS
+            if segment != "constant"
+        ),
+        *(Command("C_ARITHMETIC", op) for op in ARITHMETIC_COMMANDS),
+        Command("C_LABEL", "loop"),
+        Command("C_GOTO", "loop"),
+        Command("C_IF", "loop"),
+        Command("C_CALL", "Main.f", 2),
+        Command("C_RETURN"),
+    ]
+    for cmd in cmds:
+        code_writer.write_cmd(cmd)
+
+    assert code_writer.code_size.total == count_instructions(
+        code_writer.sink.getvalue()
+    )
+
+
+def test_memory_access_snippets_are_memoized_per_static_file():
+    code_writer = CodeWriter(Path("tmp_path/mocked.asm"), sink=MemorySink())
+    code_writer.write_cmd(Command("C_PUSH", "local", 2))
+    code_writer.write_cmd(Command("C_PUSH", "local", 2))
+    code_writer.write_cmd(Command("C_PUSH", "static", 2))
+    code_writer.file_name = "Other.vm"
+    code_writer.write_cmd(Command("C_PUSH", "static", 2))
+
+    assert code_writer.snippet_cache_info().hits == 1
+    assert code_writer.sink.getvalue().count("@Other.vm.2") == 1
+
+
+def _write_statics(code_writer, files=("Main.vm", "Sys.vm"), count=3):
+    for file_name in files:
+        code_writer.begin_file(file_name)
+        for index in range(count):
+            code_writer.write_cmd(Command("C_PUSH", "constant", index + 1))
+            code_writer.write_cmd(Command("C_POP", "static", index))
+        code_writer.write_cmd(Command("C_PUSH", "static", 0))
+        code_writer.write_cmd(Command("C_ARITHMETIC", "add"))
+    code_writer.write_cmd(Command("C_LABEL", "END"))
+    code_writer.write_cmd(Command("C_GOTO", "END"))
+    code_writer.close_file()
+
+
+def test_allocated_statics_run_like_assembler_allocated_ones():
+    symbolic = CodeWriter(Path("mocked.asm"), sink=MemorySink())
+    allocated = CodeWriter(Path("mocked.asm"), sink=MemorySink(), allocate_statics=True)
+    _write_statics(symbolic)
+    _write_statics(allocated)
+
+    symbolic_run = Emulator(
+        AsmProgram.from_lines(symbolic.sink.getvalue().splitlines())
+    )
+    allocated_program = AsmProgram.from_lines(allocated.sink.getvalue().splitlines())
+    allocated_run = Emulator(allocated_program, {0: 256})
+    symbolic_run.ram[0] = 256
+    symbolic_run.run()
+    allocated_run.run()
+
+    assert "@Main.vm.0" not in allocated.sink.getvalue()
+    assert allocated_program.variables() == {}
+    assert allocated.context.statics.addresses["Sys.vm.2"] == 23
+    assert [allocated_run.read(address) for address in range(18, 24)] == [
+        symbolic_run.read(address) for address in range(16, 22)
+    ]
+    assert allocated_run.read(256) == symbolic_run.read(256)
+
+
+def test_static_segment_overflow_warns_or_fails():
+    with pytest.warns(StaticSegmentOverflowWarning):
+        _write_statics(CodeWriter(Path("mocked.asm"), sink=MemorySink()), count=239)
+
+    code_writer = CodeWriter(
+        Path("mocked.asm"), sink=MemorySink(), static_overflow=STATIC_OVERFLOW_ERROR
+    )
+    with pytest.raises(StaticSegmentOverflowError, match="Main.vm.238  \\(stack\\)"):
+        _write_statics(code_writer, count=239)
+    assert code_writer.sink.closed
+
+
+def test_allocated_statics_reject_calls_of_undefined_functions():
+    cmds = [
+        Command("C_FUNCTION", "Main.main", 0),
+        *(Command("C_PUSH", "constant", 3), Command("C_POP", "static", 0)),
+        *(Command("C_PUSH", "static", 0), Command("C_PUSH", "constant", 5)),
+        Command("C_CALL", "Math.multiply", 2),
+        Command("C_RETURN"),
+    ]
+    symbolic = CodeWriter(Path("Main.asm"), sink=MemorySink())
+    allocated = CodeWriter(Path("Main.asm"), sink=MemorySink(), allocate_statics=True)
+    for code_writer in (symbolic, allocated):
+        for cmd in cmds:
+            code_writer.write_cmd(cmd)
+
+    # without allocated statics the assembler packs the variables itself
+    symbolic.close_file()
+    with pytest.raises(
+        UndefinedFunctionError, match=r"Math.multiply \(called in Main.main\)"
+    ):
+        allocated.close_file()
+    assert allocated.sink.closed
@@ -0,0 +1,38 @@
+from benchmarks.codegen_quality import (
+    find_improvements,
+    find_regressions,
+    load_baseline,
+    measure_all,
+)
+
+
+def test_generated_code_does_not_regress_against_baseline():
+    regressions = find_regressions(load_baseline(), measure_all())
+
+    assert regressions == []
+
+
+def test_find_regressions_reports_grown_metrics_beyond_threshold():
+    baseline = {
+        "Sample/default": {
+            "rom_total": 100,
+            "rom_by_kind": {"C_PUSH": 50},
+            "cycles": 10,
+        }
+    }
+    current = {
+        "Sample/default": {
+            "rom_total": 101,
+            "rom_by_kind": {"C_PUSH": 51, "C_POP": 1},
+            "cycles": 9,
+        }
+    }
+
+    assert find_regressions(baseline, current, threshold=0.015) == [
+        "Sample/default: rom[C_POP] grew from 0 to 1",
+        "Sample/default: rom[C_PUSH] grew from 50 to 51",
+    ]
+    assert find_improvements(baseline, current) == [
+        "Sample/default: cycles dropped from 10 to 9"
+    ]
+    assert find_regressions(baseline, {}) == ["Sample/default: sample is missing"]
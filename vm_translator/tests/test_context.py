@@ -0,0 +1,90 @@
+import os
+from pathlib import Path
+from unittest.mock import patch
+
+from benchmarks.workload import WorkloadGenerator, WorkloadSpec
+from vm_translator.context import LabelAllocator, StaticAllocator
+from vm_translator.VMTranslator import Compiler, translate, translate_all
+
+resource_dir = Path(os.path.dirname(__file__)) / "resources/"
+
+
+def test_label_allocator_numbers_return_labels_per_namespace():
+    labels = LabelAllocator()
+
+    assert labels.next_return_label("Main.vm") == "Main.vm$ret.1"
+    assert labels.next_return_label("Sys.vm") == "Sys.vm$ret.1"
+    assert labels.next_return_label("Main.vm") == "Main.vm$ret.2"
+    assert labels.next_comparison_label("gt") == 0
+    assert labels.next_comparison_label("gt") == 1
+    assert labels.next_comparison_label("eq") == 0
+
+
+def test_static_allocator_packs_statics_behind_return_variables():
+    statics = StaticAllocator()
+
+    assert statics.allocate("Main.vm", 7) == 18
+    assert statics.allocate("Sys.vm", 0) == 19
+    assert statics.allocate("Main.vm", 7) == 18
+    assert statics.overflow == 0
+    assert statics.memory_map().splitlines() == [
+        "static segment: 4 of 240 words",
+        "    16  endFrame",
+        "    17  retAddr",
+        "    18  Main.vm.7",
+        "    19  Sys.vm.0",
+    ]
+
+
+def test_static_allocator_reports_overflow_into_stack():
+    statics = StaticAllocator()
+    for index in range(240):
+        statics.allocate("Main.vm", index)
+
+    assert statics.overflow == 2
+    assert statics.memory_map().splitlines()[-1] == "   257  Main.vm.239  (stack)"
+
+
+def test_translate_matches_compiler_output(tmp_path):
+    project_dir = resource_dir / "nested_call"
+    asm_path = tmp_path / "NestedCall.asm"
+    sources = {
+        vm_file.name: vm_file.read_text() for vm_file in project_dir.glob("**/*.vm")
+    }
+    with patch("vm_translator.code_writer.datetime") as mocked_datetime:
+        mocked_datetime.today.return_value = "2023-01-17 17:05:03.561633"
+        Compiler(project_dir, asm_path).compile_and_write_asm()
+        result = translate(sources, program_name="NestedCall")
+
+    assert result.asm == asm_path.read_text()
+    assert result.code_size.total > 0
+
+
+def test_translate_without_bootstrap_matches_single_file_compilation(tmp_path):
+    vm_path = resource_dir / "BasicLoop.vm"
+    asm_path = tmp_path / "BasicLoop.asm"
+    Compiler(vm_path, asm_path).compile_and_write_asm()
+
+    result = translate({"BasicLoop": vm_path.read_text().splitlines()}, False)
+
+    assert result.asm == asm_path.read_text()
+
+
+def test_concurrent_translations_match_sequential_ones():
+    builds = [
+        WorkloadGenerator(
+            WorkloadSpec(files=3, functions_per_file=3, seed=seed)
+        ).generate()
+        for seed in range(8)
+    ]
+    builds = [
+        {file_name: "\n".join(lines) for file_name, lines in build.items()}
+        for build in builds
+    ]
+    with patch("vm_translator.code_writer.datetime") as mocked_datetime:
+        mocked_datetime.today.return_value = "2023-01-17 17:05:03.561633"
+        sequential = [translate(sources).asm for sources in builds]
+        concurrent = [result.asm for result in translate_all(builds, max_workers=8)]
+
+    assert concurrent == sequential
+    assert len(set(sequential)) == len(builds)
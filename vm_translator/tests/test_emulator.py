@@ -0,0 +1,114 @@
+import os
+from pathlib import Path
+
+import pytest
+
+from vm_translator.assembler import AsmProgram, AsmSyntaxError
+from vm_translator.emulator import (
+    Emulator,
+    InvalidAddressError,
+    InvalidInstructionError,
+)
+from vm_translator.VMTranslator import Compiler
+
+resource_dir = Path(os.path.dirname(__file__)) / "resources/"
+
+
+def test_assembler_resolves_labels_and_variables():
+    program = AsmProgram.from_lines(
+        ["(START)", "@counter", "M=M+1", "@START", "0; JMP // loop", "@other"]
+    )
+
+    assert program.instructions == ["@16", "M=M+1", "@0", "0;JMP", "@17"]
+    assert program.variables() == {"counter": 16, "other": 17}
+    assert program.labels == {"START": 0}
+
+
+def test_assembler_rejects_duplicated_labels():
+    with pytest.raises(AsmSyntaxError):
+        AsmProgram.from_lines(["(LOOP)", "@LOOP", "(LOOP)"])
+
+
+def test_assembler_builds_source_map_from_code_writer_comments():
+    program = AsmProgram.from_lines(
+        [
+            "// Command(cmd_type='C_FUNCTION', arg_1='Main.main', arg_2=0)",
+            "(Main.main)",
+            "// Command(cmd_type='C_CALL', arg_1='Main.f', arg_2=0)",
+            "@Main$ret.1",
+            "0;JMP",
+            "(Main$ret.1)",
+            "// add",
+            "D=M",
+        ]
+    )
+
+    assert program.function_entries == {0: "Main.main"}
+    assert program.return_points == {2}
+    assert program.instruction_kinds == ["C_CALL", "C_CALL", "C_ARITHMETIC"]
+
+
+def test_emulator_rejects_invalid_instruction():
+    with pytest.raises(InvalidInstructionError):
+        Emulator(AsmProgram.from_lines(["D=X+1"]))
+
+
+@pytest.mark.parametrize(
+    "instructions, address",
+    [(["@32767", "A=A+1", "M=0"], 32768), (["A=-1", "D=M"], 65535)],
+)
+def test_emulator_rejects_addresses_outside_of_the_ram(instructions, address):
+    emulator = Emulator(AsmProgram.from_lines(instructions))
+
+    with pytest.raises(InvalidAddressError, match=f"RAM {address}") as error:
+        emulator.run()
+
+    assert (error.value.pc, error.value.address) == (len(instructions) - 1, address)
+    assert emulator.pc == len(instructions) - 1
+
+
+@pytest.mark.parametrize(
+    "comp, d, m, expected",
+    [
+        ("D+M", 3, 4, 7),
+        ("M-D", 3, 4, 1),
+        ("D-M", 3, 4, -1),
+        ("D&M", 6, 3, 2),
+        ("D|M", 6, 3, 7),
+        ("!D", 0, 0, -1),
+        ("-M", 0, 5, -5),
+    ],
+)
+def test_emulator_computes_alu_operations(comp, d, m, expected):
+    program = AsmProgram.from_lines(["@100", f"D={comp}", "@101", "M=D"])
+    emulator = Emulator(program, {100: m})
+    emulator.d = d
+    emulator.ram[100] = m
+    emulator.run()
+
+    assert emulator.read(101) == expected
+
+
+def test_emulator_stops_on_halt_loop_and_cycle_limit():
+    program = AsmProgram.from_lines(["@5", "D=A", "(END)", "@END", "0;JMP"])
+
+    halted = Emulator(program)
+    assert halted.run() == 2
+    assert halted.halted is True
+
+    limited = Emulator(program)
+    assert limited.run(max_cycles=1) == 1
+    assert limited.halted is False
+
+
+def test_emulator_runs_translated_nested_call(tmp_path):
+    asm_path = tmp_path / "NestedCall.asm"
+    Compiler(resource_dir / "nested_call", asm_path).compile_and_write_asm()
+    emulator = Emulator(AsmProgram.from_file(asm_path))
+
+    emulator.run()
+
+    assert emulator.halted is True
+    assert emulator.read(0) == 261
+    assert emulator.read(5) == 135
+    assert emulator.read(6) == 246
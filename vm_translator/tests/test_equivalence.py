@@ -0,0 +1,58 @@
+import pytest
+
+from benchmarks import equivalence
+from benchmarks.equivalence import (
+    MODES,
+    RandomProgramGenerator,
+    check_program,
+    check_random_programs,
+    resource_programs,
+    run_program,
+    BASELINE,
+)
+
+
+@pytest.mark.parametrize(
+    "program", resource_programs(), ids=lambda program: program.name
+)
+def test_resource_programs_are_equivalent_in_every_mode(program):
+    assert check_program(program) == {}
+
+
+def test_random_programs_are_equivalent_in_every_mode():
+    assert check_random_programs(25, seed=100) == []
+
+
+def test_random_programs_are_deterministic_and_halt():
+    program = RandomProgramGenerator(7).generate().to_program()
+
+    assert program.sources == RandomProgramGenerator(7).generate().to_program().sources
+    assert run_program(program, BASELINE)["halted"]
+
+
+def test_broken_mode_is_detected_and_shrunk(monkeypatch):
+    translate_program = equivalence.translate_program
+
+    def translate_with_broken_sub(program, mode):
+        build = translate_program(program, mode)
+        if mode.short_labels:
+            build.program.instructions = [
+                "M=D-M" if instruction == "M=M-D" else instruction
+                for instruction in build.program.instructions
+            ]
+        return build
+
+    monkeypatch.setattr(equivalence, "translate_program", translate_with_broken_sub)
+    modes = {"short_labels": MODES["short_labels"]}
+
+    failing = check_random_programs(1, seed=0, modes=modes)
+
+    assert failing
+    shrunk, failures = failing[0]
+    original = RandomProgramGenerator(shrunk.seed).generate()
+    assert list(failures) == ["short_labels"]
+    assert shrunk.statement_count() < original.statement_count()
+    for position in range(shrunk.statement_count()):
+        assert (
+            check_program(shrunk.without_statements(position).to_program(), modes) == {}
+        )
@@ -0,0 +1,137 @@
+from pathlib import Path
+
+from benchmarks.equivalence import MODES, Program, check_program
+from vm_translator.code_writer import CodeWriter
+from vm_translator.frames import (
+    build_call_graph,
+    plan_static_frames,
+    recursive_functions,
+)
+from vm_translator.parser import Command
+from vm_translator.sinks import MemorySink
+
+
+def _function(name, n_locals, *callees):
+    return [Command("C_FUNCTION", name, n_locals)] + [
+        Command("C_CALL", callee, 0) for callee in callees
+    ]
+
+
+def test_recursive_functions_are_on_call_graph_cycles():
+    cmds = [
+        *_function("Sys.init", 1, "Main.fact", "Main.even", "Math.abs"),
+        *_function("Main.fact", 1, "Main.fact"),
+        *_function("Main.even", 1, "Main.odd"),
+        *_function("Main.odd", 1, "Main.even", "Main.leaf"),
+        *_function("Main.leaf", 1),
+    ]
+
+    calls, n_locals = build_call_graph(cmds)
+
+    assert recursive_functions(calls) == {"Main.fact", "Main.even", "Main.odd"}
+    assert n_locals["Sys.init"] == 1
+    assert calls["Sys.init"] == ["Main.fact", "Main.even", "Math.abs"]
+
+
+def test_static_frames_share_slots_of_functions_never_active_together():
+    cmds = [
+        *_function("Sys.init", 2, "Main.a", "Main.b"),
+        *_function("Main.a", 3, "Main.c"),
+        *_function("Main.b", 1, "Main.c", "Main.rec"),
+        *_function("Main.c", 2),
+        *_function("Main.rec", 4, "Main.rec", "Main.d"),
+        *_function("Main.d", 1),
+        *_function("Main.none", 0),
+    ]
+
+    frames = plan_static_frames(cmds)
+
+    assert frames == {
+        "Sys.init": 0,
+        "Main.a": 2,
+        "Main.b": 2,
+        "Main.c": 5,
+        "Main.d": 3,
+    }
+
+
+def test_static_frame_locals_are_variables_zeroed_on_entry():
+    sink = MemorySink()
+    writer = CodeWriter(Path("Main.asm"), sink=sink, static_frames={"Main.f": 4})
+    for cmd in (
+        Command("C_FUNCTION", "Main.f", 2),
+        Command("C_PUSH", "local", 1),
+        Command("C_POP", "local", 0),
+        Command("C_FUNCTION", "Main.g", 1),
+        Command("C_PUSH", "local", 0),
+    ):
+        writer.write_cmd(cmd)
+
+    asm_lines = sink.getvalue().splitlines()
+    entry = asm_lines.index("(Main.f)")
+    assert asm_lines[entry + 1 : entry + 5] == [
+        "@$$FRAME.4",
+        "M=0",
+        "@$$FRAME.5",
+        "M=0",
+    ]
+    assert asm_lines[entry + 7] == "@$$FRAME.5"
+    assert asm_lines.count("@$$FRAME.4") == 2
+    assert writer.code_size.by_function["Main.f"] == 4 + 7 + 5
+    assert "@LCL" in asm_lines[asm_lines.index("(Main.g)") :]
+
+
+def test_recursive_and_static_frames_run_like_stack_frames():
+    sys_vm = "\n".join(
+        (
+            "function Sys.init 2",
+            "push constant 6",
+            "call Main.fib 1",
+            "pop local 1",
+            "push constant 3",
+            "call Main.square 1",
+            "push local 1",
+            "add",
+            "pop static 0",
+            "label HALT",
+            "goto HALT",
+        )
+    )
+    main_vm = "\n".join(
+        (
+            "function Main.fib 1",
+            "push argument 0",
+            "push constant 2",
+            "lt",
+            "if-goto BASE",
+            "push argument 0",
+            "push constant 1",
+            "sub",
+            "call Main.square 1",
+            "pop local 0",
+            "push argument 0",
+            "push constant 1",
+            "sub",
+            "call Main.fib 1",
+            "push argument 0",
+            "push constant 2",
+            "sub",
+            "call Main.fib 1",
+            "add",
+            "return",
+            "label BASE",
+            "push argument 0",
+            "return",
+            "function Main.square 2",
+            "push argument 0",
+            "pop local 1",
+            "push argument 0",
+            "push local 1",
+            "add",
+            "return",
+        )
+    )
+    program = Program("Frames", {"Sys.vm": sys_vm, "Main.vm": main_vm})
+
+    assert check_program(program, {"static_frames": MODES["static_frames"]}) == {}
+    assert check_program(program, {"all": MODES["all"]}) == {}
@@ -0,0 +1,79 @@
+from pathlib import Path
+
+import pytest
+
+from benchmarks.equivalence import MODES, Program, check_program
+from vm_translator.code_writer import CodeWriter
+from vm_translator.fusion import ARRAY_READ, ARRAY_WRITE, fuse_array_access
+from vm_translator.parser import Command
+from vm_translator.snippets import count_instructions
+
+
+def _translated_size(cmds) -> int:
+    writer = CodeWriter(Path("Main.asm"))
+    return sum(count_instructions(writer.translate_cmd(cmd)) for cmd in cmds)
+
+
+def test_array_idioms_are_fused():
+    base = Command("C_PUSH", "local", 0)
+    cmds = [
+        base,
+        Command("C_PUSH", "constant", 3),
+        *ARRAY_READ,
+        base,
+        Command("C_PUSH", "argument", 0),
+        Command("C_ARITHMETIC", "add"),
+        Command("C_PUSH", "constant", 7),
+        *ARRAY_WRITE,
+        *ARRAY_READ[1:],
+    ]
+
+    assert list(fuse_array_access(cmds)) == [
+        base,
+        Command("C_PUSH", "constant", 3),
+        Command("C_ARRAY", "read"),
+        base,
+        Command("C_PUSH", "argument", 0),
+        Command("C_ARITHMETIC", "add"),
+        Command("C_PUSH", "constant", 7),
+        Command("C_ARRAY", "write"),
+        *ARRAY_READ[1:],
+    ]
+
+
+@pytest.mark.parametrize(
+    "sequence, fused, sizes",
+    [(ARRAY_READ, "read", (20, 11)), (ARRAY_WRITE, "write", (29, 15))],
+)
+def test_fused_snippets_are_smaller(sequence, fused, sizes):
+    fused_cmd = Command("C_ARRAY", fused)
+
+    assert (_translated_size(sequence), _translated_size([fused_cmd])) == sizes
+
+
+def test_fused_array_access_runs_like_the_idioms():
+    main_vm = "\n".join(
+        (
+            "function Sys.init 0",
+            # a[3] = 11, a[5] = a[3] + 1 with a = 5000
+            *("push constant 5000", "push constant 3", "add", "push constant 11"),
+            *("pop temp 0", "pop pointer 1", "push temp 0", "pop that 0"),
+            *("push constant 5000", "push constant 5", "add"),
+            *("push constant 5000", "push constant 3", "add"),
+            *("pop pointer 1", "push that 0", "push constant 1", "add"),
+            *("pop temp 0", "pop pointer 1", "push temp 0", "pop that 0"),
+            # writes to THAT and temp 0 through the array
+            *("push constant 0", "push constant 4", "add", "push constant 77"),
+            *("pop temp 0", "pop pointer 1", "push temp 0", "pop that 0"),
+            *("push constant 5", "push constant 0", "add", "push constant 88"),
+            *("pop temp 0", "pop pointer 1", "push temp 0", "pop that 0"),
+            *("push constant 2", "push constant 2", "add"),
+            *("pop pointer 1", "push that 0", "pop static 0"),
+            "label HALT",
+            "goto HALT",
+        )
+    )
+    program = Program("Arrays", {"Sys.vm": main_vm})
+
+    assert check_program(program, {"fused_arrays": MODES["fused_arrays"]}) == {}
+    assert check_program(program, {"all": MODES["all"]}) == {}
@@ -0,0 +1,95 @@
+import itertools
+import json
+import os
+from pathlib import Path
+
+from vm_translator.instrumentation import (
+    CODEGEN,
+    Instrumentation,
+    InstrumentationHook,
+    PARSE,
+    TOTAL,
+    WRITE,
+)
+from vm_translator.VMTranslator import Compiler
+
+resource_dir = Path(os.path.dirname(__file__)) / "resources/"
+
+
+class RecordingHook(InstrumentationHook):
+    def __init__(self):
+        self.events = []
+
+    def on_phase_start(self, phase, file_name):
+        self.events.append(("start", phase, file_name))
+
+    def on_phase_end(self, phase, file_name, seconds):
+        self.events.append(("end", phase, file_name, seconds))
+
+
+def test_instrumentation_times_phases_with_given_clock():
+    hook = RecordingHook()
+    instrumentation = Instrumentation([hook], clock=itertools.count().__next__)
+
+    token = instrumentation.begin(PARSE, "Main.vm")
+    instrumentation.end(token)
+    items = list(instrumentation.iter_timed("ab", CODEGEN, "Main.vm"))
+
+    assert items == ["a", "b"]
+    assert instrumentation.phase_seconds == {PARSE: 1, CODEGEN: 3}
+    assert instrumentation.file_phase_seconds["Main.vm"] == {PARSE: 1, CODEGEN: 3}
+    assert hook.events[:2] == [
+        ("start", PARSE, "Main.vm"),
+        ("end", PARSE, "Main.vm", 1),
+    ]
+
+
+def test_compiler_collects_statistics(tmp_path):
+    asm_path = tmp_path / "NestedCall.asm"
+    instrumentation = Instrumentation()
+    compiler = Compiler(
+        resource_dir / "nested_call", asm_path, instrumentation=instrumentation
+    )
+
+    compiler.compile_and_write_asm()
+
+    assert instrumentation.cmd_counts["C_CALL"] == 2
+    assert instrumentation.cmd_counts["C_FUNCTION"] == 3
+    for kind, instructions in instrumentation.instructions_by_kind.items():
+        assert compiler.code_size.by_kind[kind] == instructions
+    assert instrumentation.bytes_written == asm_path.stat().st_size
+    assert {TOTAL, PARSE, CODEGEN, WRITE} <= set(instrumentation.phase_seconds)
+    assert set(instrumentation.file_phase_seconds) == {"NestedCall.vm"}
+    assert json.loads(instrumentation.to_json())["cmd_counts"]["C_CALL"] == 2
+    assert "C_CALL" in instrumentation.report()
+
+
+def test_single_file_statistics_are_keyed_by_one_name(tmp_path):
+    instrumentation = Instrumentation()
+    Compiler(
+        resource_dir / "SimpleAdd.vm",
+        tmp_path / "SimpleAdd.asm",
+        instrumentation=instrumentation,
+    ).compile_and_write_asm()
+
+    assert set(instrumentation.file_phase_seconds) == {"SimpleAdd"}
+    assert {PARSE, CODEGEN, WRITE} <= set(
+        instrumentation.file_phase_seconds["SimpleAdd"]
+    )
+
+
+def test_instrumented_output_matches_plain_output(tmp_path):
+    (tmp_path / "plain").mkdir()
+    (tmp_path / "stats").mkdir()
+    plain_path = tmp_path / "plain" / "NestedCall.asm"
+    instrumented_path = tmp_path / "stats" / "NestedCall.asm"
+    Compiler(resource_dir / "nested_call", plain_path).compile_and_write_asm()
+    Compiler(
+        resource_dir / "nested_call",
+        instrumented_path,
+        instrumentation=Instrumentation(),
+    ).compile_and_write_asm()
+
+    plain_lines = plain_path.read_text().splitlines()
+    instrumented_lines = instrumented_path.read_text().splitlines()
+    assert plain_lines[2:] == instrumented_lines[2:]
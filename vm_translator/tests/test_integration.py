@@ -1,8 +1,15 @@
+import io
 from pathlib import Path
 from unittest.mock import patch
 import pytest
 import os
-from vm_translator.VMTranslator import Compiler
+from vm_translator.VMTranslator import Compiler, STDIO_PATH
+from vm_translator.assembler import AsmProgram
+from vm_translator.code_size import RomBudgetExceededError
+from vm_translator.code_writer import UnrecognisedCmdError
+from vm_translator.emulator import Emulator
+from vm_translator.parser import UnknownCommand
+from vm_translator.sinks import MemorySink
 import filecmp
 
 OUTPUT_FILE = Path("output_file.asm")
@@ -39,3 +46,78 @@ def mockdata_time_and_remove_output_file():
         mocked_datatime.today.return_value = "2023-01-17 17:05:03.561633"
         yield
     os.remove(OUTPUT_FILE)
+
+
+def test_optimize_size_compiles_smaller_program_with_same_behavior(tmp_path):
+    baseline_path = tmp_path / "baseline.asm"
+    compact_path = tmp_path / "compact.asm"
+    baseline = Compiler(resource_dir / "nested_call", baseline_path)
+    compact = Compiler(resource_dir / "nested_call", compact_path, optimize_size=True)
+    baseline.compile_and_write_asm()
+    compact.compile_and_write_asm()
+
+    baseline_emulator = Emulator(AsmProgram.from_file(baseline_path))
+    compact_emulator = Emulator(AsmProgram.from_file(compact_path))
+    baseline_emulator.run()
+    compact_emulator.run()
+
+    assert compact.code_size.total < baseline.code_size.total
+    assert compact.code_size.total == len(compact_emulator.rom)
+    assert compact_emulator.ram[:7] == baseline_emulator.ram[:7]
+
+
+def test_compiler_fails_when_rom_budget_is_exceeded(tmp_path):
+    compiler = Compiler(
+        resource_dir / "nested_call", tmp_path / "out.asm", rom_budget=100
+    )
+
+    with pytest.raises(RomBudgetExceededError):
+        compiler.compile_and_write_asm()
+
+    assert not (tmp_path / "out.asm").exists()
+
+
+@pytest.mark.parametrize(
+    "bad_line, error",
+    [("pop constant 3", UnrecognisedCmdError), ("jump 3", UnknownCommand)],
+)
+def test_failed_translation_leaves_no_asm_file(tmp_path, bad_line, error):
+    project_dir = tmp_path / "Project"
+    project_dir.mkdir()
+    # enough code to flush the sink into the file before the failure
+    (project_dir / "Sys.vm").write_text(
+        "function Sys.init 0\n"
+        + "push constant 1\npop temp 0\n" * 1500
+        + f"{bad_line}\nlabel HALT\ngoto HALT\n"
+    )
+    compiler = Compiler(project_dir, tmp_path / "Project.asm")
+
+    with pytest.raises(error):
+        compiler.compile_and_write_asm()
+
+    assert not (tmp_path / "Project.asm").exists()
+
+
+def test_compiler_translates_stdin_to_sink(monkeypatch):
+    monkeypatch.setattr(
+        "sys.stdin", io.StringIO("push constant 7\npush constant 8\nadd\n")
+    )
+    sink = MemorySink()
+    Compiler(STDIO_PATH, sink=sink).compile_and_write_asm()
+
+    emulator = Emulator(AsmProgram.from_lines(sink.getvalue().splitlines()), {0: 256})
+    emulator.run()
+
+    assert sink.closed
+    assert emulator.read(256) == 15
+
+
+def test_compiled_asm_is_assembled_in_memory():
+    sink = MemorySink()
+    Compiler(resource_dir / "SimpleAdd.vm", sink=sink).compile_and_write_asm()
+
+    machine_code = AsmProgram.from_lines(sink.getvalue().splitlines()).to_machine_code()
+
+    assert machine_code.startswith("0000000000000111\n1110110000010000\n")
+    assert all(len(line) == 16 for line in machine_code.splitlines())
+    assert not (resource_dir / "SimpleAdd.asm").exists()
@@ -0,0 +1,159 @@
+import os
+import shutil
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+from vm_translator.code_writer import COMPACT_SHAPE
+from vm_translator.linker import LinkError, build_objects, link, link_to_file
+from vm_translator.objects import ObjectFile, ObjectFormatError, compile_file
+from vm_translator.sinks import MemorySink
+from vm_translator.VMTranslator import Compiler
+
+resource_dir = Path(os.path.dirname(__file__)) / "resources/"
+
+MAIN_VM = """function Main.main 0
+push constant 7
+push constant 8
+gt
+push static 3
+call Math.abs 1
+return
+"""
+SYS_VM = """function Sys.init 0
+push constant 1
+push constant 2
+eq
+pop static 0
+call Main.main 0
+label END
+goto END
+"""
+MATH_VM = """function Math.abs 0
+push argument 0
+push constant 0
+lt
+if-goto NEG
+push argument 0
+return
+label NEG
+push argument 0
+neg
+return
+"""
+
+
+@pytest.fixture(autouse=True)
+def mocked_datetime():
+    with patch("vm_translator.code_writer.datetime") as mocked_datetime:
+        mocked_datetime.today.return_value = "2023-01-17 17:05:03.561633"
+        yield
+
+
+@pytest.fixture
+def project_dir(tmp_path):
+    project_dir = tmp_path / "Project"
+    project_dir.mkdir()
+    (project_dir / "Main.vm").write_text(MAIN_VM)
+    (project_dir / "Sys.vm").write_text(SYS_VM)
+    (project_dir / "Math.vm").write_text(MATH_VM)
+    return project_dir
+
+
+def _compile(project_dir):
+    sink = MemorySink()
+    Compiler(project_dir, sink=sink).compile_and_write_asm()
+    return sink.getvalue()
+
+
+def test_object_symbols_and_round_trip(project_dir):
+    object_file = compile_file(project_dir / "Main.vm")
+
+    loaded = ObjectFile.from_bytes(object_file.to_bytes())
+
+    assert object_file.exports == ["Main.main"]
+    assert object_file.imports == ["Math.abs"]
+    assert object_file.statics == [3]
+    assert object_file.comparisons == {"gt": 1, "lt": 0, "eq": 0}
+    assert "gt%0%" in object_file.asm
+    assert loaded == object_file
+    assert loaded.code_size == object_file.code_size
+
+
+def test_corrupted_object_is_rejected():
+    with pytest.raises(ObjectFormatError):
+        ObjectFile.from_bytes(b"VMO1 not compressed")
+    with pytest.raises(ObjectFormatError):
+        ObjectFile.from_bytes(b"\x00" * 8)
+
+
+def test_linked_objects_match_full_translation(project_dir):
+    objects, translated = build_objects(project_dir)
+    sink = MemorySink()
+    link(objects, project_dir / "Project.asm", sink)
+
+    assert len(translated) == 3
+    assert sink.getvalue() == _compile(project_dir)
+
+
+def test_up_to_date_objects_are_not_retranslated(project_dir):
+    build_objects(project_dir)
+    (project_dir / "Main.vm").write_text(MAIN_VM.replace("gt", "lt"))
+    os.utime(project_dir / "Main.vm", ns=(1 << 62, 1 << 62))
+
+    objects, translated = build_objects(project_dir)
+    sink = MemorySink()
+    link(objects, project_dir / "Project.asm", sink)
+
+    assert translated == [project_dir / "Main.vm"]
+    assert sink.getvalue() == _compile(project_dir)
+
+
+def test_prebuilt_library_objects_are_linked(project_dir, tmp_path):
+    library = compile_file(project_dir / "Math.vm")
+    (project_dir / "Math.vm").unlink()
+    objects, _ = build_objects(project_dir)
+
+    with pytest.raises(LinkError, match="Math.abs"):
+        link(objects, tmp_path / "Program.asm", MemorySink())
+    code_size = link_to_file([*objects, library], tmp_path / "Program.hack")
+
+    machine_code = (tmp_path / "Program.hack").read_text().splitlines()
+    assert len(machine_code) == code_size.total
+
+
+def test_duplicate_functions_are_rejected(project_dir):
+    objects, _ = build_objects(project_dir)
+    duplicate = compile_file(project_dir / "Math.vm")
+    duplicate.namespace = "Math2.vm"
+
+    with pytest.raises(LinkError, match="Math.abs defined in Math.vm and Math2.vm"):
+        link([*objects, duplicate], project_dir / "Project.asm", MemorySink())
+
+
+def test_nested_call_objects_link_like_reference(tmp_path):
+    project_dir = tmp_path / "nested_call"
+    shutil.copytree(resource_dir / "nested_call", project_dir)
+    objects, _ = build_objects(project_dir)
+    sink = MemorySink()
+
+    link(objects, Path("output_file.asm"), sink)
+
+    reference = (resource_dir / "nested_call/NestedCallReference.asm").read_text()
+    assert sink.getvalue() == reference
+
+
+def test_objects_of_another_shape_are_retranslated(project_dir):
+    build_objects(project_dir)
+
+    objects, translated = build_objects(project_dir, COMPACT_SHAPE)
+    sink = MemorySink()
+    link(objects, project_dir / "Project.asm", sink, default_shape=COMPACT_SHAPE)
+    compact_sink = MemorySink()
+    Compiler(project_dir, sink=compact_sink, optimize_size=True).compile_and_write_asm()
+
+    assert len(translated) == 3
+    assert {object_file.shape for object_file in objects} == {COMPACT_SHAPE}
+    assert sink.getvalue() == compact_sink.getvalue()
+    assert build_objects(project_dir, COMPACT_SHAPE)[1] == []
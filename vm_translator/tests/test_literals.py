@@ -0,0 +1,96 @@
+from pathlib import Path
+
+from benchmarks.equivalence import MODES, STRING_VM, Program, check_program
+from vm_translator.code_writer import CodeWriter
+from vm_translator.literals import (
+    PooledLiteral,
+    pool_string_literals,
+    report_string_literals,
+)
+from vm_translator.parser import Command
+from vm_translator.sinks import MemorySink
+from vm_translator.VMTranslator import Compiler, translation_reports
+
+
+def _string_literal(text):
+    cmds = [
+        Command("C_PUSH", "constant", len(text)),
+        Command("C_CALL", "String.new", 1),
+    ]
+    for character in text:
+        cmds += [
+            Command("C_PUSH", "constant", ord(character)),
+            Command("C_CALL", "String.appendChar", 2),
+        ]
+    return cmds
+
+
+def test_append_char_chains_become_string_literals():
+    cmds = [
+        *_string_literal("Hi"),
+        Command("C_PUSH", "constant", 7),
+        Command("C_CALL", "Output.printString", 1),
+        *_string_literal(""),
+        Command("C_PUSH", "constant", 33),
+    ]
+
+    assert list(pool_string_literals(cmds)) == [
+        Command("C_PUSH", "constant", 2),
+        Command("C_CALL", "String.new", 1),
+        Command("C_STRING", "Hi"),
+        Command("C_PUSH", "constant", 7),
+        Command("C_CALL", "Output.printString", 1),
+        Command("C_PUSH", "constant", 0),
+        Command("C_CALL", "String.new", 1),
+        Command("C_PUSH", "constant", 33),
+    ]
+
+
+def test_same_string_literals_share_a_pool_entry():
+    sink = MemorySink()
+    writer = CodeWriter(Path("Main.asm"), sink=sink)
+    for text in ("Hello", "Hi", "Hello"):
+        writer.write_cmd(Command("C_STRING", text))
+    writer.close_file()
+
+    asm_code = sink.getvalue()
+    hello = writer.string_literals["Hello"]
+    assert hello == PooledLiteral("Hello", "$$STRLIT.0", 2, 2 * 5 * 62, 2 * 4 + 35)
+    assert writer.string_literals["Hi"].label == "$$STRLIT.1"
+    assert asm_code.count("($$STRLIT.0)") == 1
+    assert asm_code.count("($$STRLIT)") == 1
+    assert "75 ROM words saved" in report_string_literals(
+        [PooledLiteral("Hi", "$$STRLIT.0", 1, 100, 25)], 0
+    )
+
+
+def test_pooled_string_literals_build_the_same_strings():
+    main_vm = "\n".join(
+        (
+            "function Sys.init 0",
+            *(
+                (
+                    f"push {cmd.arg_1} {cmd.arg_2}"
+                    if cmd.cmd_type == "C_PUSH"
+                    else f"call {cmd.arg_1} {cmd.arg_2}"
+                )
+                for text in ("Hello", "", "A", "Hello")
+                for cmd in _string_literal(text)
+            ),
+            "label HALT",
+            "goto HALT",
+        )
+    )
+    program = Program("Strings", {"Sys.vm": main_vm, "String.vm": STRING_VM})
+
+    assert check_program(program, {"pool_strings": MODES["pool_strings"]}) == {}
+    assert check_program(program, {"all": MODES["all"]}) == {}
+
+
+def test_program_without_string_literals_reports_none_pooled(tmp_path):
+    vm_path = tmp_path / "Main.vm"
+    vm_path.write_text("push constant 7\npush constant 8\nadd\n")
+    compiler = Compiler(vm_path, sink=MemorySink(), pool_strings=True)
+    compiler.compile_and_write_asm()
+
+    assert translation_reports(compiler) == "string literals: none pooled\n"
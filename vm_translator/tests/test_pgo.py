@@ -0,0 +1,159 @@
+import os
+from collections import Counter
+from pathlib import Path
+
+import pytest
+
+from vm_translator.assembler import AsmProgram
+from vm_translator.code_writer import COMPACT_SHAPE, FAST_SHAPE
+from vm_translator.emulator import Emulator
+from vm_translator.parser import Command
+from vm_translator.profiler import Profiler
+from vm_translator.pgo import (
+    ProfileFormatError,
+    load_profile,
+    measure_function_sizes,
+    plan_code_shapes,
+)
+from vm_translator.VMTranslator import Compiler
+
+resource_dir = Path(os.path.dirname(__file__)) / "resources/"
+
+
+def test_load_profile_sums_self_cycles_of_collapsed_stacks(tmp_path):
+    profile_path = tmp_path / "profile.folded"
+    profile_path.write_text(
+        "[top] 10\nSys.init 5\nSys.init;Main.f 7\nSys.init;Main.g;Main.f 3\n"
+    )
+
+    assert load_profile(profile_path) == Counter({"Sys.init": 5, "Main.f": 10})
+
+
+def test_load_profile_rejects_other_formats(tmp_path):
+    profile_path = tmp_path / "profile.folded"
+    profile_path.write_text("Sys.init\n")
+
+    with pytest.raises(ProfileFormatError):
+        load_profile(profile_path)
+
+
+def test_measure_function_sizes():
+    cmds = [
+        Command("C_FUNCTION", "Main.f", 4),
+        Command("C_CALL", "Main.g", 0),
+        Command("C_RETURN"),
+    ]
+
+    function_sizes, fixed_size = measure_function_sizes(cmds)
+
+    fast_size, compact_size = function_sizes["Main.f"]
+    assert fast_size > compact_size
+    assert fixed_size > 0
+
+
+@pytest.mark.parametrize(
+    "rom_budget, expected_fast_functions",
+    [
+        (1000, {"Main.hot", "Main.warm"}),
+        (200, {"Main.hot"}),
+        (50, set()),
+    ],
+)
+def test_plan_code_shapes_prefers_hot_functions_within_budget(
+    rom_budget, expected_fast_functions
+):
+    function_sizes = {
+        "Main.hot": (100, 40),
+        "Main.warm": (100, 40),
+        "Main.cold": (100, 40),
+    }
+    hotness = Counter({"Main.hot": 1000, "Main.warm": 10})
+
+    shapes = plan_code_shapes(function_sizes, hotness, rom_budget, fixed_size=0)
+
+    assert {name for name, shape in shapes.items() if shape == FAST_SHAPE} == (
+        expected_fast_functions
+    )
+    assert shapes["Main.cold"] == COMPACT_SHAPE
+
+
+def test_compiler_with_profile_keeps_program_behavior(tmp_path):
+    profile_path = tmp_path / "profile.folded"
+    profile_path.write_text("Sys.init;Sys.main 300\nSys.init;Sys.main;Sys.add12 5\n")
+    baseline_path = tmp_path / "baseline.asm"
+    optimized_path = tmp_path / "optimized.asm"
+    Compiler(resource_dir / "nested_call", baseline_path).compile_and_write_asm()
+    Compiler(
+        resource_dir / "nested_call", optimized_path, profile_path
+    ).compile_and_write_asm()
+
+    baseline = Emulator(AsmProgram.from_file(baseline_path))
+    optimized = Emulator(AsmProgram.from_file(optimized_path))
+    baseline.run()
+    optimized.run()
+
+    assert optimized.ram[:7] == baseline.ram[:7]
+    assert len(optimized.rom) < len(baseline.rom)
+    assert "($$CALL)" in optimized_path.read_text()
+
+
+LOOP_SYS_VM = "\n".join(
+    (
+        *("function Sys.init 0", "push constant 20", "call Sys.loop 1"),
+        *("pop static 1", "call Sys.cold 0", "pop temp 0", "label HALT", "goto HALT"),
+        # a function without locals looping back to its first label
+        *("function Sys.loop 0", "label LOOP", "push static 0", "push constant 2"),
+        *("call Math.multiply 2", "push argument 0", "add", "pop static 0"),
+        *("push argument 0", "push constant 1", "sub", "pop argument 0"),
+        *("push argument 0", "if-goto LOOP", "push static 0", "return"),
+        *("function Sys.cold 0", "push static 0", "push constant 4"),
+        *("call Math.multiply 2", "push constant 8", "call Math.divide 2", "return"),
+    )
+)
+
+
+def test_profile_plan_sizes_the_optimized_code(tmp_path):
+    project_dir = tmp_path / "Loop"
+    project_dir.mkdir()
+    (project_dir / "Sys.vm").write_text(LOOP_SYS_VM)
+    options = {"strength_reduction": True, "static_frames": True}
+    fast = Compiler(project_dir, tmp_path / "fast.asm", **options)
+    fast.compile_and_write_asm()
+    compact = Compiler(
+        project_dir, tmp_path / "compact.asm", optimize_size=True, **options
+    )
+    compact.compile_and_write_asm()
+    profile_path = tmp_path / "profile.folded"
+    profile_path.write_text(
+        Profiler(AsmProgram.from_file(tmp_path / "fast.asm")).run().to_collapsed()
+    )
+    # room for exactly the fast shape of the hot loop
+    rom_budget = (
+        compact.code_size.total
+        + fast.code_size.by_function["Sys.loop"]
+        - compact.code_size.by_function["Sys.loop"]
+    )
+
+    planned = Compiler(
+        project_dir,
+        tmp_path / "planned.asm",
+        profile_path,
+        rom_budget,
+        **options,
+    )
+    planned.compile_and_write_asm()
+    emulators = [
+        Emulator(AsmProgram.from_file(tmp_path / f"{name}.asm"))
+        for name in ("fast", "planned")
+    ]
+    for emulator in emulators:
+        emulator.run()
+
+    assert (
+        load_profile(profile_path)["Sys.loop"] > load_profile(profile_path)["Sys.init"]
+    )
+    assert planned.code_size.total == rom_budget
+    assert emulators[1].halted
+    # R13-R15 are scratch registers, the statics start at RAM 16
+    assert emulators[1].ram[:13] == emulators[0].ram[:13]
+    assert emulators[1].ram[16:18] == emulators[0].ram[16:18]
@@ -0,0 +1,87 @@
+import os
+from pathlib import Path
+
+import pytest
+
+from vm_translator.assembler import AsmProgram
+from vm_translator.profiler import Profiler, ROOT_FRAME, parse_ram_assignments
+from vm_translator.VMTranslator import Compiler
+
+resource_dir = Path(os.path.dirname(__file__)) / "resources/"
+
+
+def _profile_nested_call(tmp_path):
+    asm_path = tmp_path / "NestedCall.asm"
+    Compiler(resource_dir / "nested_call", asm_path).compile_and_write_asm()
+    return Profiler(AsmProgram.from_file(asm_path)).run()
+
+
+def test_profiler_tracks_call_stack(tmp_path):
+    profile = _profile_nested_call(tmp_path)
+
+    assert set(profile.stack_counts) == {
+        (),
+        ("Sys.init",),
+        ("Sys.init", "Sys.main"),
+        ("Sys.init", "Sys.main", "Sys.add12"),
+    }
+    assert sum(profile.stack_counts.values()) == profile.total_cycles
+    assert sum(profile.kind_counts.values()) == profile.total_cycles
+    assert profile.halted is True
+
+
+def test_profiler_computes_self_and_inclusive_cycles(tmp_path):
+    profile = _profile_nested_call(tmp_path)
+    stats = profile.function_stats()
+
+    assert stats["Sys.add12"].self_cycles == stats["Sys.add12"].inclusive_cycles
+    assert stats["Sys.main"].inclusive_cycles == (
+        stats["Sys.main"].self_cycles + stats["Sys.add12"].inclusive_cycles
+    )
+    assert stats["Sys.init"].inclusive_cycles + stats[ROOT_FRAME].self_cycles == (
+        profile.total_cycles
+    )
+    assert stats["Sys.main"].calls == 1
+
+
+def test_profiler_exports_collapsed_stacks_and_report(tmp_path):
+    profile = _profile_nested_call(tmp_path)
+    collapsed = profile.to_collapsed().splitlines()
+    report = profile.report(top=1)
+
+    assert f"{ROOT_FRAME} {profile.stack_counts[()]}" in collapsed
+    assert any(line.startswith("Sys.init;Sys.main;Sys.add12 ") for line in collapsed)
+    assert f"Total cycles: {profile.total_cycles}" in report
+    assert "C_CALL" in report
+    assert "Sys.add12" not in report.split("Cycles by VM command type")[0]
+
+
+LOOP_SYS_VM = "\n".join(
+    (
+        *("function Sys.init 0", "push constant 3", "pop static 0"),
+        *("call Sys.loop 0", "pop temp 0", "label HALT", "goto HALT"),
+        # the first label of a function without locals is at its entry
+        *("function Sys.loop 0", "label LOOP", "push static 0", "push constant 1"),
+        *("sub", "pop static 0", "push static 0", "if-goto LOOP"),
+        *("push constant 0", "return"),
+    )
+)
+
+
+@pytest.mark.parametrize("optimize_size", [False, True])
+def test_jumps_to_the_entry_of_a_function_are_not_calls(tmp_path, optimize_size):
+    (tmp_path / "Loop").mkdir()
+    (tmp_path / "Loop" / "Sys.vm").write_text(LOOP_SYS_VM)
+    asm_path = tmp_path / "Loop.asm"
+    Compiler(
+        tmp_path / "Loop", asm_path, optimize_size=optimize_size
+    ).compile_and_write_asm()
+
+    profile = Profiler(AsmProgram.from_file(asm_path)).run()
+
+    assert profile.calls == {"Sys.init": 1, "Sys.loop": 1}
+    assert set(profile.stack_counts) == {(), ("Sys.init",), ("Sys.init", "Sys.loop")}
+
+
+def test_parse_ram_assignments():
+    assert parse_ram_assignments(["0=256", "400=-3"]) == {0: 256, 400: -3}
@@ -0,0 +1,148 @@
+import io
+
+import pytest
+
+from benchmarks.equivalence import (
+    BASELINE,
+    Program,
+    RandomProgramGenerator,
+    check_python_backend,
+    resource_programs,
+    run_program,
+    run_python_program,
+)
+from vm_translator.parser import Parser
+from vm_translator import python_backend
+from vm_translator.python_backend import (
+    CallDepthExceededError,
+    PythonExecutor,
+    UndefinedSymbolError,
+    translate_to_python,
+)
+
+
+def _run(sys_vm: str, max_steps: int = 1000) -> PythonExecutor:
+    program = translate_to_python({"Sys.vm": Parser(io.StringIO(sys_vm))})
+    executor = PythonExecutor(program)
+    executor.run(max_steps)
+    return executor
+
+
+@pytest.mark.parametrize(
+    "program", resource_programs(), ids=lambda program: program.name
+)
+def test_resource_programs_run_like_the_emulator(program):
+    assert check_python_backend(program) == []
+
+
+def test_random_programs_run_like_the_emulator():
+    for seed in range(200, 225):
+        program = RandomProgramGenerator(seed).generate().to_program()
+
+        assert check_python_backend(program) == [], seed
+
+
+def test_arithmetic_wraps_around_at_16_bits():
+    executor = _run(
+        "\n".join(
+            (
+                "function Sys.init 1",
+                *("push constant 32767", "pop local 0"),
+                *("push local 0", "push constant 1", "add", "pop static 0"),
+                *("push local 0", "push constant 1", "add", "neg", "pop static 1"),
+                # 32767 - -1 and -2 - 32767 overflow, so the comparisons are false
+                # like in the Hack code
+                *("push local 0", "push constant 1", "neg", "gt", "pop static 2"),
+                *("push constant 2", "neg", "push local 0", "lt", "pop static 3"),
+                "label HALT",
+                "goto HALT",
+            )
+        )
+    )
+
+    assert executor.halted
+    assert executor.halted_in == "Sys.init"
+    assert executor.program.statics == {
+        f"Sys.vm.{index}": 16 + index for index in range(4)
+    }
+    assert [executor.read(16 + index) for index in range(4)] == [-32768, -32768, 0, 0]
+
+
+def test_run_stops_after_max_steps():
+    executor = _run(
+        "\n".join(
+            (
+                "function Sys.init 0",
+                "label LOOP",
+                *("push static 0", "push constant 1", "add", "pop static 0"),
+                "goto LOOP",
+            )
+        ),
+        max_steps=100,
+    )
+
+    assert not executor.halted
+    assert executor.steps == 100
+    # the bootstrap and the call of Sys.init take two steps, the loop body
+    # runs once more than the jump back
+    assert executor.read(16) == 99
+
+
+def test_calls_and_jumps_to_undefined_symbols_are_rejected():
+    with pytest.raises(UndefinedSymbolError, match="calls undefined Main.main"):
+        _run("function Sys.init 0\ncall Main.main 0\n")
+    with pytest.raises(UndefinedSymbolError, match="outside of the function"):
+        _run("function Sys.init 0\ngoto Main.main$LOOP\n")
+
+
+def test_branches_on_a_call_result_test_the_returned_word():
+    program = Program(
+        "Branch",
+        {
+            "Sys.vm": "\n".join(
+                (
+                    *("function Sys.init 0", "call Main.yes 0", "if-goto TAKEN"),
+                    *("push constant 111", "pop static 0", "goto HALT"),
+                    *("label TAKEN", "push constant 222", "pop static 0"),
+                    *("label HALT", "goto HALT"),
+                )
+            ),
+            "Main.vm": "function Main.yes 0\npush constant 1\nneg\nreturn\n",
+        },
+    )
+
+    assert check_python_backend(program) == []
+    assert run_python_program(program)["statics"] == {"Sys.vm.0": 222}
+
+
+def _recursion(depth: int) -> Program:
+    return Program(
+        "Recursion",
+        {
+            "Sys.vm": "\n".join(
+                (
+                    *("function Sys.init 0", f"push constant {depth}"),
+                    *("call Sys.down 1", "pop static 0", "label HALT", "goto HALT"),
+                    *("function Sys.down 0", "push argument 0", "if-goto DEEPER"),
+                    *("push constant 0", "return", "label DEEPER", "push argument 0"),
+                    *("push constant 1", "sub", "call Sys.down 1"),
+                    *("push constant 1", "add", "return"),
+                )
+            )
+        },
+    )
+
+
+def test_deep_recursion_runs_like_the_emulator():
+    # the frames overflow into the heap, where the return addresses differ
+    program = _recursion(2000)
+
+    assert run_program(program, BASELINE)["statics"] == {"Sys.vm.0": 2000}
+    assert run_python_program(program)["statics"] == {"Sys.vm.0": 2000}
+
+
+def test_recursion_past_the_call_depth_limit_is_rejected(monkeypatch):
+    monkeypatch.setattr(python_backend, "MAX_CALL_DEPTH", 0)
+
+    with pytest.raises(CallDepthExceededError, match="calls nest deeper"):
+        run_python_program(_recursion(2000))
@@ -0,0 +1,77 @@
+import io
+
+import pytest
+
+from vm_translator.sinks import (
+    CallbackSink,
+    FileSink,
+    MemorySink,
+    SinkClosedError,
+    StreamSink,
+)
+
+
+def test_sink_batches_writes_until_buffer_size():
+    chunks = []
+    sink = CallbackSink(chunks.append, buffer_size=6)
+
+    sink.write("abc")
+    assert chunks == []
+    sink.write("def")
+    sink.write("g")
+    assert chunks == ["abcdef"]
+    sink.close()
+
+    assert chunks == ["abcdef", "g"]
+
+
+def test_memory_sink_returns_everything_written():
+    sink = MemorySink(buffer_size=2)
+    sink.write("// add\n")
+    sink.write("@SP")
+
+    assert sink.getvalue() == "// add\n@SP"
+    assert sink.data == bytearray(b"// add\n@SP")
+
+
+def test_closed_sink_can_not_be_written_to():
+    sink = MemorySink()
+    sink.close()
+    sink.close()
+
+    with pytest.raises(SinkClosedError):
+        sink.write("@SP")
+
+
+def test_file_sink_creates_file_on_first_flush(tmp_path):
+    asm_path = tmp_path / "out.asm"
+    sink = FileSink(asm_path)
+    sink.write("@SP\n")
+
+    assert not asm_path.exists()
+    sink.close()
+
+    assert asm_path.read_text() == "@SP\n"
+
+
+def test_aborted_file_sink_leaves_no_file(tmp_path):
+    asm_path = tmp_path / "out.asm"
+    sink = FileSink(asm_path, buffer_size=4)
+    sink.write("@SP\n")
+    sink.write("@LCL")
+
+    assert asm_path.exists()
+    sink.abort()
+
+    assert not asm_path.exists()
+    with pytest.raises(SinkClosedError):
+        sink.write("@SP")
+
+
+def test_stream_sink_does_not_close_stream():
+    stream = io.StringIO()
+    with StreamSink(stream) as sink:
+        sink.write("@SP\n")
+
+    assert stream.getvalue() == "@SP\n"
+    assert not stream.closed
@@ -0,0 +1,123 @@
+import io
+
+import pytest
+
+from benchmarks.equivalence import (
+    BASELINE,
+    MODES,
+    MAX_CYCLES,
+    ProgramCompiler,
+    RandomProgramGenerator,
+    translate_program,
+)
+from vm_translator.emulator import Emulator
+from vm_translator.frames import plan_static_frames
+from vm_translator.parser import Command, Parser
+from vm_translator.stack_depth import (
+    UNBOUNDED,
+    analyze_stack_depth,
+    deepest_path,
+    operand_depths,
+    report_stack_depth,
+)
+
+UNTOUCHED = 0x5A5A
+
+
+def _parse(vm_code: str) -> list:
+    return list(Parser(io.StringIO(vm_code)))
+
+
+def test_operand_depths_follow_the_jumps():
+    cmds = _parse(
+        "\n".join(
+            (
+                "push constant 1",
+                "if-goto DEEP",
+                *("push constant 1", "push constant 2", "call Main.f 2"),
+                "goto END",
+                "label DEEP",
+                *("push constant 1", "push constant 2", "push constant 3", "add"),
+                "call Main.g 2",
+                "label END",
+                "return",
+            )
+        )
+    )
+
+    assert operand_depths(cmds) == (3, {"Main.f": 2, "Main.g": 2})
+    assert operand_depths(
+        [
+            Command("C_PUSH", "local", 0),
+            Command("C_ARITHMETIC", "Math.divide", 4),
+            Command("C_STRING", "Hi"),
+        ]
+    ) == (1 + 2 + 3, {"String.appendChar": 1 + 2 + 3 + 2})
+
+
+def test_recursion_and_growing_loops_are_unbounded():
+    functions = analyze_stack_depth(
+        _parse(
+            "\n".join(
+                (
+                    *("function Sys.init 0", "call Main.fact 0", "call Main.leaf 0"),
+                    *("function Main.fact 2", "call Main.fact 0", "return"),
+                    *("function Main.leaf 1", "label LOOP", "push constant 1"),
+                    "goto LOOP",
+                )
+            )
+        )
+    )
+
+    assert functions["Main.fact"].total == UNBOUNDED
+    assert functions["Main.leaf"].operands == UNBOUNDED
+    assert functions["Sys.init"].total == UNBOUNDED
+    assert deepest_path(functions, "Sys.init") == ["Sys.init", "Main.fact"]
+    assert "unbounded  Sys.init  (recursion or a growing loop)" in report_stack_depth(
+        functions
+    )
+
+
+def test_totals_add_frames_locals_and_deepest_calls():
+    cmds = _parse(
+        "\n".join(
+            (
+                *("function Sys.init 0", "push constant 1", "call Main.main 1"),
+                *("function Main.main 3", "push constant 1", "push constant 2"),
+                *("call Main.leaf 1", "call Math.abs 1", "return"),
+                *("function Main.leaf 2", "push constant 1", "return"),
+            )
+        )
+    )
+
+    functions = analyze_stack_depth(cmds)
+    static_functions = analyze_stack_depth(cmds, plan_static_frames(cmds))
+
+    # frame + locals + operands below the deepest call + its total
+    assert [functions[name].total for name in functions] == [
+        5 + 0 + 1 + (5 + 3 + 2 + (5 + 2 + 1)),
+        5 + 3 + 2 + (5 + 2 + 1),
+        5 + 2 + 1,
+    ]
+    assert functions["Main.main"].deepest_callee == "Main.leaf"
+    assert static_functions["Sys.init"].total == 5 + 1 + (5 + 2 + (5 + 1))
+
+
+@pytest.mark.parametrize("mode_name", ["baseline", "all"])
+def test_bound_holds_for_the_emulated_programs(mode_name):
+    mode = MODES.get(mode_name, BASELINE)
+    for seed in range(20):
+        program = RandomProgramGenerator(seed).generate().to_program()
+        total = ProgramCompiler(program, mode).analyze_stack_depth()["Sys.init"].total
+        emulator = Emulator(
+            translate_program(program, mode).program,
+            dict.fromkeys(range(256, 2048), UNTOUCHED),
+        )
+        emulator.run(MAX_CYCLES)
+        used = max(
+            address
+            for address in range(256, 2048)
+            if emulator.ram[address] != UNTOUCHED
+        )
+
+        assert used - 256 + 1 <= total, seed
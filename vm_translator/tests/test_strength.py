@@ -0,0 +1,96 @@
+from collections import Counter
+from pathlib import Path
+
+import pytest
+
+from vm_translator.assembler import AsmProgram
+from vm_translator.code_writer import CodeWriter
+from vm_translator.emulator import Emulator
+from vm_translator.parser import Command
+from vm_translator.sinks import MemorySink
+from vm_translator.strength import (
+    DIVIDE,
+    MULTIPLY,
+    non_adjacent_form,
+    reduce_strength,
+)
+
+OPERANDS = (0, 1, 7, 100, 181, 32767, -1, -7, -100, -32767, -32768)
+
+
+def _run_on_top_of_stack(cmd: Command, x: int) -> tuple:
+    sink = MemorySink()
+    writer = CodeWriter(Path("Main.asm"), sink=sink)
+    writer.write_cmd(cmd)
+    writer.close_file()
+    emulator = Emulator(
+        AsmProgram.from_lines(sink.getvalue().splitlines()), {0: 257, 256: x}
+    )
+    emulator.run()
+    return emulator.ram[0], emulator.ram[256]
+
+
+def _to_word(value: int) -> int:
+    return value % 65536
+
+
+def test_non_adjacent_form_has_no_adjacent_non_zero_digits():
+    for value in range(1, 2000):
+        digits = non_adjacent_form(value)
+        assert digits[0] == 1
+        assert sum(digit << power for power, digit in enumerate(digits[::-1])) == value
+        assert all(not (a and b) for a, b in zip(digits, digits[1:]))
+
+
+def test_calls_with_constant_operands_are_reduced():
+    cmds = [
+        Command("C_PUSH", "local", 0),
+        Command("C_PUSH", "constant", 10),
+        Command("C_CALL", MULTIPLY, 2),
+        Command("C_PUSH", "constant", 3),
+        Command("C_PUSH", "argument", 1),
+        Command("C_CALL", MULTIPLY, 2),
+        Command("C_PUSH", "constant", 16),
+        Command("C_CALL", DIVIDE, 2),
+        Command("C_PUSH", "constant", 1),
+        Command("C_CALL", MULTIPLY, 2),
+        Command("C_PUSH", "constant", 3),
+        Command("C_CALL", DIVIDE, 2),
+        Command("C_PUSH", "constant", 3),
+        Command("C_LABEL", "L"),
+        Command("C_PUSH", "local", 1),
+        Command("C_CALL", MULTIPLY, 2),
+    ]
+    reduced = Counter()
+
+    assert list(reduce_strength(cmds, reduced)) == [
+        Command("C_PUSH", "local", 0),
+        Command("C_ARITHMETIC", MULTIPLY, 10),
+        Command("C_PUSH", "argument", 1),
+        Command("C_ARITHMETIC", MULTIPLY, 3),
+        Command("C_ARITHMETIC", DIVIDE, 16),
+        *cmds[10:],
+    ]
+    assert reduced == Counter({MULTIPLY: 3, DIVIDE: 1})
+
+
+@pytest.mark.parametrize("constant", [0, 2, 3, 7, 10, 15, 16, 100, 255, 1000, 32767])
+def test_inline_multiply_wraps_like_math_multiply(constant):
+    for x in OPERANDS:
+        stack_pointer, product = _run_on_top_of_stack(
+            Command("C_ARITHMETIC", MULTIPLY, constant), x
+        )
+
+        assert stack_pointer == 257
+        assert product == _to_word(x * constant)
+
+
+@pytest.mark.parametrize("divisor", [2, 4, 32, 256, 16384])
+def test_divide_rounds_towards_zero_like_math_divide(divisor):
+    for x in OPERANDS:
+        stack_pointer, quotient = _run_on_top_of_stack(
+            Command("C_ARITHMETIC", DIVIDE, divisor), x
+        )
+
+        assert stack_pointer == 257
+        assert quotient == _to_word(int(x / divisor))
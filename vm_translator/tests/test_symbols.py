@@ -0,0 +1,77 @@
+import json
+import os
+from pathlib import Path
+
+from vm_translator.assembler import PREDEFINED_SYMBOLS, AsmProgram
+from vm_translator.emulator import Emulator
+from vm_translator.sinks import MemorySink
+from vm_translator.symbols import ShortSymbolSink, SymbolShortener, short_name
+from vm_translator.VMTranslator import Compiler
+
+resource_dir = Path(os.path.dirname(__file__)) / "resources/"
+
+
+def _compile(vm_path, shortener=None):
+    sink = MemorySink()
+    Compiler(vm_path, sink=sink, symbol_shortener=shortener).compile_and_write_asm()
+    return sink.getvalue()
+
+
+def test_short_names_are_dense_and_unique():
+    names = [short_name(index) for index in range(30000)]
+
+    assert names[:3] == ["a", "b", "c"]
+    assert len(set(names)) == len(names)
+    assert max(len(name) for name in names) == 3
+    assert not set(names) & set(PREDEFINED_SYMBOLS)
+
+
+def test_renaming_keeps_predefined_symbols_and_numbers_and_drops_comments():
+    shortener = SymbolShortener()
+
+    renamed = shortener.rename(
+        "\n// call Main.main 0\n@Main.main\n(Main.main)\n@SP\n@17\n@endFrame\n@retAddr"
+    )
+
+    assert renamed == "@a\n(a)\n@SP\n@17\n@R14\n@R15"
+    assert shortener.symbol_map == {"a": "Main.main"}
+
+
+def test_renaming_does_not_depend_on_chunk_boundaries():
+    asm = _compile(resource_dir / "nested_call")
+    whole = SymbolShortener().rename(asm)
+    sink = MemorySink()
+
+    with ShortSymbolSink(sink, buffer_size=7) as short_sink:
+        for start in range(0, len(asm), 13):
+            short_sink.write(asm[start : start + 13])
+
+    assert sink.getvalue() == whole
+
+
+def test_short_labels_program_behaves_the_same(tmp_path):
+    shortener = SymbolShortener()
+    readable = Emulator(
+        AsmProgram.from_lines(_compile(resource_dir / "nested_call").splitlines())
+    )
+    short = Emulator(
+        AsmProgram.from_lines(
+            _compile(resource_dir / "nested_call", shortener).splitlines()
+        )
+    )
+    readable.run()
+    short.run()
+    shortener.write_symbol_map(tmp_path / "symbols.json")
+
+    assert short.halted is True
+    # R14 and R15 hold endFrame and retAddr in the short program
+    assert [short.read(address) for address in range(14)] == [
+        readable.read(address) for address in range(14)
+    ]
+    assert [short.read(address) for address in range(256, 270)] == [
+        readable.read(address) for address in range(256, 270)
+    ]
+    assert shortener.bytes_after < shortener.bytes_before
+    assert "Sys.init" in json.loads((tmp_path / "symbols.json").read_text()).values()
+    assert "//" not in _compile(resource_dir / "nested_call", SymbolShortener())
+    assert "symbols: " in shortener.report()
@@ -0,0 +1,147 @@
+import os
+import shutil
+import threading
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+from vm_translator.code_writer import COMPACT_SHAPE
+from vm_translator.sinks import MemorySink
+from vm_translator.VMTranslator import Compiler
+from vm_translator.watch import IncrementalBuild, WatchDaemon, send_request
+
+resource_dir = Path(os.path.dirname(__file__)) / "resources/"
+
+MAIN_VM = """function Main.main 1
+push constant 1
+push constant 2
+lt
+push constant 3
+push constant 3
+eq
+and
+return
+"""
+SYS_VM = """function Sys.init 0
+call Main.main 0
+push constant 5
+push constant 4
+gt
+pop static 0
+label END
+goto END
+"""
+
+
+@pytest.fixture(autouse=True)
+def mocked_datetime():
+    with patch("vm_translator.code_writer.datetime") as mocked_datetime:
+        mocked_datetime.today.return_value = "2023-01-17 17:05:03.561633"
+        yield
+
+
+@pytest.fixture
+def project_dir(tmp_path):
+    project_dir = tmp_path / "Project"
+    project_dir.mkdir()
+    (project_dir / "Main.vm").write_text(MAIN_VM)
+    (project_dir / "Sys.vm").write_text(SYS_VM)
+    return project_dir
+
+
+def _compile(project_dir, **options):
+    sink = MemorySink()
+    Compiler(project_dir, sink=sink, **options).compile_and_write_asm()
+    return sink.getvalue()
+
+
+def test_linked_fragments_match_full_translation(project_dir):
+    build = IncrementalBuild(project_dir)
+    build.refresh()
+    sink = MemorySink()
+    build.link(sink)
+
+    assert sink.getvalue() == _compile(project_dir)
+
+
+def test_only_changed_files_are_retranslated(project_dir):
+    build = IncrementalBuild(project_dir)
+    first_changed = build.refresh()
+    fragments = dict(build.fragments)
+    (project_dir / "Main.vm").write_text(
+        MAIN_VM + "function Main.g 0\npush constant 1\nneg\nlt\nreturn\n"
+    )
+
+    changed = build.refresh()
+    sink = MemorySink()
+    build.link(sink)
+
+    assert len(first_changed) == 2
+    assert changed == [project_dir / "Main.vm"]
+    assert build.fragments[project_dir / "Sys.vm"] is fragments[project_dir / "Sys.vm"]
+    assert sink.getvalue() == _compile(project_dir)
+    assert build.refresh() == []
+
+
+def test_removed_files_are_unlinked(project_dir):
+    build = IncrementalBuild(project_dir, default_shape=COMPACT_SHAPE)
+    build.refresh()
+    (project_dir / "Main.vm").unlink()
+
+    assert build.refresh() == [project_dir / "Main.vm"]
+    sink = MemorySink()
+    build.link(sink)
+    assert sink.getvalue() == _compile(project_dir, optimize_size=True)
+
+
+def test_nested_call_project_is_linked_like_reference(tmp_path):
+    project_dir = tmp_path / "nested_call"
+    shutil.copytree(resource_dir / "nested_call", project_dir)
+    build = IncrementalBuild(project_dir, tmp_path / "output_file.asm")
+    build.refresh()
+    build.link()
+
+    assert (tmp_path / "output_file.asm").read_text() == (
+        resource_dir / "nested_call/NestedCallReference.asm"
+    ).read_text()
+
+
+def test_daemon_answers_requests_on_unix_socket(project_dir, tmp_path):
+    socket_path = tmp_path / "vm.sock"
+    daemon = WatchDaemon(
+        IncrementalBuild(project_dir), 0.01, socket_path, log=open(os.devnull, "w")
+    )
+    thread = threading.Thread(target=daemon.serve_forever)
+    thread.start()
+    try:
+        for _ in range(500):
+            if socket_path.exists() and daemon.linked:
+                break
+            threading.Event().wait(0.01)
+        translated = send_request(
+            socket_path,
+            {
+                "request": "translate",
+                "sources": {"Main.vm": MAIN_VM},
+                "bootstrap": False,
+            },
+        )
+        built = send_request(socket_path, {"request": "build"})
+        failed = send_request(
+            socket_path, {"request": "translate", "sources": {"Bad.vm": "jump 1\n"}}
+        )
+    finally:
+        daemon.stop()
+        thread.join()
+
+    assert translated["ok"] and "(Main.main)" in translated["asm"]
+    assert built == {
+        "ok": True,
+        "changed": [],
+        "asm_path": str(project_dir / "Project.asm"),
+        "rom_words": daemon.build.code_size.total,
+    }
+    assert failed["ok"] is False and "UnknownCommand" in failed["error"]
+    assert (project_dir / "Project.asm").read_text() == _compile(project_dir)
+    assert not socket_path.exists()
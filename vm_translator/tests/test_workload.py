@@ -0,0 +1,21 @@
+from benchmarks.workload import SCALES, WorkloadGenerator
+from vm_translator.VMTranslator import Compiler
+
+
+def test_workload_generator_is_deterministic():
+    assert WorkloadGenerator(SCALES["tiny"]).generate() == (
+        WorkloadGenerator(SCALES["tiny"]).generate()
+    )
+
+
+def test_generated_workload_is_translated(tmp_path):
+    project_dir = tmp_path / "project"
+    lines = WorkloadGenerator(SCALES["tiny"]).write(project_dir)
+    compiler = Compiler(project_dir, tmp_path / "project.asm")
+
+    compiler.compile_and_write_asm()
+
+    assert len(list(project_dir.glob("*.vm"))) == SCALES["tiny"].files + 1
+    assert compiler.code_size.by_kind["C_CALL"] > 0
+    assert compiler.code_size.by_kind["C_IF"] > 0
+    assert lines > 0
@@ -1,50 +1,524 @@
-from sys import argv
+import argparse
+import asyncio
+import io
+import sys
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from pathlib import Path
 
-from vm_translator.code_writer import CodeWriter
+from vm_translator.assembler import AsmProgram
+from vm_translator.code_size import CodeSizeAccounting, RomBudgetExceededError
+from vm_translator.code_writer import (
+    CodeShape,
+    CodeWriter,
+    COMPACT_SHAPE,
+    FAST_SHAPE,
+    HACK_ROM_SIZE,
+    SHARED_ROUTINES,
+    STATIC_OVERFLOW_ERROR,
+    STATIC_OVERFLOW_WARN,
+    StaticSegmentOverflowError,
+    UndefinedFunctionError,
+    count_instructions,
+)
+from vm_translator.frames import plan_static_frames
+from vm_translator.fusion import fuse_array_access
+from vm_translator.instrumentation import Instrumentation, PARSE, TOTAL
+from vm_translator.literals import pool_string_literals, report_string_literals
 from vm_translator.parser import Parser
+from vm_translator.pgo import load_profile, measure_function_sizes, plan_code_shapes
+from vm_translator.sinks import FileSink, OutputSink, MemorySink, StreamSink
+from vm_translator.stack_depth import analyze_stack_depth, report_stack_depth
+from vm_translator.strength import reduce_strength, report_reduced_calls
+from vm_translator.symbols import ShortSymbolSink, SymbolShortener
+
+
+STDIO_PATH = Path("-")
 
 
 class Compiler:
-    def __init__(self, vm_path: Path, asm_output_file_path: Path = None):
+    def __init__(
+        self,
+        vm_path: Path,
+        asm_output_file_path: Path = None,
+        profile_path: Path = None,
+        rom_budget: int = HACK_ROM_SIZE,
+        optimize_size: bool = False,
+        instrumentation: Instrumentation = None,
+        sink: OutputSink = None,
+        symbol_shortener: SymbolShortener = None,
+        allocate_statics: bool = False,
+        static_overflow: str = STATIC_OVERFLOW_WARN,
+        static_frames: bool = False,
+        strength_reduction: bool = False,
+        pool_strings: bool = False,
+        fuse_arrays: bool = False,
+    ):
+        """
+        vm_path "-" reads the VM code from stdin. With a sink the asm goes
+        to the sink instead of asm_output_file_path, which only names the module.
+        With a symbol_shortener the labels and variables get short names.
+        allocate_statics and static_overflow are passed to the CodeWriter.
+        static_frames reads the whole program first to keep the locals of
+        non-recursive functions in static frames. strength_reduction inlines
+        multiplications and divisions by constants, reduced_calls counts them.
+        pool_strings puts the characters of string literals into a pool.
+        fuse_arrays translates the array access idioms as single snippets.
+        """
         self.vm_path = vm_path
         self.is_dir = self.vm_path.is_dir()
         if not asm_output_file_path:
             self.asm_file_path = self.get_asm_file_name()
         else:
             self.asm_file_path = asm_output_file_path
+        self.profile_path = profile_path
+        self.rom_budget = rom_budget
+        self.optimize_size = optimize_size
+        self.instrumentation = instrumentation
+        self.sink = sink
+        self.symbol_shortener = symbol_shortener
+        self.allocate_statics = allocate_statics
+        self.static_overflow = static_overflow
+        self.static_frames = static_frames
+        self.strength_reduction = strength_reduction
+        self.reduced_calls = Counter()
+        self.pool_strings = pool_strings
+        self.string_literals = {}
+        self.fuse_arrays = fuse_arrays
+        self.code_size = None
+        self.statics = None
 
     def compile_and_write_asm(self):
+        if self.instrumentation is not None:
+            token = self.instrumentation.begin(TOTAL)
         if not self.is_dir:
             self._compile_and_write_single_vm_file()
-            return
-        self._compile_and_write_dir()
+        else:
+            self._compile_and_write_dir()
+        if self.instrumentation is not None:
+            self.instrumentation.end(token)
 
     def _compile_and_write_single_vm_file(self):
-        writer = CodeWriter(self.asm_file_path)
-        parser = Parser(self.vm_path)
-        for cmd in parser:
-            writer.write_cmd(cmd)
-        writer.close_file()
+        writer = self._create_writer()
+        # the stats of every phase are keyed by the static namespace of the file
+        parser = self._create_parser(self.vm_path, writer.file_name)
+        self._write(writer, [(None, parser)])
 
     def _compile_and_write_dir(self):
-        writer = CodeWriter(self.asm_file_path, True)
-        for vm_file in self.vm_path.glob("**/*.vm"):
-            parser = Parser(vm_file)
-            for cmd in parser:
-                writer.file_name = vm_file.name
-                writer.write_cmd(cmd)
-        writer.close_file()
+        writer = self._create_writer(True)
+        self._write(
+            writer,
+            (
+                (vm_file.name, self._create_parser(vm_file))
+                for vm_file in self.vm_path.glob("**/*.vm")
+            ),
+        )
+
+    def _write(self, writer: CodeWriter, files):
+        """
+        Writes the (file name, commands) of files, a file name of None keeps
+        the namespace of the writer. A failed translation aborts the sink, so
+        it leaves no partial asm behind.
+        """
+        try:
+            for file_name, cmds in files:
+                if file_name is not None:
+                    writer.begin_file(file_name)
+                for cmd in cmds:
+                    writer.write_cmd(cmd)
+            writer.close_file()
+        except BaseException:
+            writer.sink.abort()
+            raise
+        self.code_size = writer.code_size
+        self.statics = writer.context.statics
+        self.string_literals = writer.string_literals
+
+    def _create_parser(self, vm_file: Path, name: str = None):
+        vm_input = sys.stdin if vm_file == STDIO_PATH else vm_file
+        if self.instrumentation is None:
+            cmds = Parser(vm_input)
+        else:
+            parser = Parser(vm_input, self.instrumentation)
+            if name is not None:
+                parser.name = name
+            cmds = self.instrumentation.iter_timed(parser, PARSE, parser.name)
+        return self._optimize(cmds, self.reduced_calls)
+
+    def _optimize(self, cmds, reduced_calls: Counter = None):
+        if self.strength_reduction:
+            cmds = reduce_strength(cmds, reduced_calls)
+        if self.pool_strings:
+            cmds = pool_string_literals(cmds)
+        if self.fuse_arrays:
+            cmds = fuse_array_access(cmds)
+        return cmds
+
+    def _create_writer(self, write_header=False) -> CodeWriter:
+        shapes = self._code_shapes(write_header)
+        static_frames = self._plan_static_frames()
+        sink = self.sink
+        if self.symbol_shortener is not None:
+            sink = ShortSymbolSink(
+                sink if sink is not None else FileSink(self.asm_file_path),
+                self.symbol_shortener,
+            )
+        return CodeWriter(
+            self.asm_file_path,
+            write_header,
+            rom_budget=self.rom_budget,
+            instrumentation=self.instrumentation,
+            sink=sink,
+            allocate_statics=self.allocate_statics,
+            static_overflow=self.static_overflow,
+            static_frames=static_frames,
+            **shapes,
+        )
+
+    def _code_shapes(self, write_header) -> dict:
+        if self.optimize_size:
+            return {"default_shape": COMPACT_SHAPE}
+        if self.profile_path:
+            return {
+                "default_shape": COMPACT_SHAPE,
+                "function_shapes": self._plan_code_shapes(write_header),
+            }
+        return {}
+
+    def analyze_stack_depth(self) -> dict:
+        """
+        {function: FunctionStack} of the program as this compiler translates it,
+        see stack_depth.analyze_stack_depth.
+        """
+        return analyze_stack_depth(
+            self._optimize(self._iter_cmds()), self._plan_static_frames()
+        )
+
+    def _plan_static_frames(self) -> dict:
+        if not self.static_frames:
+            return None
+        return plan_static_frames(self._iter_cmds())
+
+    def _plan_code_shapes(self, write_header) -> dict:
+        """
+        Sizes the functions as they are written: optimized and with the
+        static frames of the translation.
+        """
+        function_sizes, fixed_size = measure_function_sizes(
+            self._optimize(self._iter_cmds()),
+            write_header,
+            self._plan_static_frames(),
+        )
+        return plan_code_shapes(
+            function_sizes, load_profile(self.profile_path), self.rom_budget, fixed_size
+        )
+
+    def _iter_cmds(self):
+        vm_files = self.vm_path.glob("**/*.vm") if self.is_dir else [self.vm_path]
+        for vm_file in vm_files:
+            yield from Parser(vm_file)
 
     def get_asm_file_name(self):
+        if self.vm_path == STDIO_PATH:
+            return Path("stdin.asm")
         if self.is_dir:
             return self.vm_path / f"{self.vm_path.name}.asm"
         return Path(str(self.vm_path).replace("vm", "asm"))
 
 
+@dataclass
+class TranslationResult:
+    asm: str
+    code_size: CodeSizeAccounting
+
+
+def translate(
+    sources: dict,
+    bootstrap: bool = True,
+    program_name: str = "Main",
+    default_shape: CodeShape = FAST_SHAPE,
+    function_shapes: dict = None,
+    rom_budget: int = HACK_ROM_SIZE,
+) -> TranslationResult:
+    """
+    Translates in memory. sources maps file names, which namespace the
+    statics (e.g. "Main.vm"), to VM code as text or as an iterable of lines.
+    Every call has its own TranslationContext, so calls can run concurrently
+    in threads, see translate_all.
+    """
+    sink = MemorySink()
+    writer = CodeWriter(
+        Path(f"{program_name}.asm"),
+        bootstrap,
+        default_shape,
+        function_shapes,
+        rom_budget,
+        sink=sink,
+    )
+    for file_name, vm_code in sources.items():
+        writer.begin_file(file_name)
+        for cmd in Parser(
+            io.StringIO(vm_code) if isinstance(vm_code, str) else vm_code
+        ):
+            writer.write_cmd(cmd)
+    writer.close_file()
+    return TranslationResult(sink.getvalue(), writer.code_size)
+
+
+def translate_all(builds, max_workers: int = None, **options) -> list:
+    """
+    Translates every sources dict of builds in a thread pool, options are
+    passed to translate. Results are in the order of builds.
+    """
+    with ThreadPoolExecutor(max_workers) as executor:
+        return list(executor.map(lambda sources: translate(sources, **options), builds))
+
+
+def translation_reports(compiler: Compiler, size_report: bool = False) -> str:
+    """
+    Size breakdown and reports of the optimizations the compiler ran.
+    """
+    reports = []
+    if size_report:
+        reports.append(compiler.code_size.breakdown())
+    if compiler.strength_reduction:
+        reports.append(report_reduced_calls(compiler.reduced_calls))
+    if compiler.pool_strings:
+        reports.append(
+            report_string_literals(
+                compiler.string_literals.values(),
+                count_instructions(SHARED_ROUTINES["$$STRLIT"]),
+            )
+        )
+    return "".join(reports)
+
+
+def _create_arg_parser() -> argparse.ArgumentParser:
+    arg_parser = argparse.ArgumentParser(
+        description="Compile VM file or directory of VM files to Hack ASM"
+    )
+    arg_parser.add_argument(
+        "path",
+        type=Path,
+        nargs="*",
+        help="VM file or directory, - reads stdin, more paths are translated in batch",
+    )
+    arg_parser.add_argument(
+        "--manifest", type=Path, help="file with one project path per line"
+    )
+    arg_parser.add_argument(
+        "-j", "--jobs", type=int, help="worker processes in batch mode (CPU count)"
+    )
+    arg_parser.add_argument(
+        "-o",
+        "--output",
+        type=Path,
+        help="output ASM file, - writes stdout, a .hack file is assembled in memory",
+    )
+    arg_parser.add_argument(
+        "--profile",
+        type=Path,
+        help="collapsed stacks from vm_translator.profiler used to pick code shapes",
+    )
+    arg_parser.add_argument(
+        "--rom-budget",
+        type=int,
+        default=HACK_ROM_SIZE,
+        help="ROM words available for the program, translation fails above it",
+    )
+    arg_parser.add_argument(
+        "-Os",
+        dest="optimize_size",
+        action="store_true",
+        help="use the most compact code shapes everywhere",
+    )
+    arg_parser.add_argument(
+        "--size-report",
+        action="store_true",
+        help="print ROM words per function, file and command type",
+    )
+    arg_parser.add_argument(
+        "--allocate-statics",
+        action="store_true",
+        help="pack the static variables from RAM 16 and write their addresses",
+    )
+    arg_parser.add_argument(
+        "--static-overflow",
+        choices=(STATIC_OVERFLOW_WARN, STATIC_OVERFLOW_ERROR),
+        default=STATIC_OVERFLOW_WARN,
+        help="warn or fail when the statics don't fit below the stack",
+    )
+    arg_parser.add_argument(
+        "--memory-map",
+        type=Path,
+        help="with --allocate-statics, write the address of every static variable",
+    )
+    arg_parser.add_argument(
+        "--static-frames",
+        action="store_true",
+        help="give the locals of non-recursive functions fixed addresses",
+    )
+    arg_parser.add_argument(
+        "--reduce-strength",
+        action="store_true",
+        help="inline Math.multiply and Math.divide by constants, prints the count",
+    )
+    arg_parser.add_argument(
+        "--pool-strings",
+        action="store_true",
+        help="pool the characters of string literals, prints the ROM words saved",
+    )
+    arg_parser.add_argument(
+        "--fuse-arrays",
+        action="store_true",
+        help="translate the array read and write idioms as single snippets",
+    )
+    arg_parser.add_argument(
+        "--stack-depth",
+        action="store_true",
+        help="print the worst case stack words of every entry point and function",
+    )
+    arg_parser.add_argument(
+        "--short-labels",
+        action="store_true",
+        help="short label and variable names without comments, prints the asm sizes",
+    )
+    arg_parser.add_argument(
+        "--symbol-map",
+        type=Path,
+        help="with --short-labels, write short name -> original name as JSON",
+    )
+    arg_parser.add_argument(
+        "--stats",
+        action="store_true",
+        help="print time per phase and file, command and instruction counts",
+    )
+    arg_parser.add_argument(
+        "--stats-json", type=Path, help="write the --stats statistics as JSON"
+    )
+    return arg_parser
+
+
+def _check_args(arg_parser: argparse.ArgumentParser, args: argparse.Namespace):
+    if args.manifest or len(args.path) > 1:
+        if (
+            args.output
+            or args.profile
+            or args.stats
+            or args.stats_json
+            or args.short_labels
+            or args.memory_map
+            or args.stack_depth
+        ):
+            arg_parser.error(
+                "-o, --profile, --stats, --short-labels, --memory-map and"
+                " --stack-depth need a single path"
+            )
+        return
+    if not args.path:
+        arg_parser.error("a path or a --manifest is required")
+    stdin = args.path[0] == STDIO_PATH
+    if (args.profile or args.static_frames or args.stack_depth) and stdin:
+        arg_parser.error(
+            "--profile, --static-frames and --stack-depth can't be used with VM code"
+            " read from stdin"
+        )
+    if args.symbol_map and not args.short_labels:
+        arg_parser.error("--symbol-map needs --short-labels")
+    if args.memory_map and not args.allocate_statics:
+        arg_parser.error("--memory-map needs --allocate-statics")
+
+
+def _translate_batch(args: argparse.Namespace) -> int:
+    from vm_translator.batch import read_manifest, run_batch
+
+    batch_paths = args.path + (read_manifest(args.manifest) if args.manifest else [])
+    batch_summary = asyncio.run(
+        run_batch(
+            batch_paths,
+            args.jobs,
+            lambda result: print(result.report(), flush=True),
+            args.size_report,
+            rom_budget=args.rom_budget,
+            optimize_size=args.optimize_size,
+            allocate_statics=args.allocate_statics,
+            static_overflow=args.static_overflow,
+            static_frames=args.static_frames,
+            strength_reduction=args.reduce_strength,
+            pool_strings=args.pool_strings,
+            fuse_arrays=args.fuse_arrays,
+        )
+    )
+    print(batch_summary.report(), end="")
+    return 1 if batch_summary.failed else 0
+
+
+def _translate(args: argparse.Namespace):
+    vm_path = args.path[0]
+    stats = Instrumentation() if args.stats or args.stats_json else None
+    shortener = SymbolShortener() if args.short_labels else None
+    asm_path, output_sink = args.output, None
+    if args.output == STDIO_PATH or (vm_path == STDIO_PATH and not args.output):
+        asm_path, output_sink = None, StreamSink(sys.stdout)
+    elif args.output and args.output.suffix == ".hack":
+        asm_path, output_sink = args.output.with_suffix(".asm"), MemorySink()
+    compiler = Compiler(
+        vm_path,
+        asm_path,
+        args.profile,
+        args.rom_budget,
+        args.optimize_size,
+        stats,
+        output_sink,
+        shortener,
+        args.allocate_statics,
+        args.static_overflow,
+        args.static_frames,
+        args.reduce_strength,
+        args.pool_strings,
+        args.fuse_arrays,
+    )
+    try:
+        compiler.compile_and_write_asm()
+    except (
+        RomBudgetExceededError,
+        StaticSegmentOverflowError,
+        UndefinedFunctionError,
+    ) as error:
+        sys.exit(str(error))
+    if args.memory_map:
+        args.memory_map.write_text(compiler.statics.memory_map())
+    if isinstance(output_sink, MemorySink):
+        program = AsmProgram.from_lines(output_sink.getvalue().splitlines())
+        args.output.write_text(program.to_machine_code())
+    report_file = sys.stderr if isinstance(output_sink, StreamSink) else sys.stdout
+    _print_reports(args, compiler, report_file)
+
+
+def _print_reports(args: argparse.Namespace, compiler: Compiler, report_file):
+    print(translation_reports(compiler, args.size_report), end="", file=report_file)
+    if args.stack_depth:
+        report = report_stack_depth(compiler.analyze_stack_depth())
+        print(report, end="", file=report_file)
+    if compiler.symbol_shortener is not None:
+        print(compiler.symbol_shortener.report(), end="", file=report_file)
+        if args.symbol_map:
+            compiler.symbol_shortener.write_symbol_map(args.symbol_map)
+    if args.stats:
+        print(compiler.instrumentation.report(), end="", file=report_file)
+    if args.stats_json:
+        args.stats_json.write_text(compiler.instrumentation.to_json())
+
+
+def main():
+    arg_parser = _create_arg_parser()
+    args = arg_parser.parse_args()
+    _check_args(arg_parser, args)
+    if args.manifest or len(args.path) > 1:
+        sys.exit(_translate_batch(args))
+    _translate(args)
+
+
 if __name__ == "__main__":
-    if len(argv) < 2:
-        raise IOError("Please pass path to the VM file that should be complied to ASM")
-    file_path = Path(argv[1])
-    compiler = Compiler(file_path)
-    compiler.compile_and_write_asm()
+    main()
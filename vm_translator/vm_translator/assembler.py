@@ -0,0 +1,201 @@
+import re
+from pathlib import Path
+from dataclasses import dataclass, field
+
+
+PREDEFINED_SYMBOLS = {
+    "SP": 0,
+    "LCL": 1,
+    "ARG": 2,
+    "THIS": 3,
+    "THAT": 4,
+    "SCREEN": 16384,
+    "KBD": 24576,
+    **{f"R{i}": i for i in range(16)},
+}
+VARIABLE_BASE_ADDRESS = 16
+MAX_A_VALUE = 32767
+_COMP_CODES = {
+    "0": "101010",
+    "1": "111111",
+    "-1": "111010",
+    "D": "001100",
+    "A": "110000",
+    "!D": "001101",
+    "!A": "110001",
+    "-D": "001111",
+    "-A": "110011",
+    "D+1": "011111",
+    "A+1": "110111",
+    "D-1": "001110",
+    "A-1": "110010",
+    "D+A": "000010",
+    "A+D": "000010",
+    "D-A": "010011",
+    "A-D": "000111",
+    "D&A": "000000",
+    "A&D": "000000",
+    "D|A": "010101",
+    "A|D": "010101",
+}
+COMP_CODES = {comp: f"0{bits}" for comp, bits in _COMP_CODES.items()}
+COMP_CODES.update(
+    {
+        comp.replace("A", "M"): f"1{bits}"
+        for comp, bits in _COMP_CODES.items()
+        if "A" in comp
+    }
+)
+DEST_BITS = {"A": 4, "D": 2, "M": 1}
+JUMP_CODES = {
+    "": "000",
+    "JGT": "001",
+    "JEQ": "010",
+    "JGE": "011",
+    "JLT": "100",
+    "JNE": "101",
+    "JLE": "110",
+    "JMP": "111",
+}
+ARITHMETIC_COMMENTS = {"add", "sub", "neg", "eq", "gt", "lt", "and", "or", "not"}
+UNKNOWN_KIND = "other"
+
+_COMMAND_COMMENT_PATTERN = re.compile(
+    r"Command\(cmd_type='(\w+)', arg_1=(?:'([^']*)'|None)"
+)
+_CMD_TYPE_PATTERN = re.compile(r"\b(C_[A-Z_]+)\b")
+
+
+@dataclass
+class AsmProgram:
+    """
+    Hack assembly with resolved symbols plus a source map built from the
+    comments the CodeWriter puts in front of every snippet:
+    - instruction_kinds: VM command type of the snippet each instruction belongs to
+    - function_entries: ROM address -> VM function name (labels of C_FUNCTION)
+    - return_points: ROM addresses of the labels defined by C_CALL snippets
+    """
+
+    instructions: list = field(default_factory=list)
+    symbols: dict = field(default_factory=dict)
+    labels: dict = field(default_factory=dict)
+    instruction_kinds: list = field(default_factory=list)
+    function_entries: dict = field(default_factory=dict)
+    return_points: set = field(default_factory=set)
+
+    @classmethod
+    def from_file(cls, asm_file_path: Path) -> "AsmProgram":
+        with open(asm_file_path) as file:
+            return cls.from_lines(file)
+
+    @classmethod
+    def from_lines(cls, lines) -> "AsmProgram":
+        program = cls(symbols=dict(PREDEFINED_SYMBOLS))
+        symbolic_instructions = []
+        kind = UNKNOWN_KIND
+        region_cmd = None
+        for line in lines:
+            comment = cls._get_comment(line)
+            if comment is not None:
+                kind, region_cmd = cls._parse_region_comment(comment)
+            instruction = cls._remove_comments_and_spaces(line)
+            if not instruction:
+                continue
+            if instruction.startswith("("):
+                label = instruction[1:-1]
+                if label in program.labels:
+                    raise AsmSyntaxError(f"label {label} is defined more than once")
+                address = len(symbolic_instructions)
+                program.labels[label] = address
+                program.symbols[label] = address
+                cls._register_region_label(program, region_cmd, label, address)
+                continue
+            symbolic_instructions.append(instruction)
+            program.instruction_kinds.append(kind)
+        program._resolve_symbols(symbolic_instructions)
+        return program
+
+    def _resolve_symbols(self, symbolic_instructions):
+        next_variable_address = VARIABLE_BASE_ADDRESS
+        for instruction in symbolic_instructions:
+            if instruction.startswith("@") and not instruction[1:].isdigit():
+                symbol = instruction[1:]
+                if symbol not in self.symbols:
+                    self.symbols[symbol] = next_variable_address
+                    next_variable_address += 1
+                instruction = f"@{self.symbols[symbol]}"
+            self.instructions.append(instruction)
+
+    def variables(self) -> dict:
+        return {
+            symbol: address
+            for symbol, address in self.symbols.items()
+            if symbol not in PREDEFINED_SYMBOLS and symbol not in self.labels
+        }
+
+    def to_machine_code(self) -> str:
+        """
+        Hack binary, one 16 character line of 0 and 1 per instruction.
+        """
+        return "".join(
+            f"{self._encode(instruction)}\n" for instruction in self.instructions
+        )
+
+    @staticmethod
+    def _encode(instruction: str) -> str:
+        if instruction.startswith("@"):
+            value = int(instruction[1:])
+            if value > MAX_A_VALUE:
+                raise AsmSyntaxError(f"{instruction} does not fit in an A instruction")
+            return f"{value:016b}"
+        dest, _, comp_and_jump = instruction.rpartition("=")
+        comp, _, jump = comp_and_jump.partition(";")
+        if (
+            comp not in COMP_CODES
+            or jump not in JUMP_CODES
+            or not set(dest) <= set(DEST_BITS)
+        ):
+            raise AsmSyntaxError(f"{instruction} is not a valid instruction")
+        dest_bits = sum(DEST_BITS[register] for register in set(dest))
+        return f"111{COMP_CODES[comp]}{dest_bits:03b}{JUMP_CODES[jump]}"
+
+    @staticmethod
+    def _register_region_label(program, region_cmd, label, address):
+        if not region_cmd:
+            return
+        cmd_type, arg_1 = region_cmd
+        if cmd_type == "C_FUNCTION" and label == arg_1:
+            program.function_entries[address] = label
+        elif cmd_type == "C_CALL":
+            program.return_points.add(address)
+
+    @staticmethod
+    def _get_comment(line: str):
+        position = line.find("//")
+        if position == -1:
+            return None
+        return line[position + 2 :].strip()
+
+    @staticmethod
+    def _parse_region_comment(comment: str):
+        command_match = _COMMAND_COMMENT_PATTERN.search(comment)
+        if command_match:
+            cmd_type, arg_1 = command_match.groups()
+            return cmd_type, (cmd_type, arg_1)
+        if comment in ARITHMETIC_COMMENTS:
+            return "C_ARITHMETIC", None
+        cmd_type_match = _CMD_TYPE_PATTERN.search(comment)
+        if cmd_type_match:
+            return cmd_type_match.group(1), None
+        return UNKNOWN_KIND, None
+
+    @staticmethod
+    def _remove_comments_and_spaces(line: str) -> str:
+        position = line.find("//")
+        if position != -1:
+            line = line[:position]
+        return "".join(line.split())
+
+
+class AsmSyntaxError(Exception):
+    pass
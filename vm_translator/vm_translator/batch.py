@@ -0,0 +1,119 @@
+import asyncio
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from vm_translator.VMTranslator import Compiler, translation_reports
+
+
+MANIFEST_COMMENT_SIGN = "#"
+
+
+@dataclass
+class ProjectResult:
+    path: Path
+    asm_path: Path = None
+    rom_words: int = 0
+    vm_lines: int = 0
+    seconds: float = 0.0
+    error: str = None
+    reports: str = ""
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    def report(self) -> str:
+        if not self.ok:
+            return f"FAIL {self.path}: {self.error}"
+        line = (
+            f"ok   {self.path} -> {self.asm_path}"
+            f" ({self.rom_words} words, {self.seconds:.3f}s)"
+        )
+        return f"{line}\n{self.reports.rstrip()}" if self.reports else line
+
+
+@dataclass
+class BatchSummary:
+    results: list = field(default_factory=list)
+    seconds: float = 0.0
+
+    @property
+    def failed(self) -> list:
+        return [result for result in self.results if not result.ok]
+
+    def report(self) -> str:
+        vm_lines = sum(result.vm_lines for result in self.results)
+        seconds = self.seconds or 1e-9
+        return (
+            f"{len(self.results) - len(self.failed)} of {len(self.results)} projects"
+            f" translated, {len(self.failed)} failed, in {self.seconds:.2f}s:"
+            f" {len(self.results) / seconds:.1f} projects/s,"
+            f" {vm_lines / seconds:.0f} VM lines/s\n"
+        )
+
+
+def read_manifest(manifest_path: Path) -> list:
+    """
+    One project path per line, relative to the manifest directory, lines
+    starting with # are comments.
+    """
+    paths = []
+    for line in manifest_path.read_text().splitlines():
+        line = line.strip()
+        if line and not line.startswith(MANIFEST_COMMENT_SIGN):
+            paths.append(manifest_path.parent / line)
+    return paths
+
+
+def compile_project(
+    path: Path, options: dict, size_report: bool = False
+) -> ProjectResult:
+    """
+    Runs in a worker process, errors are returned in the result. The result
+    has the translation_reports of the project.
+    """
+    start = time.perf_counter()
+    result = ProjectResult(path)
+    try:
+        compiler = Compiler(path, **options)
+        compiler.compile_and_write_asm()
+        result.asm_path = compiler.asm_file_path
+        result.rom_words = compiler.code_size.total
+        result.reports = translation_reports(compiler, size_report)
+        vm_files = path.glob("**/*.vm") if path.is_dir() else [path]
+        result.vm_lines = sum(vm_file.read_bytes().count(b"\n") for vm_file in vm_files)
+    except Exception as error:
+        result.error = f"{type(error).__name__}: {error}"
+    result.seconds = time.perf_counter() - start
+    return result
+
+
+async def run_batch(
+    paths, workers: int = None, on_result=None, size_report: bool = False, **options
+):
+    """
+    Translates every path in a pool of at most workers processes, options
+    are passed to Compiler, size_report adds the size breakdown to the
+    reports of the results. on_result is called with every ProjectResult as
+    soon as its project is done, the results of the summary are in the
+    order of completion.
+    """
+    loop = asyncio.get_running_loop()
+    summary = BatchSummary()
+    start = time.perf_counter()
+    with ProcessPoolExecutor(workers) as executor:
+        pending = [
+            loop.run_in_executor(
+                executor, compile_project, Path(path), options, size_report
+            )
+            for path in paths
+        ]
+        for next_done in asyncio.as_completed(pending):
+            result = await next_done
+            summary.results.append(result)
+            if on_result is not None:
+                on_result(result)
+    summary.seconds = time.perf_counter() - start
+    return summary
@@ -0,0 +1,145 @@
+"""
+Runs one program on many RAM images at once, needs NumPy (the "batch" extra).
+"""
+
+import numpy as np
+
+from vm_translator.assembler import AsmProgram
+from vm_translator.emulator import (
+    _COMP_EXPRESSIONS,
+    COMP_FUNCTIONS,
+    DEFAULT_MAX_CYCLES,
+    RAM_SIZE,
+    Emulator,
+    InvalidAddressError,
+)
+
+# the expressions of the scalar emulator wrap around on int16 arrays
+BATCH_COMP_FUNCTIONS = {
+    comp: eval(f"lambda a, d, m: {expression}")
+    for comp, expression in _COMP_EXPRESSIONS.items()
+}
+_SCALAR_TO_BATCH_COMP = {
+    COMP_FUNCTIONS[comp]: function for comp, function in BATCH_COMP_FUNCTIONS.items()
+}
+BATCH_JUMP_FUNCTIONS = {
+    "JGT": np.greater,
+    "JEQ": np.equal,
+    "JGE": np.greater_equal,
+    "JLT": np.less,
+    "JNE": np.not_equal,
+    "JLE": np.less_equal,
+}
+
+
+class BatchEmulator:
+    """
+    Hack CPU emulator running the same program in lockstep on batch_size
+    lanes, every lane with its own registers and RAM image (ram is a
+    batch_size x RAM_SIZE int16 matrix). Each step executes the instruction
+    at the lowest PC of the running lanes for all lanes at that PC, the
+    others are masked out until they meet again, so lanes which don't
+    diverge run fully vectorized. A lane stops like the Emulator: when it
+    halts or after max_cycles of its own instructions.
+    """
+
+    def __init__(self, program: AsmProgram, batch_size: int, rams=None):
+        """
+        rams holds a {address: value} dict per lane.
+        """
+        scalar = Emulator(program)
+        self.program = program
+        self.rom = [
+            (
+                instruction
+                if instruction[0]
+                else (False, _SCALAR_TO_BATCH_COMP[instruction[1]], *instruction[2:])
+            )
+            for instruction in scalar.rom
+        ]
+        self._stops = np.zeros(len(self.rom) + 1, dtype=bool)
+        self._stops[list(scalar.halt_addresses)] = True
+        self._stops[len(self.rom)] = True
+        self.ram = np.zeros((batch_size, RAM_SIZE), dtype=np.int16)
+        for lane, lane_ram in enumerate(rams or ()):
+            for address, value in lane_ram.items():
+                self.ram[lane, address] = np.uint16(value & 0xFFFF).view(np.int16)
+        self.a = np.zeros(batch_size, dtype=np.int16)
+        self.d = np.zeros(batch_size, dtype=np.int16)
+        self.pc = np.zeros(batch_size, dtype=np.int64)
+        self.cycles = np.zeros(batch_size, dtype=np.int64)
+        self.halted = np.zeros(batch_size, dtype=bool)
+        self.steps = 0
+
+    @property
+    def batch_size(self) -> int:
+        return len(self.ram)
+
+    def read(self, address: int) -> np.ndarray:
+        return self.ram[:, address]
+
+    def run(self, max_cycles: int = DEFAULT_MAX_CYCLES) -> np.ndarray:
+        """
+        Executes until every lane stopped, returns the cycles of every lane.
+        """
+        limits = self.cycles + max_cycles
+        self._mark_halted(np.arange(self.batch_size))
+        running = np.flatnonzero(~self.halted & (self.cycles < limits))
+        while len(running):
+            # no lane can reach its cycle limit in fewer steps
+            steps = int((limits[running] - self.cycles[running]).min())
+            while steps and not self._step(running):
+                steps -= 1
+            running = np.flatnonzero(~self.halted & (self.cycles < limits))
+        return self.cycles
+
+    def _step(self, running: np.ndarray) -> bool:
+        """
+        Executes the instruction at the lowest PC, True if a lane halted.
+        """
+        ram, a, d, pc = self.ram, self.a, self.d, self.pc
+        self.steps += 1
+        lane_pcs = pc[running]
+        current = lane_pcs.min()
+        if lane_pcs.max() != current:
+            lanes = rows = running[lane_pcs == current]
+        elif len(running) == self.batch_size:
+            # every lane runs the instruction, slices are much cheaper
+            lanes, rows = slice(None), running
+        else:
+            lanes = rows = running
+        instruction = self.rom[current]
+        self.cycles[lanes] += 1
+        if instruction[0]:
+            a[lanes] = np.uint16(instruction[1]).view(np.int16)
+            pc[lanes] = current + 1
+            return self._stops[current + 1] and self._mark_halted(rows)
+        _, comp, uses_m, dest_a, dest_d, dest_m, jump = instruction
+        lane_a = a[lanes]
+        addresses = lane_a.view(np.uint16)
+        try:
+            value = comp(lane_a, d[lanes], ram[rows, addresses] if uses_m else None)
+            if dest_m:
+                ram[rows, addresses] = value
+        except IndexError:
+            raise InvalidAddressError(int(current), int(addresses.max())) from None
+        if dest_d:
+            d[lanes] = value
+        # the jump target is A before this instruction, addresses may be a view of A
+        if not jump:
+            pc[lanes] = current + 1
+        elif jump == "JMP":
+            pc[lanes] = addresses
+        else:
+            taken = BATCH_JUMP_FUNCTIONS[jump](value, 0)
+            pc[lanes] = np.where(taken, addresses, current + 1)
+        if dest_a:
+            a[lanes] = value
+        if not jump:
+            return self._stops[current + 1] and self._mark_halted(rows)
+        return self._mark_halted(rows)
+
+    def _mark_halted(self, lanes: np.ndarray) -> bool:
+        stopped = self._stops[np.minimum(self.pc[lanes], len(self.rom))]
+        self.halted[lanes[stopped]] = True
+        return stopped.any()
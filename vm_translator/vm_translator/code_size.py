@@ -0,0 +1,53 @@
+from collections import Counter
+from dataclasses import dataclass, field
+
+
+TOP_LEVEL = "[top]"
+BOOTSTRAP = "[bootstrap]"
+SHARED_ROUTINES = "[shared]"
+
+
+@dataclass
+class CodeSizeAccounting:
+    """
+    ROM words written so far, per VM function, per source file and per VM
+    command type. rom_budget of None means no limit.
+    """
+
+    rom_budget: int = None
+    total: int = 0
+    by_function: Counter = field(default_factory=Counter)
+    by_file: Counter = field(default_factory=Counter)
+    by_kind: Counter = field(default_factory=Counter)
+
+    def add(self, size: int, function_name: str, file_name: str, kind: str):
+        self.total += size
+        self.by_function[function_name] += size
+        self.by_file[file_name] += size
+        self.by_kind[kind] += size
+
+    def merge(self, other: "CodeSizeAccounting"):
+        self.total += other.total
+        self.by_function.update(other.by_function)
+        self.by_file.update(other.by_file)
+        self.by_kind.update(other.by_kind)
+
+    def is_over_budget(self) -> bool:
+        return self.rom_budget is not None and self.total > self.rom_budget
+
+    def breakdown(self, top: int = 10) -> str:
+        budget = "" if self.rom_budget is None else f" of {self.rom_budget}"
+        lines = [f"ROM words: {self.total}{budget}"]
+        for title, counter in (
+            ("functions", self.by_function),
+            ("files", self.by_file),
+            ("command types", self.by_kind),
+        ):
+            lines.append(f"Largest {title}:")
+            for name, size in counter.most_common(top):
+                lines.append(f"{size:>10}  {name}")
+        return "\n".join(lines) + "\n"
+
+
+class RomBudgetExceededError(Exception):
+    pass
@@ -1,107 +1,310 @@
+import warnings
 from pathlib import Path
 from datetime import datetime
+from dataclasses import dataclass
+from functools import lru_cache
 from vm_translator.parser import Command
+from vm_translator.instrumentation import Instrumentation, CODEGEN, WRITE
+from vm_translator.context import COMPARISONS, TranslationContext
+from vm_translator.frames import frame_slot
+from vm_translator.fusion import ARRAY_ACCESS
+from vm_translator.literals import APPEND_CHAR, STRING_LITERAL, PooledLiteral
+from vm_translator.strength import (
+    DIVIDE,
+    MULTIPLY,
+    is_power_of_two,
+    non_adjacent_form,
+)
+from vm_translator.sinks import OutputSink, FileSink
+from vm_translator.snippets import (
+    COMPACT_SNIPPET_TEMPLATES,
+    POINTER_REGISTERS,
+    PUSH_D_LINES,
+    PUSH_ZERO,
+    PUSH_ZERO_INSTRUCTIONS,
+    RETURN_LINES,
+    SNIPPET_TEMPLATES,
+    TEMP_BASE_ADDRESS,
+    count_instructions,
+)
+from vm_translator.code_size import (
+    CodeSizeAccounting,
+    RomBudgetExceededError,
+    BOOTSTRAP,
+    SHARED_ROUTINES as SHARED_ROUTINES_NAME,
+)
+
+
+HACK_ROM_SIZE = 32768
+SNIPPET_CACHE_SIZE = 4096
+STATIC_OVERFLOW_WARN = "warn"
+STATIC_OVERFLOW_ERROR = "error"
+
+
+@dataclass(frozen=True)
+class CodeShape:
+    """
+    Size-vs-speed choices for the generated snippets:
+    - shared_calls: call/return jump into shared routines instead of being inlined
+    - shared_comparisons: gt/lt/eq jump into shared routines instead of being inlined
+    - looped_local_init: locals are zeroed by a loop instead of unrolled pushes
+    """
+
+    shared_calls: bool = False
+    shared_comparisons: bool = False
+    looped_local_init: bool = False
+
+
+FAST_SHAPE = CodeShape()
+COMPACT_SHAPE = CodeShape(
+    shared_calls=True, shared_comparisons=True, looped_local_init=True
+)
 
 
 class CodeWriter:
-    def __init__(self, file_path: Path, write_header=False):
-        self.label_counter = {
-            "gt": 0,
-            "lt": 0,
-            "eq": 0,
-        }
+    def __init__(
+        self,
+        file_path: Path,
+        write_header=False,
+        default_shape: CodeShape = FAST_SHAPE,
+        function_shapes: dict = None,
+        rom_budget: int = None,
+        instrumentation: Instrumentation = None,
+        sink: OutputSink = None,
+        snippet_cache_size: int = SNIPPET_CACHE_SIZE,
+        context: TranslationContext = None,
+        allocate_statics: bool = False,
+        static_overflow: str = STATIC_OVERFLOW_WARN,
+        static_frames: dict = None,
+    ):
+        """
+        allocate_statics writes the RAM addresses of the static variables
+        instead of File.i symbols. A static segment overflow warns, or with
+        static_overflow "error" fails once an allocated address is past it.
+        static_frames maps functions to the first frame slot of their locals
+        (see frames.plan_static_frames), their locals become variables next
+        to the statics instead of being pushed on the stack. With
+        allocate_statics, close_file rejects calls of undefined functions,
+        which the assembler would allocate as variables on the statics.
+        """
         self.file_path = file_path
-        self.open_file = None
-        self.file_name = file_path.name[: file_path.name.find(".")]
-        self._current_return_labels = {}
-        self._c_arithmetic_cmd_mapping = {
-            "add": self._generate_add_cmd,
-            "sub": self._generate_sub_cmd,
-            "gt": self._generate_gt_cmd,
-            "lt": self._generate_lt_cmd,
-            "eq": self._generate_eq_cmd,
-            "not": self._generate_not_cmd,
-            "or": self._generate_or_cmd,
-            "and": self._generate_and_cmd,
-            "neg": self._generate_neg_cmd,
-        }
-        self._c_push_cmd_mapping = {
-            "constant": self._generate_push_constant_cmd,
-            "argument": self._generate_push_cmd_for_local_argument_this_that,
-            "local": self._generate_push_cmd_for_local_argument_this_that,
-            "this": self._generate_push_cmd_for_local_argument_this_that,
-            "that": self._generate_push_cmd_for_local_argument_this_that,
-            "temp": self._generate_push_temp_cmd,
-            "static": self._generate_push_static_cmd,
-            "pointer": self._generate_push_pointer_cmd,
-        }
-        self._c_pop_cmd_mapping = {
-            "argument": self._generate_pop_cmd_for_local_argument_this_that,
-            "local": self._generate_pop_cmd_for_local_argument_this_that,
-            "this": self._generate_pop_cmd_for_local_argument_this_that,
-            "that": self._generate_pop_cmd_for_local_argument_this_that,
-            "temp": self._generate_pop_temp_cmd,
-            "static": self._generate_pop_static_cmd,
-            "pointer": self._generate_pop_pointer_cmd,
-        }
+        self.sink = sink if sink is not None else FileSink(file_path)
+        if context is None:
+            context = TranslationContext(file_path.name[: file_path.name.find(".")])
+        context.shape = default_shape
+        self.context = context
+        self.default_shape = default_shape
+        self.function_shapes = function_shapes or {}
+        self._used_routines = []
+        self.code_size = CodeSizeAccounting(rom_budget)
+        self.instrumentation = instrumentation
+        self.allocate_statics = allocate_statics
+        self.static_overflow = static_overflow
+        self.static_frames = static_frames or {}
+        self.string_literals = {}
+        self._defined_functions = set()
+        # called function -> function of its first call
+        self._called_functions = {}
+        self._render_memory_access = lru_cache(snippet_cache_size)(
+            self._render_memory_access_snippet
+        )
         if write_header:
             self._write_header_to_file()
 
+    @property
+    def label_counter(self) -> dict:
+        return self.context.labels.comparison_counter
+
+    @property
+    def file_name(self) -> str:
+        return self.context.file_name
+
+    @file_name.setter
+    def file_name(self, file_name: str):
+        self.context.file_name = file_name
+
+    def begin_file(self, file_name: str):
+        """
+        Following commands come from file_name, which namespaces their statics.
+        """
+        self.context.file_name = file_name
+
     def write_cmd(self, cmd: Command):
-        self._open_file_to_write_if_not_opened()
+        if self.instrumentation is not None:
+            self._write_cmd_instrumented(cmd)
+            return
+        asm_code, instructions = self._translate(cmd)
+        self._account_code_size(instructions, self.context.function_name, cmd.cmd_type)
+        self.sink.write(asm_code)
+
+    def _write_cmd_instrumented(self, cmd: Command):
+        token = self.instrumentation.begin(CODEGEN, self.file_name)
+        asm_code, instructions = self._translate(cmd)
+        self.instrumentation.end(token)
+        self._account_code_size(instructions, self.context.function_name, cmd.cmd_type)
+        self.instrumentation.record_command(cmd, self.file_name, instructions)
+        token = self.instrumentation.begin(WRITE, self.file_name)
+        self.sink.write(asm_code)
+        self.instrumentation.end(token)
+        self.instrumentation.record_write(len(asm_code))
+
+    def translate_cmd(self, cmd: Command) -> str:
+        return self._translate(cmd)[0]
+
+    def _translate(self, cmd: Command):
+        """
+        Returns (asm code, its size in ROM words)
+        """
         if cmd.cmd_type == "C_ARITHMETIC":
-            self.open_file.writelines(self._generate_c_arithmetic_cmd(cmd))
-        elif cmd.cmd_type == "C_PUSH":
-            self.open_file.writelines(self._generate_c_push_cmd(cmd))
-        elif cmd.cmd_type == "C_POP":
-            self.open_file.writelines(self._generate_c_pop_cmd(cmd))
-        elif cmd.cmd_type == "C_LABEL":
-            self.open_file.writelines(self._generate_c_label_cmd(cmd))
-        elif cmd.cmd_type == "C_GOTO":
-            self.open_file.writelines(self._generate_c_goto_cmd(cmd))
-        elif cmd.cmd_type == "C_IF":
-            self.open_file.writelines(self._generate_c_if_cmd(cmd))
+            return self._generate_c_arithmetic_cmd(cmd)
+        elif cmd.cmd_type == "C_PUSH" or cmd.cmd_type == "C_POP":
+            return self._generate_memory_access_cmd(cmd)
+        elif cmd.cmd_type in ("C_LABEL", "C_GOTO", "C_IF"):
+            return self._generate_branching_cmd(cmd)
         elif cmd.cmd_type == "C_FUNCTION":
-            self.open_file.writelines(self._generate_c_function_cmd(cmd))
+            self._defined_functions.add(cmd.arg_1)
+            self.context.function_name = cmd.arg_1
+            self.context.shape = self.function_shapes.get(cmd.arg_1, self.default_shape)
+            return self._generate_c_function_cmd(cmd)
         elif cmd.cmd_type == "C_RETURN":
-            self.open_file.writelines(self._generate_c_return_cmd(cmd))
+            return self._generate_c_return_cmd(cmd)
         elif cmd.cmd_type == "C_CALL":
-            self.open_file.writelines(self._generate_c_call_cmd(cmd))
+            self._called_functions.setdefault(cmd.arg_1, self.context.function_name)
+            return self._generate_c_call_cmd(cmd)
+        elif cmd.cmd_type == STRING_LITERAL:
+            self._called_functions.setdefault(APPEND_CHAR, self.context.function_name)
+            return self._generate_string_literal_cmd(cmd)
+        elif cmd.cmd_type == ARRAY_ACCESS:
+            snippet = SNIPPET_TEMPLATES[ARRAY_ACCESS, cmd.arg_1]
+            return snippet.render(cmd=cmd), snippet.instructions
         else:
             self._raise_unrecognised_cmd(cmd)
 
     def _write_header_to_file(self):
+        asm_code = self.translate_header()
+        self._account_code_size(count_instructions(asm_code), BOOTSTRAP, "bootstrap")
+        self._write_untimed(asm_code)
+
+    def _write_untimed(self, asm_code: str):
+        self.sink.write(asm_code)
+        if self.instrumentation is not None:
+            self.instrumentation.record_write(len(asm_code))
+
+    def translate_header(self) -> str:
         """
         SP = 256
         call Sys.init
         :return:
         """
-
-        self._open_file_to_write_if_not_opened()
-        self.open_file.writelines(
+        return (
             f"// ASM FILE created by VMTranslator created by pajdek.\n"
             f"// Compilation date: {datetime.today()}\n"
-        )
-        self.open_file.writelines("// set SP to 256\n" "@256\n" "D=A\n" "@SP\n" "M=D\n")
-        self.write_cmd(Command("C_CALL", "Sys.init", 0))
+            "// set SP to 256\n"
+            "@256\n"
+            "D=A\n"
+            "@SP\n"
+            "M=D\n"
+        ) + self.translate_cmd(Command("C_CALL", "Sys.init", 0))
 
     def _generate_c_arithmetic_cmd(self, cmd: Command):
-        c_arithmetic_function = self._c_arithmetic_cmd_mapping.get(cmd.arg_1)
-        if not c_arithmetic_function:
+        if cmd.arg_1 in COMPARISONS:
+            return self._generate_comparison_cmd(cmd.arg_1)
+        if cmd.arg_1 == MULTIPLY:
+            return self._generate_multiply_cmd(cmd)
+        if cmd.arg_1 == DIVIDE:
+            return self._generate_divide_cmd(cmd)
+        snippet = SNIPPET_TEMPLATES.get(("C_ARITHMETIC", cmd.arg_1))
+        if not snippet:
             self._raise_unrecognised_cmd(cmd)
-        return c_arithmetic_function()
+        return snippet.template, snippet.instructions
 
-    def _generate_c_push_cmd(self, cmd: Command):
-        c_push_function = self._c_push_cmd_mapping.get(cmd.arg_1)
-        if not c_push_function:
-            self._raise_unrecognised_cmd(cmd)
-        return c_push_function(cmd)
+    @staticmethod
+    def _generate_multiply_cmd(cmd: Command):
+        """
+        Multiplies the top of the stack by the constant arg_2 (see
+        strength.reduce_strength). Powers of two double the operand in
+        place, other constants use Horner's scheme over their non-adjacent
+        form: D doubles through the free word above the stack once per
+        digit and adds or subtracts the operand for every non-zero digit.
+        """
+        constant = cmd.arg_2
+        if constant == 0:
+            lines = ["@SP", "A=M-1", "M=0"]
+        elif is_power_of_two(constant):
+            lines = ["@SP", "A=M-1"]
+            lines += ["D=M", "M=D+M"] * (constant.bit_length() - 1)
+        else:
+            lines = ["@SP", "A=M-1", "D=M", "A=A+1"]
+            at_operand = False
+            for digit in non_adjacent_form(constant)[1:]:
+                if at_operand:
+                    lines.append("A=A+1")
+                lines += ["M=D", "D=D+M"]
+                at_operand = bool(digit)
+                if digit:
+                    lines += ["A=A-1", "D=D+M" if digit > 0 else "D=D-M"]
+            if not at_operand:
+                lines.append("A=A-1")
+            lines.append("M=D")
+        return "\n".join((f"\n// {cmd}", *lines)), len(lines)
+
+    def _generate_divide_cmd(self, cmd: Command):
+        """
+        Divides the top of the stack by the power of two arg_2.
+        """
+        self._use_routine("$$DIVIDE")
+        snippet = SNIPPET_TEMPLATES["C_ARITHMETIC", DIVIDE]
+        asm_code = snippet.render(
+            cmd=cmd,
+            shifts=16 - (cmd.arg_2.bit_length() - 1),
+            return_label=self._generate_func_return_label(),
+        )
+        return asm_code, snippet.instructions
+
+    def _generate_memory_access_cmd(self, cmd: Command):
+        namespace = None
+        if cmd.arg_1 == "static":
+            namespace = self.file_name
+        elif cmd.arg_1 == "local":
+            namespace = self.static_frames.get(self.context.function_name)
+        return self._render_memory_access(cmd.cmd_type, cmd.arg_1, cmd.arg_2, namespace)
 
-    def _generate_c_pop_cmd(self, cmd: Command):
-        c_pop_function = self._c_pop_cmd_mapping.get(cmd.arg_1)
-        if not c_pop_function:
+    def _render_memory_access_snippet(self, cmd_type, segment, index, namespace):
+        """
+        Push/pop snippet, memoized by (command type, segment, index, namespace)
+        in an LRU cache of snippet_cache_size entries. The namespace is the
+        file name of statics and the first frame slot of static frame locals.
+        """
+        cmd = Command(cmd_type, segment, index)
+        snippet = SNIPPET_TEMPLATES.get((cmd_type, segment))
+        if not snippet:
             self._raise_unrecognised_cmd(cmd)
-        return c_pop_function(cmd)
+        if segment == "temp":
+            operand = TEMP_BASE_ADDRESS + index
+        elif segment == "static":
+            operand = self._variable_operand(f"{namespace}.{index}")
+        elif segment == "local" and namespace is not None:
+            snippet = SNIPPET_TEMPLATES[cmd_type, "static"]
+            operand = self._variable_operand(frame_slot(namespace + index))
+        elif segment == "pointer":
+            operand = POINTER_REGISTERS[index]
+        else:
+            operand = index
+        return snippet.render(cmd=cmd, operand=operand), snippet.instructions
+
+    def _variable_operand(self, symbol: str):
+        statics = self.context.statics
+        address = statics.allocate_variable(symbol)
+        if statics.overflow and self.static_overflow == STATIC_OVERFLOW_ERROR:
+            self.sink.abort()
+            raise StaticSegmentOverflowError(
+                f"{self.file_path} has more static variables than fit below"
+                f" the stack\n{statics.memory_map()}"
+            )
+        return address if self.allocate_statics else symbol
+
+    def snippet_cache_info(self):
+        return self._render_memory_access.cache_info()
 
     @staticmethod
     def _raise_unrecognised_cmd(cmd: Command):
@@ -109,334 +312,176 @@ class CodeWriter:
             f"{cmd} is not handled by the compiler, check your VM code"
         )
 
-    def _open_file_to_write_if_not_opened(self):
-        if not self.open_file:
-            self.open_file = open(self.file_path, "w")
-
     def close_file(self):
-        self.open_file.close()
-
-    @staticmethod
-    def _generate_add_cmd():
-        command_lines = ("\n// add", "@SP", "AM=M-1", "D=M", "A=A-1", "M=D+M")
-        return "\n".join(command_lines)
-
-    @staticmethod
-    def _generate_sub_cmd():
-        command_lines = ("\n// sub", "@SP", "AM=M-1", "D=M", "A=A-1", "M=M-D")
-        return "\n".join(command_lines)
-
-    @staticmethod
-    def _generate_or_cmd():
-        command_lines = ("\n// or", "@SP", "AM=M-1", "D=M", "A=A-1", "M=D|M")
-        return "\n".join(command_lines)
-
-    @staticmethod
-    def _generate_and_cmd():
-        command_lines = ("\n// and", "@SP", "AM=M-1", "D=M", "A=A-1", "M=D&M")
-        return "\n".join(command_lines)
-
-    @staticmethod
-    def _generate_not_cmd():
-        command_lines = ("\n// or", "@SP", "A=M-1", "M=!M")
-        return "\n".join(command_lines)
-
-    @staticmethod
-    def _generate_neg_cmd():
-        command_lines = ("\n// or", "@SP", "A=M-1", "M=-M")
-        return "\n".join(command_lines)
-
-    def _generate_gt_cmd(self):
-        label = self.label_counter["gt"]
-        self.label_counter["gt"] = label + 1
-        command_lines = (
-            "\n// gt",
-            "@SP",
-            "AM=M-1",
-            "D=M",
-            "@R13",
-            "M=D",
-            "@SP",
-            "A=M-1",
-            "D=M",
-            "@R13",
-            "D=D-M",
-            f"@gt{label}",
-            "D; JGT",
-            "@SP",
-            "A=M-1",
-            "M=0",
-            f"@gtEND{label}",
-            "0; JMP",
-            f"(gt{label})",
-            "@SP",
-            "A=M-1",
-            "M=-1",
-            f"(gtEND{label})",
-        )
-        return "\n".join(command_lines)
-
-    def _generate_lt_cmd(self):
-        label = self.label_counter["lt"]
-        self.label_counter["lt"] = label + 1
-        command_lines = (
-            "\n// gt",
-            "@SP",
-            "AM=M-1",
-            "D=M",
-            "@R13",
-            "M=D",
-            "@SP",
-            "A=M-1",
-            "D=M",
-            "@R13",
-            "D=D-M",
-            f"@lt{label}",
-            "D; JLT",
-            "@SP",
-            "A=M-1",
-            "M=0",
-            f"@ltEND{label}",
-            "0; JMP",
-            f"(lt{label})",
-            "@SP",
-            "A=M-1",
-            "M=-1",
-            f"(ltEND{label})",
-        )
-        return "\n".join(command_lines)
-
-    def _generate_eq_cmd(self):
-        label = self.label_counter["eq"]
-        self.label_counter["eq"] = label + 1
-        command_lines = (
-            "\n// gt",
-            "@SP",
-            "AM=M-1",
-            "D=M",
-            "@R13",
-            "M=D",
-            "@SP",
-            "A=M-1",
-            "D=M",
-            "@R13",
-            "D=D-M",
-            f"@eq{label}",
-            "D; JEQ",
-            "@SP",
-            "A=M-1",
-            "M=0",
-            f"@eqEND{label}",
-            "0; JMP",
-            f"(eq{label})",
-            "@SP",
-            "A=M-1",
-            "M=-1",
-            f"(eqEND{label})",
-        )
-        return "\n".join(command_lines)
-
-    @staticmethod
-    def _generate_push_constant_cmd(cmd: Command):
-        command_lines = (
-            f"\n// {cmd}",
-            f"@{cmd.arg_2}",
-            "D=A",
-            "@SP",
-            "A=M",
-            "M=D",
-            "@SP",
-            "M=M+1",
-        )
-        return "\n".join(command_lines)
-
-    @staticmethod
-    def _generate_pop_local_cmd(cmd: Command):
-        command_lines = (
-            f"\n// {cmd}",
-            f"@{cmd.arg_2}",
-            "D=A",
-            "@LCL",
-            "D=M+D",
-            "@R13",
-            "M=D",
-            "@SP",
-            "AM=M-1",
-            "D=M",
-            "@R13",
-            "A=M",
-            "M=D",
-        )
-        return "\n".join(command_lines)
+        if self.allocate_statics:
+            self._check_called_functions()
+        if self._used_routines:
+            self._account_code_size(
+                count_instructions(SHARED_ROUTINES_GUARD), SHARED_ROUTINES_NAME, "other"
+            )
+            for name in self._used_routines:
+                self._account_code_size(
+                    count_instructions(SHARED_ROUTINES[name]),
+                    SHARED_ROUTINES_NAME,
+                    SHARED_ROUTINE_KINDS[name],
+                )
+            for literal in self.string_literals.values():
+                self._account_code_size(
+                    count_instructions(_string_pool_entry(literal)),
+                    SHARED_ROUTINES_NAME,
+                    STRING_LITERAL,
+                )
+            self._write_untimed(self.translate_shared_routines())
+        self.sink.close()
+        if self.context.statics.overflow:
+            warnings.warn(
+                f"{self.file_path}: {self.context.statics.overflow} static"
+                " variables overflow into the stack",
+                StaticSegmentOverflowWarning,
+                stacklevel=2,
+            )
+
+    def _check_called_functions(self):
+        undefined = [
+            f"{function} (called in {caller})"
+            for function, caller in self._called_functions.items()
+            if function not in self._defined_functions
+        ]
+        if undefined:
+            self.sink.abort()
+            raise UndefinedFunctionError(
+                f"{self.file_path} calls undefined functions, whose labels would"
+                " be allocated as variables on the allocated statics: "
+                + ", ".join(undefined)
+            )
+
+    def _account_code_size(self, instructions: int, function_name: str, kind: str):
+        file_name = self.file_name
+        if function_name in (BOOTSTRAP, SHARED_ROUTINES_NAME):
+            file_name = function_name
+        self.code_size.add(instructions, function_name, file_name, kind)
+        self._check_rom_budget()
+
+    def _check_rom_budget(self):
+        if self.code_size.is_over_budget():
+            self.sink.abort()
+            raise RomBudgetExceededError(
+                f"{self.file_path} does not fit in the ROM budget\n"
+                f"{self.code_size.breakdown()}"
+            )
+
+    def write_fragment(
+        self, asm_code: str, code_size: CodeSizeAccounting, used_routines=()
+    ):
+        """
+        Writes asm translated earlier by another writer (e.g. a cached
+        fragment of one file) together with its ROM accounting and the
+        shared routines it jumps into.
+        """
+        self.code_size.merge(code_size)
+        self._check_rom_budget()
+        for name in used_routines:
+            self._use_routine(name)
+        self._write_untimed(asm_code)
 
-    @staticmethod
-    def _generate_push_cmd_for_local_argument_this_that(cmd: Command):
-        pointer_mapping = {
-            "local": "LCL",
-            "argument": "ARG",
-            "this": "THIS",
-            "that": "THAT",
-        }
-        command_lines = (
-            f"\n// {cmd}",
-            f"@{cmd.arg_2}",
-            "D=A",
-            f"@{pointer_mapping[cmd.arg_1]}",
-            "A=M+D",
-            "D=M",
-            "@SP",
-            "A=M",
-            "M=D",
-            "@SP",
-            "M=M+1",
-        )
-        return "\n".join(command_lines)
+    @property
+    def used_routines(self) -> tuple:
+        return tuple(self._used_routines)
 
-    @staticmethod
-    def _generate_pop_cmd_for_local_argument_this_that(cmd: Command):
-        pointer_mapping = {
-            "local": "LCL",
-            "argument": "ARG",
-            "this": "THIS",
-            "that": "THAT",
-        }
-        command_lines = (
-            f"\n// {cmd}",
-            f"@{cmd.arg_2}",
-            "D=A",
-            f"@{pointer_mapping[cmd.arg_1]}",
-            "D=M+D",
-            "@R13",
-            "M=D",
-            "@SP",
-            "AM=M-1",
-            "D=M",
-            "@R13",
-            "A=M",
-            "M=D",
-        )
-        return "\n".join(command_lines)
+    def translate_shared_routines(self) -> str:
+        """
+        Routines used by the compact code shapes, placed after the program
+        behind a halt loop so they are only reachable by jumps.
+        """
+        if not self._used_routines:
+            return ""
+        routines = [SHARED_ROUTINES_GUARD]
+        routines += [SHARED_ROUTINES[name] for name in self._used_routines]
+        routines += [
+            _string_pool_entry(literal) for literal in self.string_literals.values()
+        ]
+        return "".join(routines)
+
+    def _use_routine(self, name: str):
+        if name not in self._used_routines:
+            self._used_routines.append(name)
+
+    def _generate_comparison_cmd(self, comparison: str):
+        label = self.context.labels.next_comparison_label(comparison)
+        if self.context.shape.shared_comparisons:
+            routine = f"$${comparison.upper()}"
+            self._use_routine(routine)
+            snippet = COMPACT_SNIPPET_TEMPLATES["C_ARITHMETIC", "comparison"]
+            asm_code = snippet.render(
+                comparison=comparison, label=label, routine=routine
+            )
+            return asm_code, snippet.instructions
+        snippet = SNIPPET_TEMPLATES["C_ARITHMETIC", comparison]
+        asm_code = snippet.render(comparison=comparison, label=label)
+        return asm_code, snippet.instructions
 
     @staticmethod
-    def _generate_push_temp_cmd(cmd: Command):
-        temp_start = 5
-        command_lines = (
-            f"\n// {cmd}",
-            f"@{temp_start + cmd.arg_2}",
-            "D=M",
-            "@SP",
-            "A=M",
-            "M=D",
-            "@SP",
-            "M=M+1",
+    def _generate_branching_cmd(cmd: Command):
+        snippet = SNIPPET_TEMPLATES[cmd.cmd_type, None]
+        return snippet.render(cmd=cmd, label=cmd.arg_1), snippet.instructions
+
+    def _generate_c_function_cmd(self, cmd: Command):
+        first_slot = self.static_frames.get(cmd.arg_1)
+        if first_slot is not None:
+            return self._generate_static_frame_function_cmd(cmd, first_slot)
+        if self.context.shape.looped_local_init and cmd.arg_2 > 1:
+            snippet = COMPACT_SNIPPET_TEMPLATES["C_FUNCTION", None]
+            asm_code = snippet.render(cmd=cmd, function=cmd.arg_1, n_locals=cmd.arg_2)
+            return asm_code, snippet.instructions
+        snippet = SNIPPET_TEMPLATES["C_FUNCTION", None]
+        asm_code = snippet.render(
+            cmd=cmd, function=cmd.arg_1, locals=cmd.arg_2 * PUSH_ZERO
         )
-        return "\n".join(command_lines)
+        return asm_code, snippet.instructions + cmd.arg_2 * PUSH_ZERO_INSTRUCTIONS
 
-    @staticmethod
-    def _generate_pop_temp_cmd(cmd: Command):
-        temp_start = 5
-        command_lines = (
-            f"\n// {cmd}",
-            "@SP",
-            "AM=M-1",
-            "D=M",
-            f"@{temp_start + cmd.arg_2}",
-            "M=D",
+    def _generate_static_frame_function_cmd(self, cmd: Command, first_slot: int):
+        """
+        The frame on the stack only holds the saved return address and
+        pointers, the locals are zeroed in their slots.
+        """
+        locals_init = "".join(
+            f"@{self._variable_operand(frame_slot(slot))}\nM=0\n"
+            for slot in range(first_slot, first_slot + cmd.arg_2)
         )
-        return "\n".join(command_lines)
+        snippet = SNIPPET_TEMPLATES["C_FUNCTION", None]
+        asm_code = snippet.render(cmd=cmd, function=cmd.arg_1, locals=locals_init)
+        return asm_code, snippet.instructions + 2 * cmd.arg_2
 
-    def _generate_push_static_cmd(self, cmd: Command):
-        command_lines = (
-            f"\n// {cmd}",
-            f"@{self.file_name}.{cmd.arg_2}",
-            "D=M",
-            "@SP",
-            "A=M",
-            "M=D",
-            "@SP",
-            "M=M+1",
+    def _generate_string_literal_cmd(self, cmd: Command):
+        """
+        Call sites of the same characters share one pool entry, which writes
+        them above the stack and lets the $$STRLIT routine append them to the
+        string on top of the stack.
+        """
+        literal = self.string_literals.get(cmd.arg_1)
+        if literal is None:
+            literal = PooledLiteral(cmd.arg_1, f"$$STRLIT.{len(self.string_literals)}")
+            literal.pooled_size = count_instructions(_string_pool_entry(literal))
+            self.string_literals[cmd.arg_1] = literal
+        self._use_routine("$$STRLIT")
+        snippet = SNIPPET_TEMPLATES[STRING_LITERAL, None]
+        asm_code = snippet.render(
+            text=ascii(cmd.arg_1),
+            label=literal.label,
+            return_label=self._generate_func_return_label(),
         )
-        return "\n".join(command_lines)
-
-    def _generate_pop_static_cmd(self, cmd: Command):
-        command_lines = (
-            f"\n// {cmd}",
-            "@SP",
-            "AM=M-1",
-            "D=M",
-            f"@{self.file_name}.{cmd.arg_2}",
-            "M=D",
+        call_templates = (
+            COMPACT_SNIPPET_TEMPLATES
+            if self.context.shape.shared_calls
+            else SNIPPET_TEMPLATES
         )
-        return "\n".join(command_lines)
-
-    @staticmethod
-    def _generate_push_pointer_cmd(cmd: Command):
-        pointer_mapping = {
-            0: "THIS",
-            1: "THAT",
-        }
-        command_lines = (
-            f"\n// {cmd}",
-            f"@{pointer_mapping[cmd.arg_2]}",
-            "D=M",
-            "@SP",
-            "A=M",
-            "M=D",
-            "@SP",
-            "M=M+1",
+        literal.sites += 1
+        literal.pooled_size += snippet.instructions
+        literal.chain_size += len(cmd.arg_1) * (
+            SNIPPET_TEMPLATES["C_PUSH", "constant"].instructions
+            + call_templates["C_CALL", None].instructions
         )
-        return "\n".join(command_lines)
-
-    @staticmethod
-    def _generate_pop_pointer_cmd(cmd: Command):
-        pointer_mapping = {
-            0: "THIS",
-            1: "THAT",
-        }
-        command_lines = (
-            f"\n// {cmd}",
-            "@SP",
-            "AM=M-1",
-            "D=M",
-            f"@{pointer_mapping[cmd.arg_2]}",
-            "M=D",
-        )
-        return "\n".join(command_lines)
-
-    @staticmethod
-    def _generate_c_label_cmd(cmd: Command):
-        command_lines = [f"\n// {cmd}", f"({cmd.arg_1})"]
-        return "\n".join(command_lines)
-
-    @staticmethod
-    def _generate_c_goto_cmd(cmd: Command):
-        command_lines = [f"\n// {cmd}", f"@{cmd.arg_1}", "0;JMP"]
-        return "\n".join(command_lines)
-
-    @staticmethod
-    def _generate_c_if_cmd(cmd: Command):
-        command_lines = [
-            f"\n// {cmd}",
-            "@SP",
-            "AM=M-1",
-            "D=M",
-            f"@{cmd.arg_1}",
-            "D;JNE",
-        ]
-        return "\n".join(command_lines)
-
-    @staticmethod
-    def _generate_c_function_cmd(cmd: Command):
-        set_local_vars = ""
-        push_0 = "@SP\nA=M\nM=0\n@SP\nM=M+1\n"
-        if cmd.arg_2:
-            set_local_vars = cmd.arg_2 * push_0
-        command_lines = [
-            f"\n// {cmd}",
-            f"({cmd.arg_1})",
-            set_local_vars,
-        ]
-        return "\n".join(command_lines)
+        return asm_code, snippet.instructions
 
     def _generate_c_call_cmd(self, cmd: Command):
         """
@@ -453,88 +498,23 @@ class CodeWriter:
         :return:
         """
         func_return_label = self._generate_func_return_label()
-        command_lines = [
-            f"\n// {cmd}",
-            # PUSH returnAddress
-            f"@{func_return_label}",
-            "D=A",
-            "@SP",
-            "A=M",
-            "M=D",
-            "@SP",
-            "M=M+1",
-            # PUSH LCL
-            "@LCL",
-            "D=M",
-            "@SP",
-            "A=M",
-            "M=D",
-            "@SP",
-            "M=M+1",
-            # PUSH ARG
-            "@ARG",
-            "D=M",
-            "@SP",
-            "A=M",
-            "M=D",
-            "@SP",
-            "M=M+1",
-            # PUSH THIS
-            "@THIS",
-            "D=M",
-            "@SP",
-            "A=M",
-            "M=D",
-            "@SP",
-            "M=M+1",
-            # PUSH THAT
-            "@THAT",
-            "D=M",
-            "@SP",
-            "A=M",
-            "M=D",
-            "@SP",
-            "M=M+1",
-            # ARG = SP - 5 - nArgs
-            "@5",
-            "D=A",
-            "@R14",
-            "M=D",
-            f"@{cmd.arg_2}",
-            "D=A",
-            "@R14",
-            "M=M+D",
-            "@SP",
-            "D=M",
-            "@R14",
-            "MD=D-M",
-            "@ARG",
-            "M=D",
-            # LCL = SP
-            "@SP",
-            "D=M",
-            "@LCL",
-            "M=D",
-            # goto
-            f"@{cmd.arg_1}",
-            "0;JMP",
-            f"({func_return_label})",
-        ]
-        return "\n".join(command_lines)
+        templates = SNIPPET_TEMPLATES
+        if self.context.shape.shared_calls:
+            self._use_routine("$$CALL")
+            templates = COMPACT_SNIPPET_TEMPLATES
+        snippet = templates["C_CALL", None]
+        asm_code = snippet.render(
+            cmd=cmd,
+            function=cmd.arg_1,
+            n_args=cmd.arg_2,
+            return_label=func_return_label,
+        )
+        return asm_code, snippet.instructions
 
     def _generate_func_return_label(self):
-        template = "{file_name}$ret.{count}"
-
-        if not self._current_return_labels.get(self.file_name):
-            self._current_return_labels[self.file_name] = 1
-            return template.format(file_name=self.file_name, count=1)
-        self._current_return_labels[self.file_name] += 1
-        return template.format(
-            file_name=self.file_name, count=self._current_return_labels[self.file_name]
-        )
+        return self.context.labels.next_return_label(self.context.file_name)
 
-    @staticmethod
-    def _generate_c_return_cmd(cmd: Command):
+    def _generate_c_return_cmd(self, cmd: Command):
         """
         endFrame = LCL
         retAddr = *(endFrame - 5)
@@ -543,70 +523,309 @@ class CodeWriter:
         :param cmd:
         :return:
         """
-        command_lines = [
-            f"\n// {cmd}",
-            # endFrame = LCL
-            "@LCL",
-            "D=M",
-            "@endFrame",
+        templates = SNIPPET_TEMPLATES
+        if self.context.shape.shared_calls:
+            self._use_routine("$$RETURN")
+            templates = COMPACT_SNIPPET_TEMPLATES
+        snippet = templates["C_RETURN", None]
+        return snippet.render(cmd=cmd), snippet.instructions
+
+
+SHARED_ROUTINES_GUARD = "\n".join(
+    ("\n// shared routines", "($$HALT)", "@$$HALT", "0;JMP")
+)
+
+
+def _shared_comparison_routine(comparison: str) -> str:
+    """
+    D = returnAddress
+    *(SP - 2) = *(SP - 2) <comparison> *(SP - 1) ? -1 : 0
+    SP = SP - 1
+    goto returnAddress
+    """
+    routine = f"$${comparison.upper()}"
+    command_lines = (
+        f"\n// shared C_ARITHMETIC {comparison} routine",
+        f"({routine})",
+        "@R15",
+        "M=D",
+        "@SP",
+        "AM=M-1",
+        "D=M",
+        "A=A-1",
+        "D=M-D",
+        "M=-1",
+        f"@{routine}.END",
+        f"D;J{comparison.upper()}",
+        "@SP",
+        "A=M-1",
+        "M=0",
+        f"({routine}.END)",
+        "@R15",
+        "A=M",
+        "0;JMP",
+    )
+    return "\n".join(command_lines)
+
+
+# D = returnAddress, R14 = 16 - k, *(SP - 1) = x
+# *(SP - 1) = x / 2^k rounded towards zero, *SP is scratch
+_SHARED_DIVIDE_ROUTINE = "\n".join(
+    (
+        "\n// shared C_ARITHMETIC Math.divide routine",
+        "($$DIVIDE)",
+        "@R15",
+        "M=D",
+        # R13 = x, *SP = |x| as an unsigned number, *(SP - 1) = 0
+        "@SP",
+        "A=M-1",
+        "D=M",
+        "@R13",
+        "M=D",
+        "@$$DIVIDE.ABS",
+        "D;JGE",
+        "D=-D",
+        "($$DIVIDE.ABS)",
+        "@SP",
+        "A=M",
+        "M=D",
+        "A=A-1",
+        "M=0",
+        # shift the 16 - k upper bits of *SP into *(SP - 1)
+        "($$DIVIDE.LOOP)",
+        "@SP",
+        "A=M-1",
+        "D=M",
+        "M=D+M",
+        "A=A+1",
+        "D=M",
+        "M=D+M",
+        "@$$DIVIDE.ZERO",
+        "D;JGE",
+        "@SP",
+        "A=M-1",
+        "M=M+1",
+        "($$DIVIDE.ZERO)",
+        "@R14",
+        "MD=M-1",
+        "@$$DIVIDE.LOOP",
+        "D;JGT",
+        # the quotient gets the sign of x
+        "@R13",
+        "D=M",
+        "@$$DIVIDE.END",
+        "D;JGE",
+        "@SP",
+        "A=M-1",
+        "M=-M",
+        "($$DIVIDE.END)",
+        "@R15",
+        "A=M",
+        "0;JMP",
+    )
+)
+
+
+def _string_pool_entry(literal: PooledLiteral) -> str:
+    """
+    D = returnAddress
+    writes the characters from SP on, R13 = address of the last one
+    goto $$STRLIT
+    """
+    return "\n".join(
+        (
+            f"\n// C_STRING pool entry {ascii(literal.text)}",
+            f"({literal.label})",
+            "@R15",
             "M=D",
-            # retAddr = *(endFrame - 5)
-            "@5",
-            "D=A",
-            "@endFrame",
-            "A=M-D",
-            "D=M",
-            "@retAddr",
-            "M=D",
-            # *ARG = POP()
             "@SP",
-            "AM=M-1",
             "D=M",
-            "@ARG",
-            "A=M",
-            "M=D",
-            # SP = ARG + 1
-            "@ARG",
+            "@R13",
+            "M=D-1",
+            *(
+                line
+                for character in literal.text
+                for line in (f"@{ord(character)}", "D=A", "@R13", "AM=M+1", "M=D")
+            ),
+            "@R15",
             "D=M",
+            "@$$STRLIT",
+            "0;JMP",
+        )
+    )
+
+
+# D = returnAddress, R13 = address of the last character written from SP on
+# appends the characters to the string on top of the stack, keeping the
+# return address, the number of characters and the next one on the stack
+# while String.appendChar runs
+_SHARED_STRING_LITERAL_ROUTINE = "\n".join(
+    (
+        "\n// shared C_STRING routine",
+        "($$STRLIT)",
+        "@R15",
+        "M=D",
+        # R14 = number of characters, SP = R13 + 1
+        "@SP",
+        "D=M",
+        "@R13",
+        "D=M-D",
+        "@R14",
+        "M=D+1",
+        "@R13",
+        "D=M+1",
+        "@SP",
+        "M=D",
+        # PUSH returnAddress, number of characters, index = 0
+        "@R15",
+        "D=M",
+        *PUSH_D_LINES,
+        "@R14",
+        "D=M",
+        *PUSH_D_LINES,
+        "@SP",
+        "A=M",
+        "M=0",
+        "@SP",
+        "M=M+1",
+        "($$STRLIT.LOOP)",
+        # goto END if index == number of characters
+        "@SP",
+        "A=M-1",
+        "D=M",
+        "A=A-1",
+        "D=D-M",
+        "@$$STRLIT.END",
+        "D;JEQ",
+        # R13 = address of the string = SP - 4 - number of characters
+        "@SP",
+        "A=M-1",
+        "A=A-1",
+        "D=M",
+        "@SP",
+        "D=M-D",
+        "@4",
+        "D=D-A",
+        "@R13",
+        "M=D",
+        # PUSH string, PUSH *(R13 + 1 + index)
+        "A=D",
+        "D=M",
+        *PUSH_D_LINES,
+        "@SP",
+        "A=M-1",
+        "A=A-1",
+        "D=M",
+        "@R13",
+        "A=D+M",
+        "A=A+1",
+        "D=M",
+        *PUSH_D_LINES,
+        *SNIPPET_TEMPLATES["C_CALL", None]
+        .render(
+            cmd=Command("C_CALL", APPEND_CHAR, 2),
+            function=APPEND_CHAR,
+            n_args=2,
+            return_label="$$STRLIT.APPENDED",
+        )
+        .split("\n")[1:],
+        "// C_STRING next character",
+        # drop the returned string, index = index + 1
+        "@SP",
+        "AM=M-1",
+        "A=A-1",
+        "M=M+1",
+        "@$$STRLIT.LOOP",
+        "0;JMP",
+        "($$STRLIT.END)",
+        # R15 = returnAddress, SP = SP - 3 - number of characters
+        "@SP",
+        "A=M-1",
+        "A=A-1",
+        "A=A-1",
+        "D=M",
+        "@R15",
+        "M=D",
+        "@SP",
+        "A=M-1",
+        "A=A-1",
+        "D=M",
+        "@3",
+        "D=D+A",
+        "@SP",
+        "M=M-D",
+        "@R15",
+        "A=M",
+        "0;JMP",
+    )
+)
+
+
+SHARED_ROUTINES = {
+    # D = returnAddress, R13 = functionName, R14 = nArgs
+    "$$CALL": "\n".join(
+        (
+            "\n// shared C_CALL routine",
+            "($$CALL)",
+            # PUSH returnAddress
             "@SP",
-            "M=D+1",
-            # THAT = *(endFrame - 1)
-            "@endFrame",
-            "A=M-1",
-            "D=M",
-            "@THAT",
+            "A=M",
             "M=D",
-            # THIS = *(endFrame - 2)
-            "@endFrame",
-            "A=M-1",
-            "A=A-1",
-            "D=M",
-            "@THIS",
+            # PUSH LCL, ARG, THIS, THAT
+            *(
+                line
+                for pointer in ("LCL", "ARG", "THIS", "THAT")
+                for line in (f"@{pointer}", "D=M", "@SP", "AM=M+1", "M=D")
+            ),
+            # LCL = SP
+            "@SP",
+            "MD=M+1",
+            "@LCL",
             "M=D",
-            # ARG = *(endFrame - 3)
-            "@endFrame",
-            "A=M-1",
-            "A=A-1",
-            "A=A-1",
-            "D=M",
+            # ARG = SP - nArgs - 5
+            "@R14",
+            "D=D-M",
+            "@5",
+            "D=D-A",
             "@ARG",
             "M=D",
-            # LCL = *(endFrame - 4)
-            "@endFrame",
-            "A=M-1",
-            "A=A-1",
-            "A=A-1",
-            "A=A-1",
-            "D=M",
-            "@LCL",
-            "M=D",
-            # goto retAddr
-            f"@retAddr",
+            # goto functionName
+            "@R13",
             "A=M",
             "0;JMP",
-        ]
-        return "\n".join(command_lines)
+        )
+    ),
+    "$$RETURN": "\n".join(
+        ("\n// shared C_RETURN routine", "($$RETURN)", *RETURN_LINES)
+    ),
+    "$$GT": _shared_comparison_routine("gt"),
+    "$$LT": _shared_comparison_routine("lt"),
+    "$$EQ": _shared_comparison_routine("eq"),
+    "$$DIVIDE": _SHARED_DIVIDE_ROUTINE,
+    "$$STRLIT": _SHARED_STRING_LITERAL_ROUTINE,
+}
+SHARED_ROUTINE_KINDS = {
+    "$$CALL": "C_CALL",
+    "$$RETURN": "C_RETURN",
+    "$$GT": "C_ARITHMETIC",
+    "$$LT": "C_ARITHMETIC",
+    "$$EQ": "C_ARITHMETIC",
+    "$$DIVIDE": "C_ARITHMETIC",
+    "$$STRLIT": STRING_LITERAL,
+}
 
 
 class UnrecognisedCmdError(Exception):
     pass
+
+
+class StaticSegmentOverflowError(Exception):
+    pass
+
+
+class UndefinedFunctionError(Exception):
+    pass
+
+
+class StaticSegmentOverflowWarning(UserWarning):
+    pass
@@ -0,0 +1,122 @@
+import re
+
+from vm_translator.code_size import TOP_LEVEL
+
+
+COMPARISONS = ("gt", "lt", "eq")
+RELOCATABLE_LABEL_PATTERN = re.compile(r"\b(gt|lt|eq)(END)?%(\d+)%")
+STATIC_BASE_ADDRESS = 16
+STATIC_SEGMENT_SIZE = 240
+# variables of the C_RETURN snippet, the assembler puts them first in RAM 16+
+RETURN_VARIABLES = ("endFrame", "retAddr")
+
+
+class LabelAllocator:
+    """
+    Labels generated during one build: comparison labels are numbered
+    across the whole program, return labels per file namespace.
+    """
+
+    def __init__(self):
+        self.comparison_counter = dict.fromkeys(COMPARISONS, 0)
+        self.return_counter = {}
+
+    def next_comparison_label(self, comparison: str) -> int:
+        label = self.comparison_counter[comparison]
+        self.comparison_counter[comparison] = label + 1
+        return label
+
+    def next_return_label(self, namespace: str) -> str:
+        count = self.return_counter.get(namespace, 0) + 1
+        self.return_counter[namespace] = count
+        return f"{namespace}$ret.{count}"
+
+
+class RelocatableLabelAllocator(LabelAllocator):
+    """
+    Numbers the comparison labels of a fragment from 0 as "gt%N%",
+    relocate_labels renumbers them once the preceding fragments are known.
+    """
+
+    def next_comparison_label(self, comparison: str) -> str:
+        return f"%{super().next_comparison_label(comparison)}%"
+
+
+def relocate_labels(asm_code: str, offsets: dict) -> str:
+    """
+    Turns the relocatable comparison labels into final ones, offsets holds
+    the number of labels of every comparison before the fragment.
+    """
+    return RELOCATABLE_LABEL_PATTERN.sub(
+        lambda match: f"{match[1]}{match[2] or ''}{int(match[3]) + offsets[match[1]]}",
+        asm_code,
+    )
+
+
+class StaticAllocator:
+    """
+    Packs the static variables of a build densely from RAM 16 in the order
+    of their first use, behind the return code variables. Other variables
+    of the build (e.g. static frame slots) are packed with them. Addresses
+    past the 240 words below the stack overflow into it.
+    """
+
+    def __init__(self, reserved=RETURN_VARIABLES):
+        self.addresses = {
+            symbol: STATIC_BASE_ADDRESS + offset
+            for offset, symbol in enumerate(reserved)
+        }
+
+    def allocate(self, file_name: str, index: int) -> int:
+        return self.allocate_variable(f"{file_name}.{index}")
+
+    def allocate_variable(self, symbol: str) -> int:
+        address = self.addresses.get(symbol)
+        if address is None:
+            address = STATIC_BASE_ADDRESS + len(self.addresses)
+            self.addresses[symbol] = address
+        return address
+
+    @property
+    def overflow(self) -> int:
+        """
+        Words allocated past the static segment.
+        """
+        return max(0, len(self.addresses) - STATIC_SEGMENT_SIZE)
+
+    def memory_map(self) -> str:
+        lines = [
+            f"static segment: {len(self.addresses)} of {STATIC_SEGMENT_SIZE} words"
+        ]
+        for symbol, address in self.addresses.items():
+            stack = (
+                "  (stack)"
+                if address >= STATIC_BASE_ADDRESS + STATIC_SEGMENT_SIZE
+                else ""
+            )
+            lines.append(f"{address:>6}  {symbol}{stack}")
+        return "\n".join(lines) + "\n"
+
+
+class TranslationContext:
+    """
+    All mutable translation state of one build, owned by a single CodeWriter,
+    so builds which don't share a context can run in parallel threads:
+    - labels: label allocator of the build
+    - file_name: static namespace of the file being translated
+    - function_name, shape: function being translated and its CodeShape
+    - statics: static variables used by the build
+    """
+
+    def __init__(
+        self,
+        file_name: str,
+        shape=None,
+        labels: LabelAllocator = None,
+        statics: StaticAllocator = None,
+    ):
+        self.labels = labels if labels is not None else LabelAllocator()
+        self.statics = statics if statics is not None else StaticAllocator()
+        self.file_name = file_name
+        self.function_name = TOP_LEVEL
+        self.shape = shape
@@ -0,0 +1,180 @@
+from vm_translator.assembler import AsmProgram
+
+
+RAM_SIZE = 32768
+WORD_MASK = 0xFFFF
+DEFAULT_MAX_CYCLES = 10_000_000
+
+_COMP_EXPRESSIONS = {
+    "0": "0",
+    "1": "1",
+    "-1": "-1",
+    "D": "d",
+    "A": "a",
+    "!D": "~d",
+    "!A": "~a",
+    "-D": "-d",
+    "-A": "-a",
+    "D+1": "d+1",
+    "A+1": "a+1",
+    "D-1": "d-1",
+    "A-1": "a-1",
+    "D+A": "d+a",
+    "A+D": "d+a",
+    "D-A": "d-a",
+    "A-D": "a-d",
+    "D&A": "d&a",
+    "A&D": "d&a",
+    "D|A": "d|a",
+    "A|D": "d|a",
+}
+_COMP_EXPRESSIONS.update(
+    {
+        comp.replace("A", "M"): expression.replace("a", "m")
+        for comp, expression in list(_COMP_EXPRESSIONS.items())
+        if "A" in comp
+    }
+)
+COMP_FUNCTIONS = {
+    comp: eval(f"lambda a, d, m: ({expression}) & {WORD_MASK}")
+    for comp, expression in _COMP_EXPRESSIONS.items()
+}
+JUMPS = {"", "JGT", "JEQ", "JGE", "JLT", "JNE", "JLE", "JMP"}
+
+
+def to_signed(value: int) -> int:
+    return value - 0x10000 if value & 0x8000 else value
+
+
+class Emulator:
+    """
+    Hack CPU emulator working on AsmProgram instructions.
+    The run stops when the PC leaves the ROM, when the program enters the
+    canonical halt loop ((END) @END 0;JMP) or after max_cycles instructions.
+    """
+
+    def __init__(self, program: AsmProgram, ram: dict = None):
+        self.program = program
+        self.rom = [self._decode(instruction) for instruction in program.instructions]
+        self.halt_addresses = self._find_halt_loops(self.rom)
+        self.ram = [0] * RAM_SIZE
+        for address, value in (ram or {}).items():
+            self.ram[address] = value & WORD_MASK
+        self.a = 0
+        self.d = 0
+        self.pc = 0
+        self.cycles = 0
+        self.halted = False
+
+    def read(self, address: int) -> int:
+        return to_signed(self.ram[address])
+
+    def run(self, max_cycles: int = DEFAULT_MAX_CYCLES, tracer=None) -> int:
+        """
+        Executes instructions until halt, returns number of executed cycles.
+        tracer is called with the PC before every executed instruction.
+        """
+        rom, ram, halt_addresses = self.rom, self.ram, self.halt_addresses
+        rom_size = len(rom)
+        a, d, pc = self.a, self.d, self.pc
+        cycles = 0
+        try:
+            while cycles < max_cycles:
+                if pc >= rom_size or pc in halt_addresses:
+                    self.halted = True
+                    break
+                if tracer is not None:
+                    tracer(pc)
+                cycles += 1
+                instruction = rom[pc]
+                if instruction[0]:
+                    a = instruction[1]
+                    pc += 1
+                    continue
+                _, comp, uses_m, dest_a, dest_d, dest_m, jump = instruction
+                value = comp(a, d, ram[a] if uses_m else 0)
+                if dest_m:
+                    ram[a] = value
+                if dest_d:
+                    d = value
+                target = a
+                if dest_a:
+                    a = value
+                if jump and self._is_jump_taken(jump, value):
+                    pc = target
+                else:
+                    pc += 1
+        except IndexError:
+            # A holds 16 bits, the RAM has RAM_SIZE words
+            if a < RAM_SIZE:
+                raise
+            raise InvalidAddressError(pc, a) from None
+        finally:
+            self.a, self.d, self.pc = a, d, pc
+            self.cycles += cycles
+        return cycles
+
+    @staticmethod
+    def _is_jump_taken(jump: str, value: int) -> bool:
+        if jump == "JMP":
+            return True
+        signed_value = to_signed(value)
+        if jump == "JGT":
+            return signed_value > 0
+        if jump == "JEQ":
+            return signed_value == 0
+        if jump == "JGE":
+            return signed_value >= 0
+        if jump == "JLT":
+            return signed_value < 0
+        if jump == "JNE":
+            return signed_value != 0
+        return signed_value <= 0
+
+    @staticmethod
+    def _decode(instruction: str):
+        if instruction.startswith("@"):
+            return True, int(instruction[1:]) & WORD_MASK
+        dest, _, rest = instruction.rpartition("=")
+        comp, _, jump = rest.partition(";")
+        comp_function = COMP_FUNCTIONS.get(comp)
+        if comp_function is None or jump not in JUMPS or set(dest) - set("AMD"):
+            raise InvalidInstructionError(f"{instruction} is not a valid instruction")
+        return (
+            False,
+            comp_function,
+            "M" in comp,
+            "A" in dest,
+            "D" in dest,
+            "M" in dest,
+            jump,
+        )
+
+    @staticmethod
+    def _find_halt_loops(rom) -> set:
+        halt_addresses = set()
+        for address in range(1, len(rom)):
+            instruction, previous = rom[address], rom[address - 1]
+            if (
+                not instruction[0]
+                and instruction[6] == "JMP"
+                and not any(instruction[3:6])
+                and previous[0]
+                and previous[1] == address - 1
+            ):
+                halt_addresses.add(address - 1)
+        return halt_addresses
+
+
+class InvalidInstructionError(Exception):
+    pass
+
+
+class InvalidAddressError(Exception):
+    def __init__(self, pc: int, address: int):
+        super().__init__(
+            f"instruction {pc} accesses RAM {address}, outside of the"
+            f" {RAM_SIZE} words of RAM"
+        )
+        self.pc = pc
+        self.address = address
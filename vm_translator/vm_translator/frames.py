@@ -0,0 +1,125 @@
+from vm_translator.code_size import TOP_LEVEL
+
+
+FRAME_SLOT_PREFIX = "$$FRAME."
+
+
+def frame_slot(slot: int) -> str:
+    """
+    Variable holding one local of a static frame.
+    """
+    return f"{FRAME_SLOT_PREFIX}{slot}"
+
+
+def build_call_graph(cmds) -> tuple:
+    """
+    Returns ({function: callees in order of the calls}, {function: n_locals}).
+    Calls outside of functions (e.g. the bootstrap) are not part of the graph.
+    """
+    calls, n_locals = {}, {}
+    function_name = TOP_LEVEL
+    for cmd in cmds:
+        if cmd.cmd_type == "C_FUNCTION":
+            function_name = cmd.arg_1
+            n_locals[function_name] = cmd.arg_2
+            calls.setdefault(function_name, [])
+        elif cmd.cmd_type == "C_CALL" and function_name != TOP_LEVEL:
+            callees = calls[function_name]
+            if cmd.arg_1 not in callees:
+                callees.append(cmd.arg_1)
+    return calls, n_locals
+
+
+def strongly_connected_components(calls: dict) -> list:
+    """
+    Tarjan's algorithm without recursion, a component comes after every
+    component it calls into. Called functions missing from calls are leaves.
+    """
+    index, low, on_stack = {}, {}, set()
+    stack, components = [], []
+    for root in calls:
+        if root in index:
+            continue
+        work = [(root, iter(calls.get(root, ())))]
+        index[root] = low[root] = len(index)
+        stack.append(root)
+        on_stack.add(root)
+        while work:
+            function, callees = work[-1]
+            callee = next(callees, None)
+            if callee is not None:
+                if callee not in index:
+                    index[callee] = low[callee] = len(index)
+                    stack.append(callee)
+                    on_stack.add(callee)
+                    work.append((callee, iter(calls.get(callee, ()))))
+                elif callee in on_stack:
+                    low[function] = min(low[function], index[callee])
+                continue
+            work.pop()
+            if work:
+                caller = work[-1][0]
+                low[caller] = min(low[caller], low[function])
+            if low[function] == index[function]:
+                component = []
+                while True:
+                    member = stack.pop()
+                    on_stack.remove(member)
+                    component.append(member)
+                    if member == function:
+                        break
+                components.append(component)
+    return components
+
+
+def recursive_functions(calls: dict, components: list = None) -> set:
+    """
+    Functions on a cycle of the call graph, they can be active more than
+    once at a time.
+    """
+    if components is None:
+        components = strongly_connected_components(calls)
+    return {
+        function
+        for component in components
+        for function in component
+        if len(component) > 1 or function in calls.get(function, ())
+    }
+
+
+def plan_static_frames(cmds) -> dict:
+    """
+    Returns {function: first frame slot of its locals} for the functions
+    with locals which are not recursive, so at most one activation of each
+    is alive and its locals can live at fixed addresses. Functions which
+    can never be active at the same time share slots: the locals of a
+    function are placed after the slots of every function that can be
+    active below it on the call stack.
+    """
+    calls, n_locals = build_call_graph(cmds)
+    components = strongly_connected_components(calls)
+    recursive = recursive_functions(calls, components)
+    component_of = {
+        function: position
+        for position, component in enumerate(components)
+        for function in component
+    }
+    # first free slot of every component, callers come before their callees
+    first_free = {}
+    frames = {}
+    for position in reversed(range(len(components))):
+        component = components[position]
+        first = first_free.get(position, 0)
+        end = first
+        for function in component:
+            if function not in recursive and n_locals.get(function):
+                frames[function] = first
+                end = first + n_locals[function]
+        for function in component:
+            for callee in calls.get(function, ()):
+                callee_position = component_of[callee]
+                if callee_position != position:
+                    first_free[callee_position] = max(
+                        first_free.get(callee_position, 0), end
+                    )
+    return frames
@@ -0,0 +1,45 @@
+from vm_translator.parser import Command
+
+
+ARRAY_ACCESS = "C_ARRAY"
+# array idioms of the Jack compiler: base and index are on the stack, the
+# write pushes the value on top of them
+ARRAY_READ = (
+    Command("C_ARITHMETIC", "add"),
+    Command("C_POP", "pointer", 1),
+    Command("C_PUSH", "that", 0),
+)
+ARRAY_WRITE = (
+    Command("C_POP", "temp", 0),
+    Command("C_POP", "pointer", 1),
+    Command("C_PUSH", "temp", 0),
+    Command("C_POP", "that", 0),
+)
+# (sequence, fused command)
+FUSED_SEQUENCES = (
+    (ARRAY_READ, Command(ARRAY_ACCESS, "read")),
+    (ARRAY_WRITE, Command(ARRAY_ACCESS, "write")),
+)
+_LONGEST_SEQUENCE = max(len(sequence) for sequence, _ in FUSED_SEQUENCES)
+
+
+def fuse_array_access(cmds):
+    """
+    Yields cmds with the ARRAY_READ and ARRAY_WRITE sequences replaced by
+    one ("C_ARRAY", "read") or ("C_ARRAY", "write") command. The CodeWriter
+    translates them into one snippet computing the address once, which
+    still leaves THAT and temp 0 as the sequences do.
+    """
+    held = []
+    for cmd in cmds:
+        held.append(cmd)
+        for sequence, fused in FUSED_SEQUENCES:
+            if tuple(held[-len(sequence) :]) == sequence:
+                yield from held[: -len(sequence)]
+                yield fused
+                held = []
+                break
+        else:
+            if len(held) >= _LONGEST_SEQUENCE:
+                yield held.pop(0)
+    yield from held
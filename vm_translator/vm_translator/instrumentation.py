@@ -0,0 +1,123 @@
+import json
+import time
+from collections import Counter, defaultdict
+
+
+TOTAL = "total"
+PARSE = "parse"
+PARSE_CLEANUP = "parse.cleanup"
+CODEGEN = "codegen"
+WRITE = "write"
+
+
+class InstrumentationHook:
+    """
+    Base class of hooks plugged into Instrumentation, e.g. to forward phases to
+    a tracer. Every method is a no-op, override the ones you need.
+    """
+
+    def on_phase_start(self, phase: str, file_name: str):
+        pass
+
+    def on_phase_end(self, phase: str, file_name: str, seconds: float):
+        pass
+
+    def on_command(self, cmd, file_name: str, instructions: int):
+        pass
+
+    def on_write(self, size: int):
+        pass
+
+
+class Instrumentation:
+    """
+    Opt-in statistics of a translation:
+    - wall time per phase (total, parse, parse.cleanup, codegen, write) and per file
+    - number of translated VM commands and emitted instructions per command type
+    - bytes written
+    clock is any callable returning seconds, time.perf_counter by default.
+    """
+
+    def __init__(self, hooks=(), clock=time.perf_counter):
+        self.hooks = list(hooks)
+        self.clock = clock
+        self.phase_seconds = Counter()
+        self.file_phase_seconds = defaultdict(Counter)
+        self.cmd_counts = Counter()
+        self.instructions_by_kind = Counter()
+        self.bytes_written = 0
+
+    def begin(self, phase: str, file_name: str = None):
+        for hook in self.hooks:
+            hook.on_phase_start(phase, file_name)
+        return phase, file_name, self.clock()
+
+    def end(self, token):
+        phase, file_name, started = token
+        seconds = self.clock() - started
+        self.phase_seconds[phase] += seconds
+        if file_name is not None:
+            self.file_phase_seconds[file_name][phase] += seconds
+        for hook in self.hooks:
+            hook.on_phase_end(phase, file_name, seconds)
+
+    def record_command(self, cmd, file_name: str, instructions: int):
+        self.cmd_counts[cmd.cmd_type] += 1
+        self.instructions_by_kind[cmd.cmd_type] += instructions
+        for hook in self.hooks:
+            hook.on_command(cmd, file_name, instructions)
+
+    def record_write(self, size: int):
+        self.bytes_written += size
+        for hook in self.hooks:
+            hook.on_write(size)
+
+    def iter_timed(self, iterable, phase: str, file_name: str = None):
+        """
+        Yields items of iterable, time spent in the iterable is added to phase.
+        """
+        iterator = iter(iterable)
+        while True:
+            token = self.begin(phase, file_name)
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.end(token)
+                return
+            self.end(token)
+            yield item
+
+    def to_dict(self) -> dict:
+        return {
+            "phase_seconds": dict(self.phase_seconds),
+            "file_phase_seconds": {
+                file_name: dict(phases)
+                for file_name, phases in self.file_phase_seconds.items()
+            },
+            "cmd_counts": dict(self.cmd_counts),
+            "instructions_by_kind": dict(self.instructions_by_kind),
+            "bytes_written": self.bytes_written,
+        }
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), indent=2, sort_keys=True) + "\n"
+
+    def report(self) -> str:
+        total = self.phase_seconds.get(TOTAL) or sum(self.phase_seconds.values()) or 1
+        lines = ["Phases:", f"{'seconds':>10} {'share':>7}  phase"]
+        for phase, seconds in self.phase_seconds.most_common():
+            lines.append(f"{seconds:>10.4f} {100 * seconds / total:>6.2f}%  {phase}")
+        lines += ["", "Files:", f"{'seconds':>10}  file"]
+        file_seconds = {
+            file_name: sum(
+                seconds for phase, seconds in phases.items() if "." not in phase
+            )
+            for file_name, phases in self.file_phase_seconds.items()
+        }
+        for file_name, seconds in sorted(file_seconds.items(), key=lambda i: -i[1]):
+            lines.append(f"{seconds:>10.4f}  {file_name}")
+        lines += ["", "Commands:", f"{'count':>10} {'instructions':>13}  command"]
+        for kind, count in self.cmd_counts.most_common():
+            lines.append(f"{count:>10} {self.instructions_by_kind[kind]:>13}  {kind}")
+        lines += ["", f"Bytes written: {self.bytes_written}"]
+        return "\n".join(lines) + "\n"
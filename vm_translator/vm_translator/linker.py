@@ -0,0 +1,215 @@
+import argparse
+import sys
+from pathlib import Path
+
+from vm_translator.assembler import AsmProgram
+from vm_translator.code_size import CodeSizeAccounting, RomBudgetExceededError
+from vm_translator.code_writer import (
+    CodeShape,
+    CodeWriter,
+    COMPACT_SHAPE,
+    FAST_SHAPE,
+    HACK_ROM_SIZE,
+)
+from vm_translator.context import COMPARISONS
+from vm_translator.objects import (
+    OBJECT_SUFFIX,
+    ObjectFile,
+    ObjectFormatError,
+    compile_file,
+)
+from vm_translator.sinks import MemorySink, OutputSink
+
+
+BOOTSTRAP_FUNCTION = "Sys.init"
+
+
+def resolve_symbols(
+    objects, bootstrap: bool = True, allow_unresolved: bool = False
+) -> dict:
+    """
+    Returns function -> namespace of the object defining it. Two objects with
+    the same namespace or function, and calls of functions no object defines
+    are errors.
+    """
+    exports, namespaces = {}, set()
+    for object_file in objects:
+        if object_file.namespace in namespaces:
+            raise LinkError(f"two objects of {object_file.namespace}")
+        namespaces.add(object_file.namespace)
+        for function in object_file.exports:
+            if function in exports:
+                raise LinkError(
+                    f"{function} defined in {exports[function]}"
+                    f" and {object_file.namespace}"
+                )
+            exports[function] = object_file.namespace
+    unresolved = [
+        f"{function} (called in {object_file.namespace})"
+        for object_file in objects
+        for function in object_file.imports
+        if function not in exports
+    ]
+    if bootstrap and BOOTSTRAP_FUNCTION not in exports:
+        unresolved.append(f"{BOOTSTRAP_FUNCTION} (called by the bootstrap code)")
+    if unresolved and not allow_unresolved:
+        raise LinkError("undefined functions: " + ", ".join(unresolved))
+    return exports
+
+
+def link(
+    objects,
+    asm_path: Path,
+    sink: OutputSink = None,
+    bootstrap: bool = True,
+    default_shape: CodeShape = FAST_SHAPE,
+    rom_budget: int = HACK_ROM_SIZE,
+    allow_unresolved: bool = False,
+) -> CodeSizeAccounting:
+    """
+    Joins the objects in the given order into one program written to sink,
+    asm_path by default, which also names the module of the bootstrap code.
+    Comparison labels are renumbered across the objects, so linking the
+    objects of a directory gives the same asm as translating the directory.
+    """
+    resolve_symbols(objects, bootstrap, allow_unresolved)
+    writer = CodeWriter(
+        asm_path, bootstrap, default_shape, rom_budget=rom_budget, sink=sink
+    )
+    offsets = dict.fromkeys(COMPARISONS, 0)
+    for object_file in objects:
+        writer.write_fragment(
+            object_file.relocated(offsets),
+            object_file.code_size,
+            object_file.used_routines,
+        )
+        for comparison in COMPARISONS:
+            offsets[comparison] += object_file.comparisons.get(comparison, 0)
+    writer.close_file()
+    return writer.code_size
+
+
+def link_to_file(objects, output_path: Path, **options) -> CodeSizeAccounting:
+    """
+    Writes asm, or machine code when output_path is a .hack file.
+    """
+    if output_path.suffix != ".hack":
+        return link(objects, output_path, **options)
+    sink = MemorySink()
+    code_size = link(objects, output_path.with_suffix(".asm"), sink, **options)
+    program = AsmProgram.from_lines(sink.getvalue().splitlines())
+    output_path.write_text(program.to_machine_code())
+    return code_size
+
+
+def object_path(vm_file: Path) -> Path:
+    return vm_file.with_suffix(OBJECT_SUFFIX)
+
+
+def build_objects(project_dir: Path, default_shape: CodeShape = FAST_SHAPE) -> tuple:
+    """
+    Translates the .vm files of project_dir whose object file is missing,
+    older than the source or of another code shape. Returns the objects of
+    the project and the translated files.
+    """
+    objects, translated = [], []
+    for vm_file in project_dir.glob("**/*.vm"):
+        cached = object_path(vm_file)
+        if cached.exists() and cached.stat().st_mtime_ns >= vm_file.stat().st_mtime_ns:
+            object_file = ObjectFile.load(cached)
+            if object_file.shape == default_shape:
+                objects.append(object_file)
+                continue
+        object_file = compile_file(vm_file, default_shape)
+        object_file.save(cached)
+        objects.append(object_file)
+        translated.append(vm_file)
+    return objects, translated
+
+
+def load_objects(paths) -> list:
+    """
+    Object files and directories of object files, e.g. a prebuilt Jack OS.
+    """
+    objects = []
+    for path in paths:
+        object_paths = (
+            sorted(path.glob(f"*{OBJECT_SUFFIX}")) if path.is_dir() else [path]
+        )
+        objects += [ObjectFile.load(object_file) for object_file in object_paths]
+    return objects
+
+
+class LinkError(Exception):
+    pass
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(
+        description="Translate VM files separately into objects and link them"
+    )
+    commands = arg_parser.add_subparsers(dest="command", required=True)
+    compile_parser = commands.add_parser("compile", help="VM files -> .vmo objects")
+    compile_parser.add_argument("vm_files", type=Path, nargs="+")
+    link_parser = commands.add_parser("link", help="objects -> .asm or .hack")
+    link_parser.add_argument(
+        "objects", type=Path, nargs="+", help="object files or directories of them"
+    )
+    build_parser = commands.add_parser(
+        "build", help="compile the changed files of a directory and link"
+    )
+    build_parser.add_argument("path", type=Path, help="directory of VM files")
+    build_parser.add_argument(
+        "--lib", type=Path, action="append", default=[], help="prebuilt objects"
+    )
+    for command_parser in (compile_parser, link_parser, build_parser):
+        command_parser.add_argument(
+            "-Os",
+            dest="optimize_size",
+            action="store_true",
+            help="use the most compact code shapes everywhere",
+        )
+    for command_parser in (link_parser, build_parser):
+        command_parser.add_argument(
+            "-o", "--output", type=Path, help="output .asm or .hack file"
+        )
+        command_parser.add_argument(
+            "--no-bootstrap", action="store_true", help="don't call Sys.init"
+        )
+        command_parser.add_argument(
+            "--allow-unresolved",
+            action="store_true",
+            help="link even if called functions are not defined",
+        )
+        command_parser.add_argument(
+            "--rom-budget",
+            type=int,
+            default=HACK_ROM_SIZE,
+            help="ROM words available for the program, linking fails above it",
+        )
+    args = arg_parser.parse_args()
+    shape = COMPACT_SHAPE if args.optimize_size else FAST_SHAPE
+
+    try:
+        if args.command == "compile":
+            for source in args.vm_files:
+                compile_file(source, shape).save(object_path(source))
+            sys.exit()
+        if args.command == "link":
+            linked = load_objects(args.objects)
+            output = args.output or Path("out.asm")
+        else:
+            linked, _ = build_objects(args.path, shape)
+            linked += load_objects(args.lib)
+            output = args.output or args.path / f"{args.path.name}.asm"
+        size = link_to_file(
+            linked,
+            output,
+            bootstrap=not args.no_bootstrap,
+            default_shape=shape,
+            rom_budget=args.rom_budget,
+            allow_unresolved=args.allow_unresolved,
+        )
+    except (LinkError, ObjectFormatError, RomBudgetExceededError) as error:
+        sys.exit(str(error))
+    print(f"linked {len(linked)} objects into {output} ({size.total} words)")
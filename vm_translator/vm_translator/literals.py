@@ -0,0 +1,81 @@
+from dataclasses import dataclass
+
+from vm_translator.parser import Command
+
+
+APPEND_CHAR = "String.appendChar"
+STRING_LITERAL = "C_STRING"
+
+
+@dataclass
+class PooledLiteral:
+    """
+    One entry of the string literal pool: the characters, the label of the
+    pool entry writing them, the call sites using it and the ROM words of
+    the String.appendChar calls they replaced and of their pooled version
+    (the call sites plus the pool entry).
+    """
+
+    text: str
+    label: str
+    sites: int = 0
+    chain_size: int = 0
+    pooled_size: int = 0
+
+    @property
+    def saved(self) -> int:
+        return self.chain_size - self.pooled_size
+
+
+def pool_string_literals(cmds):
+    """
+    Yields cmds with every run of "push constant c; call String.appendChar 2"
+    replaced by one ("C_STRING", characters) command, which the CodeWriter
+    translates into a jump into the string literal pool. The Jack compiler
+    writes a string literal as String.new followed by such a run.
+    """
+    characters = []
+    held = None
+    for cmd in cmds:
+        if held is not None:
+            if cmd.cmd_type == "C_CALL" and cmd.arg_1 == APPEND_CHAR and cmd.arg_2 == 2:
+                characters.append(chr(held.arg_2))
+                held = None
+                continue
+            if characters:
+                yield Command(STRING_LITERAL, "".join(characters))
+                characters = []
+            yield held
+            held = None
+        if cmd.cmd_type == "C_PUSH" and cmd.arg_1 == "constant":
+            held = cmd
+            continue
+        if characters:
+            yield Command(STRING_LITERAL, "".join(characters))
+            characters = []
+        yield cmd
+    if characters:
+        yield Command(STRING_LITERAL, "".join(characters))
+    if held is not None:
+        yield held
+
+
+def report_string_literals(literals, shared_size: int) -> str:
+    """
+    shared_size is the size of the $$STRLIT routine, which is only written
+    with a pooled literal.
+    """
+    literals = sorted(literals, key=lambda literal: literal.saved, reverse=True)
+    if not literals:
+        return "string literals: none pooled\n"
+    saved = sum(literal.saved for literal in literals) - shared_size
+    lines = [
+        f"string literals: {len(literals)} pooled, {saved} ROM words saved"
+        f" ({shared_size} words of shared copy loop)"
+    ]
+    for literal in literals:
+        lines.append(
+            f"{literal.saved:>8}  {ascii(literal.text)} x{literal.sites}:"
+            f" {literal.chain_size} -> {literal.pooled_size} words"
+        )
+    return "\n".join(lines) + "\n"
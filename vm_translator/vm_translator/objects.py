@@ -0,0 +1,145 @@
+import json
+import zlib
+from collections import Counter
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+
+from vm_translator.code_size import CodeSizeAccounting
+from vm_translator.code_writer import CodeShape, CodeWriter, FAST_SHAPE
+from vm_translator.context import (
+    RelocatableLabelAllocator,
+    TranslationContext,
+    relocate_labels,
+)
+from vm_translator.parser import Parser
+from vm_translator.sinks import MemorySink
+
+
+OBJECT_MAGIC = b"VMO1"
+OBJECT_SUFFIX = ".vmo"
+
+
+@dataclass
+class ObjectFile:
+    """
+    Translation of one VM file, linkable without its source:
+    - namespace: file name prefixing its statics and return labels
+    - asm: translated code, comparison labels are relocatable (gt%N%)
+    - exports: functions defined in the file
+    - imports: functions called but not defined in the file
+    - statics: indices of the static variables ({namespace}.{index} symbols)
+    - comparisons: number of relocatable labels per comparison
+    - used_routines: shared routines the code jumps into
+    - shape: CodeShape of the translation, None for objects saved without one
+    Return labels ({namespace}$ret.N) are unique per namespace, the linker
+    only has to make sure no two objects share one.
+    """
+
+    namespace: str
+    asm: str
+    exports: list = field(default_factory=list)
+    imports: list = field(default_factory=list)
+    statics: list = field(default_factory=list)
+    comparisons: dict = field(default_factory=dict)
+    used_routines: tuple = ()
+    code_size: CodeSizeAccounting = field(default_factory=CodeSizeAccounting)
+    shape: CodeShape = None
+    _relocated: tuple = field(default=(None, None), repr=False, compare=False)
+
+    def relocated(self, offsets: dict) -> str:
+        key = tuple(offsets.values())
+        if self._relocated[0] != key:
+            self._relocated = (key, relocate_labels(self.asm, offsets))
+        return self._relocated[1]
+
+    def to_bytes(self) -> bytes:
+        content = {
+            "namespace": self.namespace,
+            "exports": self.exports,
+            "imports": self.imports,
+            "statics": self.statics,
+            "comparisons": self.comparisons,
+            "used_routines": list(self.used_routines),
+            "code_size": {
+                "total": self.code_size.total,
+                "by_function": self.code_size.by_function,
+                "by_file": self.code_size.by_file,
+                "by_kind": self.code_size.by_kind,
+            },
+            "shape": asdict(self.shape) if self.shape is not None else None,
+            "asm": self.asm,
+        }
+        return OBJECT_MAGIC + zlib.compress(json.dumps(content).encode(), 9)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "ObjectFile":
+        if not data.startswith(OBJECT_MAGIC):
+            raise ObjectFormatError("not a VM object file")
+        try:
+            content = json.loads(zlib.decompress(data.removeprefix(OBJECT_MAGIC)))
+        except (zlib.error, ValueError) as error:
+            raise ObjectFormatError(f"corrupted VM object file: {error}")
+        code_size = content.pop("code_size")
+        shape = content.pop("shape", None)
+        return cls(
+            **{**content, "used_routines": tuple(content["used_routines"])},
+            code_size=CodeSizeAccounting(
+                None,
+                code_size["total"],
+                *(
+                    Counter(code_size[name])
+                    for name in ("by_function", "by_file", "by_kind")
+                ),
+            ),
+            shape=CodeShape(**shape) if shape is not None else None,
+        )
+
+    def save(self, object_path: Path):
+        object_path.write_bytes(self.to_bytes())
+
+    @classmethod
+    def load(cls, object_path: Path) -> "ObjectFile":
+        try:
+            return cls.from_bytes(object_path.read_bytes())
+        except ObjectFormatError as error:
+            raise ObjectFormatError(f"{object_path}: {error}")
+
+
+def compile_object(
+    cmds, namespace: str, default_shape: CodeShape = FAST_SHAPE
+) -> ObjectFile:
+    """
+    Translates the VM commands of one file with namespace as its file name.
+    """
+    context = TranslationContext(namespace, labels=RelocatableLabelAllocator())
+    writer = CodeWriter(
+        Path(namespace), default_shape=default_shape, sink=MemorySink(), context=context
+    )
+    exports, calls, statics = [], [], set()
+    for cmd in cmds:
+        if cmd.cmd_type == "C_FUNCTION":
+            exports.append(cmd.arg_1)
+        elif cmd.cmd_type == "C_CALL" and cmd.arg_1 not in calls:
+            calls.append(cmd.arg_1)
+        elif cmd.arg_1 == "static" and cmd.cmd_type in ("C_PUSH", "C_POP"):
+            statics.add(cmd.arg_2)
+        writer.write_cmd(cmd)
+    return ObjectFile(
+        namespace,
+        writer.sink.getvalue(),
+        exports,
+        [function for function in calls if function not in exports],
+        sorted(statics),
+        dict(context.labels.comparison_counter),
+        writer.used_routines,
+        writer.code_size,
+        default_shape,
+    )
+
+
+def compile_file(vm_file: Path, default_shape: CodeShape = FAST_SHAPE) -> ObjectFile:
+    return compile_object(Parser(vm_file), vm_file.name, default_shape)
+
+
+class ObjectFormatError(Exception):
+    pass
@@ -1,6 +1,8 @@
 import re
+from contextlib import nullcontext
 from pathlib import Path
 from dataclasses import dataclass
+from vm_translator.instrumentation import Instrumentation, PARSE_CLEANUP
 
 
 CMDS_MAPPING = {
@@ -33,9 +35,16 @@ class Command:
 
 class Parser:
     COMMENT_SIGN = "//"
+    STREAM_NAME = "<stream>"
 
-    def __init__(self, input_file: Path):
+    def __init__(self, input_file: Path, instrumentation: Instrumentation = None):
+        """
+        input_file is a path, an already open text stream (e.g. sys.stdin)
+        or any other iterable of lines
+        """
         self.input_file = input_file
+        self.name = getattr(input_file, "name", self.STREAM_NAME)
+        self.instrumentation = instrumentation
         self.parser_generator = self._generator()
 
     def __enter__(self):
@@ -51,12 +60,29 @@ class Parser:
         return next(self.parser_generator)
 
     def _generator(self):
-        with open(self.input_file) as file:
+        if self.instrumentation is not None:
+            yield from self._instrumented_generator()
+            return
+        with self._open_input() as file:
             for line in file:
                 cmd_line = self._remove_comments_and_spaces_from_line_and_return(line)
                 if cmd_line:
                     yield self._parse_cmd(cmd_line)
 
+    def _instrumented_generator(self):
+        with self._open_input() as file:
+            for line in file:
+                token = self.instrumentation.begin(PARSE_CLEANUP, self.name)
+                cmd_line = self._remove_comments_and_spaces_from_line_and_return(line)
+                self.instrumentation.end(token)
+                if cmd_line:
+                    yield self._parse_cmd(cmd_line)
+
+    def _open_input(self):
+        if isinstance(self.input_file, (str, Path)):
+            return open(self.input_file)
+        return nullcontext(self.input_file)
+
     @staticmethod
     def has_more_commands():
         pass
@@ -0,0 +1,107 @@
+from collections import Counter
+from pathlib import Path
+
+from vm_translator.code_writer import (
+    CodeWriter,
+    COMPACT_SHAPE,
+    FAST_SHAPE,
+    count_instructions,
+)
+from vm_translator.profiler import ROOT_FRAME
+
+
+HOT_THRESHOLD = 0.001
+_SCRATCH_PATH = Path("scratch.asm")
+
+
+def load_profile(profile_path: Path) -> Counter:
+    """
+    Self cycles per VM function read from the collapsed stacks written by
+    the profiler (python -m vm_translator.profiler --collapsed).
+    """
+    hotness = Counter()
+    with open(profile_path) as file:
+        for line in file:
+            line = line.strip()
+            if not line:
+                continue
+            stack, _, cycles = line.rpartition(" ")
+            if not stack or not cycles.isdigit():
+                raise ProfileFormatError(f"{line} is not a collapsed stack line")
+            function_name = stack.split(";")[-1]
+            if function_name != ROOT_FRAME:
+                hotness[function_name] += int(cycles)
+    return hotness
+
+
+def measure_function_sizes(cmds, write_header=False, static_frames: dict = None):
+    """
+    ROM words of every function in the fast and in the compact shape, with
+    the static_frames of the translation (see CodeWriter). Returns
+    ({function: (fast_size, compact_size)}, size of code outside of
+    functions including the bootstrap and the shared routines).
+    """
+    fast_writer = CodeWriter(
+        _SCRATCH_PATH, default_shape=FAST_SHAPE, static_frames=static_frames
+    )
+    compact_writer = CodeWriter(
+        _SCRATCH_PATH, default_shape=COMPACT_SHAPE, static_frames=static_frames
+    )
+    function_sizes = {}
+    fixed_size = 0
+    if write_header:
+        fixed_size += count_instructions(compact_writer.translate_header())
+    function_name = None
+    for cmd in cmds:
+        if cmd.cmd_type == "C_FUNCTION":
+            function_name = cmd.arg_1
+        compact_size = count_instructions(compact_writer.translate_cmd(cmd))
+        if function_name is None:
+            fixed_size += compact_size
+            continue
+        fast_size = count_instructions(fast_writer.translate_cmd(cmd))
+        sizes = function_sizes.get(function_name, (0, 0))
+        function_sizes[function_name] = (sizes[0] + fast_size, sizes[1] + compact_size)
+    fixed_size += count_instructions(compact_writer.translate_shared_routines())
+    return function_sizes, fixed_size
+
+
+def plan_code_shapes(
+    function_sizes: dict,
+    hotness: Counter,
+    rom_budget: int,
+    fixed_size: int = 0,
+    hot_threshold: float = HOT_THRESHOLD,
+) -> dict:
+    """
+    Every function starts in the compact shape, then hot functions are switched
+    to the fast shape in order of profiled cycles per extra ROM word as long as
+    the program still fits in rom_budget.
+    """
+    shapes = {name: COMPACT_SHAPE for name in function_sizes}
+    total_size = fixed_size + sum(compact for _, compact in function_sizes.values())
+    total_cycles = sum(hotness.values())
+    hot_functions = [
+        name
+        for name in function_sizes
+        if total_cycles and hotness[name] / total_cycles >= hot_threshold
+    ]
+    hot_functions.sort(
+        key=lambda name: hotness[name] / max(1, _extra_size(function_sizes[name])),
+        reverse=True,
+    )
+    for name in hot_functions:
+        extra_size = _extra_size(function_sizes[name])
+        if total_size + extra_size <= rom_budget:
+            shapes[name] = FAST_SHAPE
+            total_size += extra_size
+    return shapes
+
+
+def _extra_size(sizes) -> int:
+    fast_size, compact_size = sizes
+    return fast_size - compact_size
+
+
+class ProfileFormatError(Exception):
+    pass
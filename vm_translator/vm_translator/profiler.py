@@ -0,0 +1,191 @@
+import argparse
+from collections import Counter
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from vm_translator.assembler import AsmProgram
+from vm_translator.emulator import Emulator, DEFAULT_MAX_CYCLES
+
+
+ROOT_FRAME = "[top]"
+
+
+@dataclass
+class FunctionStats:
+    name: str
+    self_cycles: int = 0
+    inclusive_cycles: int = 0
+    calls: int = 0
+
+
+@dataclass
+class Profile:
+    """
+    Result of a profiled run:
+    - stack_counts: executed instructions per VM call stack (outermost first)
+    - kind_counts: executed instructions per VM command type
+    - calls: number of entries into every VM function
+    """
+
+    stack_counts: Counter = field(default_factory=Counter)
+    kind_counts: Counter = field(default_factory=Counter)
+    calls: Counter = field(default_factory=Counter)
+    total_cycles: int = 0
+    halted: bool = False
+
+    def function_stats(self) -> dict:
+        stats = {}
+        for stack, cycles in self.stack_counts.items():
+            stack = stack or (ROOT_FRAME,)
+            for name in set(stack):
+                stats.setdefault(name, FunctionStats(name)).inclusive_cycles += cycles
+            stats[stack[-1]].self_cycles += cycles
+        for name, calls in self.calls.items():
+            stats.setdefault(name, FunctionStats(name)).calls = calls
+        return stats
+
+    def to_collapsed(self) -> str:
+        """
+        Collapsed stacks (one "outer;inner count" line per stack),
+        the input format of flamegraph.pl and speedscope.
+        """
+        lines = [
+            f"{';'.join(stack or (ROOT_FRAME,))} {cycles}"
+            for stack, cycles in sorted(self.stack_counts.items())
+        ]
+        return "\n".join(lines) + "\n"
+
+    def report(self, top: int = 20) -> str:
+        total = self.total_cycles or 1
+        functions = sorted(
+            self.function_stats().values(),
+            key=lambda stats: (-stats.self_cycles, stats.name),
+        )
+        lines = [
+            f"Total cycles: {self.total_cycles}"
+            f"{'' if self.halted else ' (stopped by cycle limit)'}",
+            "",
+            f"Top {top} functions by self cycles:",
+            f"{'self':>12} {'self%':>7} {'inclusive':>12} {'incl%':>7} {'calls':>8}  function",
+        ]
+        for stats in functions[:top]:
+            lines.append(
+                f"{stats.self_cycles:>12} {100 * stats.self_cycles / total:>6.2f}%"
+                f" {stats.inclusive_cycles:>12} {100 * stats.inclusive_cycles / total:>6.2f}%"
+                f" {stats.calls:>8}  {stats.name}"
+            )
+        lines += [
+            "",
+            "Cycles by VM command type:",
+            f"{'cycles':>12} {'share':>7}  command",
+        ]
+        for kind, cycles in self.kind_counts.most_common():
+            lines.append(f"{cycles:>12} {100 * cycles / total:>6.2f}%  {kind}")
+        return "\n".join(lines) + "\n"
+
+
+class Profiler:
+    """
+    Runs a translated program in the Emulator and tracks the VM call stack:
+    a frame is pushed when the jump of a call reaches a function label and
+    popped when the PC reaches a return label of a call ($ret.N), which are
+    only reachable by jumps. Jumps to a label at the start of a function
+    without locals reach its function label too, but don't enter it.
+    """
+
+    def __init__(self, program: AsmProgram, ram: dict = None):
+        self.program = program
+        self.emulator = Emulator(program, ram)
+        self._stack = ()
+        self._pending_cycles = 0
+        self._stack_counts = Counter()
+        self._calls = Counter()
+
+    def run(self, max_cycles: int = DEFAULT_MAX_CYCLES) -> Profile:
+        address_hits = [0] * len(self.program.instructions)
+        function_entries = self.program.function_entries
+        return_points = self.program.return_points
+        instruction_kinds = self.program.instruction_kinds
+        previous_pc = None
+
+        def trace(pc):
+            nonlocal previous_pc
+            address_hits[pc] += 1
+            if pc in function_entries and (
+                previous_pc is None or instruction_kinds[previous_pc] == "C_CALL"
+            ):
+                self._enter(function_entries[pc])
+            elif pc in return_points:
+                self._leave()
+            self._pending_cycles += 1
+            previous_pc = pc
+
+        cycles = self.emulator.run(max_cycles, trace)
+        self._flush_pending_cycles()
+        kind_counts = Counter()
+        for kind, hits in zip(self.program.instruction_kinds, address_hits):
+            if hits:
+                kind_counts[kind] += hits
+        return Profile(
+            stack_counts=self._stack_counts,
+            kind_counts=kind_counts,
+            calls=self._calls,
+            total_cycles=cycles,
+            halted=self.emulator.halted,
+        )
+
+    def _enter(self, function_name: str):
+        self._flush_pending_cycles()
+        self._stack = self._stack + (function_name,)
+        self._calls[function_name] += 1
+
+    def _leave(self):
+        self._flush_pending_cycles()
+        self._stack = self._stack[:-1]
+
+    def _flush_pending_cycles(self):
+        if self._pending_cycles:
+            self._stack_counts[self._stack] += self._pending_cycles
+            self._pending_cycles = 0
+
+
+def parse_ram_assignments(assignments) -> dict:
+    ram = {}
+    for assignment in assignments or ():
+        address, _, value = assignment.partition("=")
+        ram[int(address)] = int(value)
+    return ram
+
+
+def get_asm_path(path: Path) -> Path:
+    if path.suffix == ".asm":
+        return path
+    from vm_translator.VMTranslator import Compiler
+
+    compiler = Compiler(path)
+    compiler.compile_and_write_asm()
+    return compiler.asm_file_path
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(
+        description="Run a translated program in the Hack emulator and profile it"
+    )
+    arg_parser.add_argument("path", type=Path, help=".asm file, .vm file or directory")
+    arg_parser.add_argument("--max-cycles", type=int, default=DEFAULT_MAX_CYCLES)
+    arg_parser.add_argument(
+        "--ram", action="append", metavar="ADDRESS=VALUE", help="initial RAM value"
+    )
+    arg_parser.add_argument("--top", type=int, default=20)
+    arg_parser.add_argument(
+        "--collapsed", type=Path, help="write collapsed stacks for flame graphs"
+    )
+    args = arg_parser.parse_args()
+
+    profiler = Profiler(
+        AsmProgram.from_file(get_asm_path(args.path)), parse_ram_assignments(args.ram)
+    )
+    profile = profiler.run(args.max_cycles)
+    if args.collapsed:
+        args.collapsed.write_text(profile.to_collapsed())
+    print(profile.report(args.top), end="")
@@ -0,0 +1,478 @@
+import sys
+from array import array
+from dataclasses import dataclass, field
+from functools import cached_property
+
+from vm_translator.code_size import TOP_LEVEL
+from vm_translator.code_writer import UnrecognisedCmdError
+from vm_translator.context import StaticAllocator
+from vm_translator.emulator import RAM_SIZE, WORD_MASK, to_signed
+from vm_translator.parser import Command
+
+
+STACK_BASE_ADDRESS = 256
+FRAME_SIZE = 5
+# loop iterations and calls
+DEFAULT_MAX_STEPS = 10_000_000
+# every VM call is a Python call and pushes at least a frame, so no program
+# fitting in the RAM nests its calls deeper
+MAX_CALL_DEPTH = RAM_SIZE // FRAME_SIZE
+BOOTSTRAP_NAME = "_bootstrap"
+_SEGMENT_BASES = {"local": "lcl", "argument": "arg", "this": "ram[3]", "that": "ram[4]"}
+_FIXED_SEGMENTS = {"pointer": 3, "temp": 5}
+_WRAP = "(({} + 32768) & 65535) - 32768"
+# comparisons test x - y like the Hack code, which overflows
+_BINARY_EXPRESSIONS = {
+    "add": _WRAP.format("{x} + {y}"),
+    "sub": _WRAP.format("{x} - {y}"),
+    "eq": "-({x} == {y})",
+    "gt": "-((({x} - {y} + 32768) & 65535) > 32768)",
+    "lt": "-((({x} - {y} + 32768) & 65535) < 32768)",
+    "and": "{x} & {y}",
+    "or": "{x} | {y}",
+}
+_UNARY_EXPRESSIONS = {"neg": _WRAP.format("-{x}"), "not": "~{x}"}
+
+
+@dataclass
+class PythonProgram:
+    """
+    Python source of a VM program with one function per VM function, the
+    RAM address of every static and the function making every call site
+    (the return address a call pushes is the index of its site).
+    """
+
+    source: str
+    entry: str
+    statics: dict
+    return_sites: list = field(default_factory=list)
+    n_locals: dict = field(default_factory=dict)
+
+    @cached_property
+    def code(self):
+        return compile(self.source, "<vm>", "exec")
+
+
+class PythonWriter:
+    """
+    VM to Python backend used instead of the CodeWriter for fast runs of VM
+    programs. Every VM function becomes a Python function of the shared
+    array('h') RAM with the memory layout of the Hack translation: the
+    segments, statics and frames are in the same places and arithmetic
+    wraps around at 16 bits. Within a function SP, LCL and ARG live in
+    Python variables and the pushed values in Python expressions until
+    the next label, jump or call, labels become blocks of a dispatch loop.
+    """
+
+    def __init__(self, bootstrap: bool = True):
+        self.bootstrap = bootstrap
+        self.statics = StaticAllocator(reserved=())
+        self.file_name = None
+        self.return_sites = []
+        self._units = {}
+        self._unit = None
+
+    def begin_file(self, file_name: str):
+        """
+        Following commands come from file_name, which namespaces their statics.
+        """
+        self.file_name = file_name
+
+    def write_cmd(self, cmd: Command):
+        if cmd.cmd_type == "C_FUNCTION":
+            self._unit = self._units[cmd.arg_1] = _Unit(cmd.arg_1, cmd.arg_2)
+            return
+        if self._unit is None:
+            self._unit = self._units[TOP_LEVEL] = _Unit(TOP_LEVEL, 0)
+        self._unit.cmds.append((self.file_name, cmd))
+
+    def close_file(self) -> PythonProgram:
+        names = {name: f"F{index}" for index, name in enumerate(self._units)}
+        if self.bootstrap:
+            bootstrap = _Unit(
+                BOOTSTRAP_NAME, 0, [(None, Command("C_CALL", "Sys.init", 0))]
+            )
+            units = [bootstrap, *self._units.values()]
+            names[BOOTSTRAP_NAME] = BOOTSTRAP_NAME
+            entry = BOOTSTRAP_NAME
+        elif self._units:
+            units = list(self._units.values())
+            entry = names[units[0].name]
+        else:
+            raise UndefinedSymbolError("there is no VM code to run")
+        lines = []
+        for unit in units:
+            lines += _FunctionTranslator(self, unit, names).translate()
+        return PythonProgram(
+            "\n".join(lines) + "\n",
+            entry,
+            dict(self.statics.addresses),
+            self.return_sites,
+            {unit.name: unit.n_locals for unit in self._units.values()},
+        )
+
+
+def translate_to_python(sources: dict, bootstrap: bool = True) -> PythonProgram:
+    """
+    sources are {file name: iterable of Commands}.
+    """
+    writer = PythonWriter(bootstrap)
+    for file_name, cmds in sources.items():
+        writer.begin_file(file_name)
+        for cmd in cmds:
+            writer.write_cmd(cmd)
+    return writer.close_file()
+
+
+class PythonExecutor:
+    """
+    Runs a PythonProgram like the Emulator runs an AsmProgram. The run stops
+    when the program enters a halt loop (label L, goto L), falls off the end
+    of a function, returns from the entry function or after max_steps loop
+    iterations and calls. The recursion limit of the interpreter is raised
+    to MAX_CALL_DEPTH during the run.
+    """
+
+    def __init__(self, program: PythonProgram, ram: dict = None):
+        self.program = program
+        self.ram = array("h", bytes(2 * RAM_SIZE))
+        for address, value in (ram or {}).items():
+            self.ram[address] = to_signed(value & WORD_MASK)
+        self.namespace = {
+            "ProgramHalted": ProgramHalted,
+            "StepLimitReached": StepLimitReached,
+        }
+        exec(program.code, self.namespace)
+        self.steps = 0
+        self.halted = False
+        self.halted_in = None
+
+    def read(self, address: int) -> int:
+        return self.ram[address]
+
+    def run(self, max_steps: int = DEFAULT_MAX_STEPS) -> int:
+        """
+        Executes the program, returns number of executed steps.
+        """
+        namespace = self.namespace
+        namespace["_budget"] = max_steps
+        recursion_limit = sys.getrecursionlimit()
+        sys.setrecursionlimit(recursion_limit + MAX_CALL_DEPTH)
+        try:
+            namespace[self.program.entry](self.ram)
+            self.halted = True
+        except ProgramHalted as halt:
+            self.halted, self.halted_in = True, halt.args[0]
+        except StepLimitReached:
+            pass
+        except RecursionError:
+            raise CallDepthExceededError(
+                f"the calls nest deeper than {MAX_CALL_DEPTH} frames"
+            ) from None
+        finally:
+            sys.setrecursionlimit(recursion_limit)
+        steps = max_steps - max(namespace["_budget"], 0)
+        self.steps += steps
+        return steps
+
+
+@dataclass
+class _Unit:
+    name: str
+    n_locals: int
+    cmds: list = field(default_factory=list)
+
+
+class _FunctionTranslator:
+    """
+    Translates one function. pending holds the values pushed since the
+    last write of the stack: ints are constants, identifiers Python
+    variables and other strings expressions reading the RAM, which are
+    assigned to variables before the next write to the RAM. popped counts
+    the values taken from below the SP of the block.
+    """
+
+    def __init__(self, writer: PythonWriter, unit: _Unit, names: dict):
+        self.writer = writer
+        self.unit = unit
+        self.names = names
+        self.lines = []
+        self.indent = 1
+        self.pending = []
+        self.popped = 0
+        self.temps = 0
+        self.blocks = self._split_blocks(unit.cmds)
+        self.block_of_label = {
+            label: index
+            for index, (labels, _) in enumerate(self.blocks)
+            for label in labels
+        }
+
+    @staticmethod
+    def _split_blocks(cmds) -> list:
+        """
+        Returns [(labels, [(file name, cmd)])], a block starts at labels
+        and after jumps and returns.
+        """
+        blocks = [([], [])]
+        for file_name, cmd in cmds:
+            labels, block_cmds = blocks[-1]
+            if cmd.cmd_type == "C_LABEL":
+                if block_cmds:
+                    blocks.append(([], []))
+                blocks[-1][0].append(cmd.arg_1)
+                continue
+            if block_cmds and block_cmds[-1][1].cmd_type in (
+                "C_GOTO",
+                "C_IF",
+                "C_RETURN",
+            ):
+                blocks.append(([], []))
+            blocks[-1][1].append((file_name, cmd))
+        return blocks
+
+    def translate(self) -> list:
+        unit = self.unit
+        self._emit(f"def {self.names[unit.name]}(ram):", 0)
+        self._emit("global _budget", 1)
+        if unit.name == BOOTSTRAP_NAME:
+            self._emit(f"sp = ram[0] = {STACK_BASE_ADDRESS}", 1)
+        else:
+            self._emit("sp = ram[0]", 1)
+        self._emit("lcl = ram[1]", 1)
+        self._emit("arg = ram[2]", 1)
+        self._emit_step(1)
+        for local in range(unit.n_locals):
+            self._emit(f"ram[sp + {local}] = 0" if local else "ram[sp] = 0", 1)
+        if unit.n_locals:
+            self._emit(f"sp += {unit.n_locals}", 1)
+        if len(self.blocks) == 1 and not self.blocks[0][0]:
+            self._translate_block(0)
+        else:
+            self._emit("block = 0", 1)
+            self._emit("while True:", 1)
+            for index in range(len(self.blocks)):
+                self._emit(f"if block == {index}:", 2)
+                self.indent = 3
+                self._translate_block(index)
+        return self.lines + [""]
+
+    def _translate_block(self, index: int):
+        labels, cmds = self.blocks[index]
+        if cmds and cmds[0][1].cmd_type == "C_GOTO" and cmds[0][1].arg_1 in labels:
+            self._emit_halt()
+            return
+        for file_name, cmd in cmds:
+            self._translate_cmd(file_name, cmd, index)
+        if not cmds or cmds[-1][1].cmd_type not in ("C_GOTO", "C_IF", "C_RETURN"):
+            self._flush()
+            if index + 1 < len(self.blocks):
+                self._emit(f"block = {index + 1}")
+            else:
+                self._emit_halt()
+
+    def _translate_cmd(self, file_name: str, cmd: Command, index: int):
+        if cmd.cmd_type == "C_PUSH":
+            self._push_segment(file_name, cmd)
+        elif cmd.cmd_type == "C_POP":
+            self._pop_segment(file_name, cmd)
+        elif cmd.cmd_type == "C_ARITHMETIC" and cmd.arg_2 is None:
+            self._arithmetic(cmd)
+        elif cmd.cmd_type == "C_GOTO":
+            self._flush()
+            self._emit_jump(self._target(cmd), index)
+        elif cmd.cmd_type == "C_IF":
+            # the flush may move SP below a condition read from the stack
+            condition = self._assign(self._pop())
+            self._flush()
+            self._emit_conditional_jump(condition, self._target(cmd), index)
+        elif cmd.cmd_type == "C_CALL":
+            self._call(cmd)
+        elif cmd.cmd_type == "C_RETURN":
+            self._return()
+        else:
+            raise UnrecognisedCmdError(
+                f"{cmd} is not handled by the Python backend, check your VM code"
+            )
+
+    def _push_segment(self, file_name: str, cmd: Command):
+        if cmd.arg_1 == "constant":
+            self.pending.append(cmd.arg_2)
+        else:
+            self.pending.append(f"ram[{self._address(file_name, cmd)}]")
+
+    def _pop_segment(self, file_name: str, cmd: Command):
+        if cmd.arg_1 == "constant":
+            raise UnrecognisedCmdError(
+                f"{cmd} pops into a constant, check your VM code"
+            )
+        value = self._pop()
+        self._materialize()
+        self._emit(f"ram[{self._address(file_name, cmd)}] = {_render(value)}")
+
+    def _address(self, file_name: str, cmd: Command) -> str:
+        segment, index = cmd.arg_1, cmd.arg_2
+        if segment in _SEGMENT_BASES:
+            base = _SEGMENT_BASES[segment]
+            return f"{base} + {index}" if index else base
+        if segment in _FIXED_SEGMENTS:
+            return str(_FIXED_SEGMENTS[segment] + index)
+        if segment == "static":
+            return str(self.writer.statics.allocate(file_name, index))
+        raise UnrecognisedCmdError(f"{cmd} uses an unknown segment, check your VM code")
+
+    def _arithmetic(self, cmd: Command):
+        if cmd.arg_1 in _UNARY_EXPRESSIONS:
+            expression, operands = _UNARY_EXPRESSIONS[cmd.arg_1], {"x": self._pop()}
+        elif cmd.arg_1 in _BINARY_EXPRESSIONS:
+            y = self._pop()
+            expression, operands = _BINARY_EXPRESSIONS[cmd.arg_1], {
+                "x": self._pop(),
+                "y": y,
+            }
+        else:
+            raise UnrecognisedCmdError(
+                f"{cmd} is not handled by the Python backend, check your VM code"
+            )
+        if all(isinstance(operand, int) for operand in operands.values()):
+            self.pending.append(eval(expression.format(**operands)))
+            return
+        self.pending.append(
+            expression.format(
+                **{name: _render(value) for name, value in operands.items()}
+            )
+        )
+
+    def _pop(self):
+        if self.pending:
+            return self.pending.pop()
+        self.popped += 1
+        return f"ram[sp - {self.popped}]"
+
+    def _materialize(self):
+        """
+        Assigns the pending expressions to variables.
+        """
+        self.pending = [self._assign(value) for value in self.pending]
+
+    def _assign(self, value):
+        if isinstance(value, int) or value.isidentifier():
+            return value
+        temp = f"t{self.temps}"
+        self.temps += 1
+        self._emit(f"{temp} = {value}")
+        return temp
+
+    def _flush(self):
+        """
+        Writes the pending values to the stack and updates SP.
+        """
+        if len(self.pending) > 1:
+            self._materialize()
+        for position, value in enumerate(self.pending, -self.popped):
+            self._emit(f"ram[{_offset('sp', position)}] = {_render(value)}")
+        if len(self.pending) > self.popped:
+            self._emit(f"sp += {len(self.pending) - self.popped}")
+        elif len(self.pending) < self.popped:
+            self._emit(f"sp -= {self.popped - len(self.pending)}")
+        self.pending, self.popped = [], 0
+
+    def _target(self, cmd: Command) -> int:
+        if cmd.arg_1 not in self.block_of_label:
+            raise UndefinedSymbolError(
+                f"{self.unit.name} jumps to {cmd.arg_1} outside of the function"
+            )
+        return self.block_of_label[cmd.arg_1]
+
+    def _emit_jump(self, target: int, index: int, indent: int = None):
+        if target > index:
+            self._emit(f"block = {target}", indent)
+            return
+        self._emit_step(indent)
+        self._emit(f"block = {target}", indent)
+        self._emit("continue", indent)
+
+    def _emit_conditional_jump(self, condition, target: int, index: int):
+        next_block = index + 1
+        if target > index and next_block < len(self.blocks):
+            self._emit(f"block = {target} if {_render(condition)} else {next_block}")
+            return
+        self._emit(f"if {_render(condition)}:")
+        self._emit_jump(target, index, self.indent + 1)
+        if next_block < len(self.blocks):
+            self._emit(f"block = {next_block}")
+        else:
+            self._emit_halt()
+
+    def _call(self, cmd: Command):
+        if cmd.arg_1 not in self.names:
+            raise UndefinedSymbolError(f"{self.unit.name} calls undefined {cmd.arg_1}")
+        self._flush()
+        writer = self.writer
+        writer.return_sites.append(self.unit.name)
+        frame = (len(writer.return_sites) - 1, "lcl", "arg", "ram[3]", "ram[4]")
+        for position, value in enumerate(frame):
+            self._emit(f"ram[{_offset('sp', position)}] = {value}")
+        self._emit(f"sp += {FRAME_SIZE}")
+        self._emit(f"ram[2] = {_offset('sp', -FRAME_SIZE - cmd.arg_2)}")
+        self._emit("ram[1] = ram[0] = sp")
+        self._emit(f"{self.names[cmd.arg_1]}(ram)")
+        self._emit("sp = ram[0]")
+
+    def _return(self):
+        value = self._pop()
+        self._emit(f"ram[arg] = {_render(value)}")
+        self._emit("sp = ram[0] = arg + 1")
+        for register in (4, 3, 2, 1):
+            self._emit(f"ram[{register}] = ram[lcl - {5 - register}]")
+        self._emit("return")
+        self.pending, self.popped = [], 0
+
+    def _emit_halt(self):
+        self._flush()
+        self._emit("ram[0] = sp")
+        self._emit(f"raise ProgramHalted({self.unit.name!r})")
+
+    def _emit_step(self, indent: int = None):
+        """
+        Counts a loop iteration or call against the step budget of the run.
+        """
+        indent = self.indent if indent is None else indent
+        self._emit("_budget -= 1", indent)
+        self._emit("if _budget < 0:", indent)
+        self._emit("ram[0] = sp", indent + 1)
+        self._emit("raise StepLimitReached", indent + 1)
+
+    def _emit(self, line: str, indent: int = None):
+        indent = self.indent if indent is None else indent
+        self.lines.append("    " * indent + line)
+
+
+def _render(value) -> str:
+    if isinstance(value, int):
+        return f"({value})" if value < 0 else str(value)
+    return value if value.isidentifier() else f"({value})"
+
+
+def _offset(name: str, offset: int) -> str:
+    if offset > 0:
+        return f"{name} + {offset}"
+    if offset < 0:
+        return f"{name} - {-offset}"
+    return name
+
+
+class ProgramHalted(Exception):
+    pass
+
+
+class StepLimitReached(Exception):
+    pass
+
+
+class UndefinedSymbolError(Exception):
+    pass
+
+
+class CallDepthExceededError(Exception):
+    pass
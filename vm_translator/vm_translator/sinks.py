@@ -0,0 +1,144 @@
+import sys
+from pathlib import Path
+
+
+DEFAULT_BUFFER_SIZE = 64 * 1024
+
+
+class OutputSink:
+    """
+    Destination of the generated asm. write() only buffers the text, it
+    reaches the destination in chunks of at least buffer_size characters,
+    on flush() and on close(). abort() closes the sink of a failed
+    translation without the buffered text. Nothing can be written after
+    close() or abort().
+    """
+
+    def __init__(self, buffer_size: int = DEFAULT_BUFFER_SIZE):
+        self.buffer_size = buffer_size
+        self.closed = False
+        self._buffer = []
+        self._buffered_size = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def write(self, text: str):
+        if self.closed:
+            raise SinkClosedError(f"{self} is already closed")
+        self._buffer.append(text)
+        self._buffered_size += len(text)
+        if self._buffered_size >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        if self._buffer:
+            chunk = "".join(self._buffer)
+            self._buffer = []
+            self._buffered_size = 0
+            self._write_chunk(chunk)
+
+    def close(self):
+        if self.closed:
+            return
+        self.flush()
+        self._close()
+        self.closed = True
+
+    def abort(self):
+        if self.closed:
+            return
+        self._buffer = []
+        self._buffered_size = 0
+        self._abort()
+        self.closed = True
+
+    def _write_chunk(self, chunk: str):
+        raise NotImplementedError
+
+    def _close(self):
+        pass
+
+    def _abort(self):
+        self._close()
+
+
+class FileSink(OutputSink):
+    """
+    The file is created on the first flushed chunk (or on close) and
+    removed on abort, so a writer which fails leaves no file behind.
+    """
+
+    def __init__(self, file_path: Path, buffer_size: int = DEFAULT_BUFFER_SIZE):
+        super().__init__(buffer_size)
+        self.file_path = file_path
+        self._file = None
+
+    def _write_chunk(self, chunk: str):
+        self._open_file_if_not_opened()
+        self._file.write(chunk)
+
+    def _close(self):
+        self._open_file_if_not_opened()
+        self._file.close()
+
+    def _abort(self):
+        if self._file is not None:
+            self._file.close()
+            Path(self.file_path).unlink()
+
+    def _open_file_if_not_opened(self):
+        if self._file is None:
+            self._file = open(self.file_path, "w")
+
+
+class StreamSink(OutputSink):
+    """
+    Writes to an already open text stream (stdout by default), the stream
+    is flushed but not closed on close().
+    """
+
+    def __init__(self, stream=None, buffer_size: int = DEFAULT_BUFFER_SIZE):
+        super().__init__(buffer_size)
+        self.stream = stream if stream is not None else sys.stdout
+
+    def _write_chunk(self, chunk: str):
+        self.stream.write(chunk)
+
+    def flush(self):
+        super().flush()
+        self.stream.flush()
+
+
+class MemorySink(OutputSink):
+    def __init__(self, buffer_size: int = DEFAULT_BUFFER_SIZE):
+        super().__init__(buffer_size)
+        self.data = bytearray()
+
+    def _write_chunk(self, chunk: str):
+        self.data += chunk.encode()
+
+    def getvalue(self) -> str:
+        self.flush()
+        return self.data.decode()
+
+
+class CallbackSink(OutputSink):
+    """
+    Passes every flushed chunk to callback, e.g. to feed another tool
+    without going through the filesystem.
+    """
+
+    def __init__(self, callback, buffer_size: int = DEFAULT_BUFFER_SIZE):
+        super().__init__(buffer_size)
+        self.callback = callback
+
+    def _write_chunk(self, chunk: str):
+        self.callback(chunk)
+
+
+class SinkClosedError(Exception):
+    pass
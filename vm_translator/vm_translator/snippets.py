@@ -0,0 +1,325 @@
+"""
+Asm snippets of the VM commands, joined once at import time into str.format
+templates. Every template starts with the "// {cmd}" comment line and knows
+its size in ROM words, so translated commands never have to be rescanned.
+"""
+
+from dataclasses import dataclass
+
+SEGMENT_POINTERS = {
+    "local": "LCL",
+    "argument": "ARG",
+    "this": "THIS",
+    "that": "THAT",
+}
+POINTER_REGISTERS = {
+    0: "THIS",
+    1: "THAT",
+}
+TEMP_BASE_ADDRESS = 5
+
+_PUSH_D = ("@SP", "A=M", "M=D", "@SP", "M=M+1")
+_POP_TO_D = ("@SP", "AM=M-1", "D=M")
+
+RETURN_LINES = (
+    # endFrame = LCL
+    "@LCL",
+    "D=M",
+    "@endFrame",
+    "M=D",
+    # retAddr = *(endFrame - 5)
+    "@5",
+    "D=A",
+    "@endFrame",
+    "A=M-D",
+    "D=M",
+    "@retAddr",
+    "M=D",
+    # *ARG = POP()
+    "@SP",
+    "AM=M-1",
+    "D=M",
+    "@ARG",
+    "A=M",
+    "M=D",
+    # SP = ARG + 1
+    "@ARG",
+    "D=M",
+    "@SP",
+    "M=D+1",
+    # THAT = *(endFrame - 1)
+    "@endFrame",
+    "A=M-1",
+    "D=M",
+    "@THAT",
+    "M=D",
+    # THIS = *(endFrame - 2)
+    "@endFrame",
+    "A=M-1",
+    "A=A-1",
+    "D=M",
+    "@THIS",
+    "M=D",
+    # ARG = *(endFrame - 3)
+    "@endFrame",
+    "A=M-1",
+    "A=A-1",
+    "A=A-1",
+    "D=M",
+    "@ARG",
+    "M=D",
+    # LCL = *(endFrame - 4)
+    "@endFrame",
+    "A=M-1",
+    "A=A-1",
+    "A=A-1",
+    "A=A-1",
+    "D=M",
+    "@LCL",
+    "M=D",
+    # goto retAddr
+    "@retAddr",
+    "A=M",
+    "0;JMP",
+)
+
+
+def count_instructions(asm_code: str) -> int:
+    """
+    Number of ROM words of the asm code, labels and comments are not counted.
+    """
+    count = 0
+    for line in asm_code.split("\n"):
+        line = line.strip()
+        if line and not line.startswith("//") and not line.startswith("("):
+            count += 1
+    return count
+
+
+@dataclass(frozen=True)
+class Snippet:
+    template: str
+    instructions: int
+
+    def render(self, **fields) -> str:
+        return self.template.format(**fields)
+
+
+def _template(*lines, comment="{cmd}") -> Snippet:
+    template = "\n".join((f"\n// {comment}", *lines))
+    return Snippet(template, count_instructions(template))
+
+
+def _comparison_template(jump: str) -> Snippet:
+    return _template(
+        "@SP",
+        "AM=M-1",
+        "D=M",
+        "@R13",
+        "M=D",
+        "@SP",
+        "A=M-1",
+        "D=M",
+        "@R13",
+        "D=D-M",
+        "@{comparison}{label}",
+        f"D; {jump}",
+        "@SP",
+        "A=M-1",
+        "M=0",
+        "@{comparison}END{label}",
+        "0; JMP",
+        "({comparison}{label})",
+        "@SP",
+        "A=M-1",
+        "M=-1",
+        "({comparison}END{label})",
+        comment="gt",
+    )
+
+
+def _push_pop_templates() -> dict:
+    templates = {
+        ("C_PUSH", "constant"): _template("@{operand}", "D=A", *_PUSH_D),
+    }
+    for segment, pointer in SEGMENT_POINTERS.items():
+        templates["C_PUSH", segment] = _template(
+            "@{operand}", "D=A", f"@{pointer}", "A=M+D", "D=M", *_PUSH_D
+        )
+        templates["C_POP", segment] = _template(
+            "@{operand}",
+            "D=A",
+            f"@{pointer}",
+            "D=M+D",
+            "@R13",
+            "M=D",
+            *_POP_TO_D,
+            "@R13",
+            "A=M",
+            "M=D",
+        )
+    for segment in ("temp", "static", "pointer"):
+        templates["C_PUSH", segment] = _template("@{operand}", "D=M", *_PUSH_D)
+        templates["C_POP", segment] = _template(*_POP_TO_D, "@{operand}", "M=D")
+    return templates
+
+
+# (command type, segment or arithmetic command) -> template
+SNIPPET_TEMPLATES = {
+    **_push_pop_templates(),
+    ("C_ARITHMETIC", "add"): _template(
+        "@SP", "AM=M-1", "D=M", "A=A-1", "M=D+M", comment="add"
+    ),
+    ("C_ARITHMETIC", "sub"): _template(
+        "@SP", "AM=M-1", "D=M", "A=A-1", "M=M-D", comment="sub"
+    ),
+    ("C_ARITHMETIC", "or"): _template(
+        "@SP", "AM=M-1", "D=M", "A=A-1", "M=D|M", comment="or"
+    ),
+    ("C_ARITHMETIC", "and"): _template(
+        "@SP", "AM=M-1", "D=M", "A=A-1", "M=D&M", comment="and"
+    ),
+    ("C_ARITHMETIC", "not"): _template("@SP", "A=M-1", "M=!M", comment="or"),
+    ("C_ARITHMETIC", "neg"): _template("@SP", "A=M-1", "M=-M", comment="or"),
+    ("C_ARITHMETIC", "gt"): _comparison_template("JGT"),
+    ("C_ARITHMETIC", "lt"): _comparison_template("JLT"),
+    ("C_ARITHMETIC", "eq"): _comparison_template("JEQ"),
+    # the shared $$DIVIDE routine shifts the top of the stack right
+    ("C_ARITHMETIC", "Math.divide"): _template(
+        "@{shifts}",
+        "D=A",
+        "@R14",
+        "M=D",
+        "@{return_label}",
+        "D=A",
+        "@$$DIVIDE",
+        "0;JMP",
+        "({return_label})",
+    ),
+    # jumps into the entry of the string literal pool writing the characters
+    ("C_STRING", None): _template(
+        "@{return_label}",
+        "D=A",
+        "@{label}",
+        "0;JMP",
+        "({return_label})",
+        comment="C_STRING {text}",
+    ),
+    # add; pop pointer 1; push that 0
+    ("C_ARRAY", "read"): _template(
+        "@SP",
+        "AM=M-1",
+        "D=M",
+        "A=A-1",
+        "D=D+M",
+        "@THAT",
+        "AM=D",
+        "D=M",
+        "@SP",
+        "A=M-1",
+        "M=D",
+    ),
+    # pop temp 0; pop pointer 1; push temp 0; pop that 0
+    ("C_ARRAY", "write"): _template(
+        "@SP",
+        "AM=M-1",
+        "D=M",
+        f"@{TEMP_BASE_ADDRESS}",
+        "M=D",
+        "@SP",
+        "AM=M-1",
+        "D=M",
+        "@THAT",
+        "M=D",
+        f"@{TEMP_BASE_ADDRESS}",
+        "D=M",
+        "@THAT",
+        "A=M",
+        "M=D",
+    ),
+    ("C_LABEL", None): _template("({label})"),
+    ("C_GOTO", None): _template("@{label}", "0;JMP"),
+    ("C_IF", None): _template(*_POP_TO_D, "@{label}", "D;JNE"),
+    # {locals} are n_locals PUSH_ZERO, not counted in instructions
+    ("C_FUNCTION", None): Snippet("\n// {cmd}\n({function})\n{locals}", 0),
+    ("C_CALL", None): _template(
+        # PUSH returnAddress
+        "@{return_label}",
+        "D=A",
+        *_PUSH_D,
+        # PUSH LCL, ARG, THIS, THAT
+        *(
+            line
+            for pointer in ("LCL", "ARG", "THIS", "THAT")
+            for line in (f"@{pointer}", "D=M", *_PUSH_D)
+        ),
+        # ARG = SP - 5 - nArgs
+        "@5",
+        "D=A",
+        "@R14",
+        "M=D",
+        "@{n_args}",
+        "D=A",
+        "@R14",
+        "M=M+D",
+        "@SP",
+        "D=M",
+        "@R14",
+        "MD=D-M",
+        "@ARG",
+        "M=D",
+        # LCL = SP
+        "@SP",
+        "D=M",
+        "@LCL",
+        "M=D",
+        # goto
+        "@{function}",
+        "0;JMP",
+        "({return_label})",
+    ),
+    ("C_RETURN", None): _template(*RETURN_LINES),
+}
+# templates of the compact code shape (CodeShape flags) which differ from the default
+COMPACT_SNIPPET_TEMPLATES = {
+    ("C_ARITHMETIC", "comparison"): _template(
+        "@{comparison}{label}",
+        "D=A",
+        "@{routine}",
+        "0;JMP",
+        "({comparison}{label})",
+        comment="{comparison}",
+    ),
+    ("C_FUNCTION", None): _template(
+        "({function})",
+        "@{n_locals}",
+        "D=A",
+        "({function}$initLocals)",
+        "@SP",
+        "AM=M+1",
+        "A=A-1",
+        "M=0",
+        "D=D-1",
+        "@{function}$initLocals",
+        "D;JGT",
+    ),
+    ("C_CALL", None): _template(
+        "@{n_args}",
+        "D=A",
+        "@R14",
+        "M=D",
+        "@{function}",
+        "D=A",
+        "@R13",
+        "M=D",
+        "@{return_label}",
+        "D=A",
+        "@$$CALL",
+        "0;JMP",
+        "({return_label})",
+    ),
+    ("C_RETURN", None): _template("@$$RETURN", "0;JMP"),
+}
+PUSH_D_LINES = _PUSH_D
+PUSH_ZERO = "@SP\nA=M\nM=0\n@SP\nM=M+1\n"
+PUSH_ZERO_INSTRUCTIONS = count_instructions(PUSH_ZERO)
@@ -0,0 +1,213 @@
+import math
+from dataclasses import dataclass, field
+
+from vm_translator.code_size import TOP_LEVEL
+from vm_translator.frames import recursive_functions, strongly_connected_components
+from vm_translator.fusion import ARRAY_ACCESS
+from vm_translator.literals import APPEND_CHAR, STRING_LITERAL
+from vm_translator.strength import DIVIDE, MULTIPLY, is_power_of_two
+
+
+FRAME_SIZE = 5
+STACK_BASE_ADDRESS = 256
+HEAP_BASE_ADDRESS = 2048
+STACK_SIZE = HEAP_BASE_ADDRESS - STACK_BASE_ADDRESS
+UNBOUNDED = math.inf
+BINARY_ARITHMETIC = ("add", "sub", "eq", "gt", "lt", "and", "or")
+# words the fused array accesses take from the stack
+ARRAY_POPS = {"read": 1, "write": 2}
+# the $$STRLIT routine keeps the return address, the number of characters
+# and the index above the characters while it calls String.appendChar
+STRING_LITERAL_WORDS = 3
+
+
+@dataclass
+class FunctionStack:
+    """
+    Stack words of one function: the locals on the stack, the deepest
+    operand stack of its own code and at each callee (arguments included),
+    and its total, all the words it and its callees use above the SP of
+    its call. total is UNBOUNDED for recursion and operand stacks growing
+    in loops, deepest_callee is the callee of the deepest call.
+    """
+
+    name: str
+    n_locals: int
+    operands: float = 0
+    calls: dict = field(default_factory=dict)
+    total: float = 0
+    deepest_callee: str = None
+
+    @property
+    def frame(self) -> int:
+        return 0 if self.name == TOP_LEVEL else FRAME_SIZE + self.n_locals
+
+
+def operand_depths(cmds) -> tuple:
+    """
+    Returns (deepest operand stack, {callee: deepest operand stack at its
+    calls}) of a function body, following its jumps. Scratch words the
+    snippets use above the stack count as operands. A depth past the number
+    of commands can only come from a loop pushing more than it pops, which
+    makes the operand stack UNBOUNDED.
+    """
+    cmds = list(cmds)
+    labels = {
+        cmd.arg_1: index for index, cmd in enumerate(cmds) if cmd.cmd_type == "C_LABEL"
+    }
+    depth_at, calls = {}, {}
+    deepest = 0
+    work = [(0, 0)]
+    while work:
+        index, depth = work.pop()
+        while index < len(cmds):
+            if index in depth_at and depth_at[index] >= depth:
+                break
+            if depth > len(cmds):
+                return UNBOUNDED, calls
+            depth_at[index] = depth
+            cmd = cmds[index]
+            index += 1
+            scratch = 0
+            if cmd.cmd_type == "C_PUSH":
+                depth += 1
+            elif cmd.cmd_type == "C_POP":
+                depth -= 1
+            elif cmd.cmd_type == "C_ARITHMETIC" and cmd.arg_2 is not None:
+                # $$DIVIDE and the multiplications by other constants than
+                # powers of two use the word at SP
+                if cmd.arg_1 == DIVIDE or (
+                    cmd.arg_1 == MULTIPLY
+                    and not is_power_of_two(cmd.arg_2)
+                    and cmd.arg_2
+                ):
+                    scratch = 1
+            elif cmd.cmd_type == "C_ARITHMETIC":
+                if cmd.arg_1 in BINARY_ARITHMETIC:
+                    depth -= 1
+            elif cmd.cmd_type == ARRAY_ACCESS:
+                depth -= ARRAY_POPS[cmd.arg_1]
+            elif cmd.cmd_type == STRING_LITERAL:
+                scratch = len(cmd.arg_1) + STRING_LITERAL_WORDS
+                if cmd.arg_1:
+                    # the string and the character are the arguments
+                    calls[APPEND_CHAR] = max(
+                        calls.get(APPEND_CHAR, 0), depth + scratch + 2
+                    )
+            elif cmd.cmd_type == "C_CALL":
+                calls[cmd.arg_1] = max(calls.get(cmd.arg_1, 0), depth)
+                depth += 1 - cmd.arg_2
+            elif cmd.cmd_type == "C_IF":
+                depth -= 1
+                if cmd.arg_1 in labels:
+                    work.append((labels[cmd.arg_1], depth))
+            elif cmd.cmd_type == "C_GOTO":
+                if cmd.arg_1 not in labels:
+                    break
+                index = labels[cmd.arg_1]
+            elif cmd.cmd_type == "C_RETURN":
+                break
+            deepest = max(deepest, depth + scratch)
+    return deepest, calls
+
+
+def analyze_stack_depth(cmds, static_frames: dict = None) -> dict:
+    """
+    Returns {function: FunctionStack} of the program, code outside of
+    functions is TOP_LEVEL without a frame. Locals of the static_frames
+    functions (see frames.plan_static_frames) are not on the stack. Callees
+    missing from the program count with their frame only.
+    """
+    static_frames = static_frames or {}
+    bodies, functions = {}, {}
+    name = TOP_LEVEL
+    for cmd in cmds:
+        if cmd.cmd_type == "C_FUNCTION":
+            name = cmd.arg_1
+            n_locals = 0 if name in static_frames else cmd.arg_2
+            functions[name] = FunctionStack(name, n_locals)
+            bodies[name] = []
+            continue
+        if name not in functions:
+            functions[name] = FunctionStack(name, 0)
+            bodies[name] = []
+        bodies[name].append(cmd)
+    for name, function in functions.items():
+        function.operands, function.calls = operand_depths(bodies[name])
+    calls = {name: list(function.calls) for name, function in functions.items()}
+    components = strongly_connected_components(calls)
+    recursive = recursive_functions(calls, components)
+    for component in components:
+        for name in component:
+            if name in functions:
+                _sum_up(functions[name], functions, recursive)
+    return functions
+
+
+def _sum_up(function: FunctionStack, functions: dict, recursive: set):
+    deepest = function.operands
+    for callee, depth in function.calls.items():
+        if callee in recursive:
+            callee_total = UNBOUNDED
+        elif callee in functions:
+            callee_total = functions[callee].total
+        else:
+            callee_total = FRAME_SIZE
+        if depth + callee_total > deepest:
+            deepest = depth + callee_total
+            function.deepest_callee = callee
+    function.total = (
+        UNBOUNDED if function.name in recursive else function.frame + deepest
+    )
+
+
+def entry_points(functions: dict) -> list:
+    """
+    Functions no function calls, e.g. Sys.init and the top level code.
+    """
+    called = {callee for function in functions.values() for callee in function.calls}
+    return [name for name in functions if name not in called]
+
+
+def deepest_path(functions: dict, entry: str) -> list:
+    """
+    Functions from entry down the deepest calls, up to the first recursive one.
+    """
+    path = [entry]
+    function = functions[entry]
+    while function.deepest_callee is not None and function.deepest_callee not in path:
+        path.append(function.deepest_callee)
+        function = functions.get(function.deepest_callee)
+        if function is None:
+            break
+    return path
+
+
+def report_stack_depth(functions: dict) -> str:
+    entries = entry_points(functions)
+    lines = [
+        f"stack depth: {len(entries)} entry points, {STACK_SIZE} words from"
+        f" RAM {STACK_BASE_ADDRESS} to the heap"
+    ]
+    for entry in entries:
+        total = functions[entry].total
+        note = ""
+        if total == UNBOUNDED:
+            note = "  (recursion or a growing loop)"
+        elif total > STACK_SIZE:
+            note = "  (overflows into the heap)"
+        lines.append(
+            f"{_words(total):>10}  {entry}{note}:"
+            f" {' > '.join(deepest_path(functions, entry))}"
+        )
+    lines.append("functions: total words (frame and locals + operands)")
+    for function in sorted(functions.values(), key=lambda f: f.total, reverse=True):
+        lines.append(
+            f"{_words(function.total):>10}  {function.name}:"
+            f" {function.frame} + {_words(function.operands)}"
+        )
+    return "\n".join(lines) + "\n"
+
+
+def _words(words: float) -> str:
+    return "unbounded" if words == UNBOUNDED else str(words)
@@ -0,0 +1,96 @@
+from collections import Counter
+
+from vm_translator.parser import Command
+
+
+MULTIPLY = "Math.multiply"
+DIVIDE = "Math.divide"
+
+
+def is_power_of_two(value: int) -> bool:
+    return value > 0 and value & (value - 1) == 0
+
+
+def non_adjacent_form(value: int) -> list:
+    """
+    Signed binary digits (1, 0 or -1) of a positive value from the most
+    significant one, which is 1. No two adjacent digits are non-zero, so
+    e.g. 15 = 16 - 1 needs two digits instead of four.
+    """
+    digits = []
+    while value:
+        digit = 0
+        if value & 1:
+            digit = 2 - (value & 3)
+            value -= digit
+        digits.append(digit)
+        value >>= 1
+    return digits[::-1]
+
+
+def reduce_strength(cmds, reduced: Counter = None):
+    """
+    Yields cmds with the calls of Math.multiply and Math.divide which have
+    a constant operand replaced by C_ARITHMETIC commands the CodeWriter
+    translates inline: Math.multiply with either operand pushed by
+    push constant N becomes ("C_ARITHMETIC", "Math.multiply", N), and
+    Math.divide by a power of two ("C_ARITHMETIC", "Math.divide", N).
+    Multiplying or dividing by 1 leaves the stack as it is and drops the
+    call. Counts the reduced call sites per function in reduced. The
+    rewrite assumes the Jack OS semantics of Math: 16 bit products and
+    divisions rounding towards zero.
+    """
+    held = []
+    for cmd in cmds:
+        reduction = _reduce_call(held, cmd)
+        if reduction is None:
+            held.append(cmd)
+            if len(held) > 2:
+                yield held.pop(0)
+            continue
+        consumed, replacement = reduction
+        yield from held[: len(held) - consumed]
+        yield from replacement
+        held = []
+        if reduced is not None:
+            reduced[cmd.arg_1] += 1
+    yield from held
+
+
+def _reduce_call(held: list, cmd: Command):
+    """
+    Returns (number of held commands consumed, replacement commands) if
+    cmd is a reducible call given the commands held before it.
+    """
+    if cmd.cmd_type != "C_CALL" or cmd.arg_2 != 2 or not held:
+        return None
+    constant = _pushed_constant(held[-1])
+    if cmd.arg_1 == MULTIPLY:
+        if constant is not None:
+            return 1, _reduced(MULTIPLY, constant)
+        if len(held) > 1 and held[-1].cmd_type == "C_PUSH":
+            constant = _pushed_constant(held[-2])
+            if constant is not None:
+                return 2, [held[-1], *_reduced(MULTIPLY, constant)]
+    elif cmd.arg_1 == DIVIDE and constant is not None and is_power_of_two(constant):
+        return 1, _reduced(DIVIDE, constant)
+    return None
+
+
+def _pushed_constant(cmd: Command):
+    if cmd.cmd_type == "C_PUSH" and cmd.arg_1 == "constant":
+        return cmd.arg_2
+    return None
+
+
+def _reduced(function: str, constant: int) -> list:
+    if constant == 1:
+        return []
+    return [Command("C_ARITHMETIC", function, constant)]
+
+
+def report_reduced_calls(reduced: Counter) -> str:
+    sites = ", ".join(
+        f"{function} {count}" for function, count in sorted(reduced.items())
+    )
+    return f"strength reduced call sites: {sites or 'none'}\n"
@@ -0,0 +1,127 @@
+import json
+import re
+import string
+from pathlib import Path
+
+from vm_translator.assembler import PREDEFINED_SYMBOLS
+from vm_translator.sinks import DEFAULT_BUFFER_SIZE, OutputSink
+
+
+# variables of the C_RETURN snippet, free registers while it runs
+SCRATCH_REGISTERS = {
+    "endFrame": "R14",
+    "retAddr": "R15",
+}
+# lowercase first characters never clash with the predefined symbols
+_FIRST_CHARACTERS = string.ascii_lowercase
+_NEXT_CHARACTERS = string.ascii_lowercase + string.digits + "_"
+_SYMBOL_PATTERN = re.compile(r"^([@(])([A-Za-z_.$:][\w.$:]*)", re.MULTILINE)
+# blank lines and comment lines, the per command comments name the
+# original symbols and would keep most of the asm size
+_COMMENT_PATTERN = re.compile(r"^(?://.*)?(?:\n|\Z)", re.MULTILINE)
+
+
+def short_name(index: int) -> str:
+    """
+    Dense numbering of the short names: a..z, then aa, ab...
+    """
+    name = _FIRST_CHARACTERS[index % len(_FIRST_CHARACTERS)]
+    index //= len(_FIRST_CHARACTERS)
+    while index:
+        index -= 1
+        name += _NEXT_CHARACTERS[index % len(_NEXT_CHARACTERS)]
+        index //= len(_NEXT_CHARACTERS)
+    return name
+
+
+class SymbolShortener:
+    """
+    Renames the labels and variables of asm code to short names in the order
+    of their first appearance, so code can be renamed chunk by chunk, and
+    drops the comments and blank lines. The variables of SCRATCH_REGISTERS
+    become registers, predefined symbols are kept. Counts the asm size and
+    the symbol name size before and after renaming. Renaming doesn't change
+    the number of symbols the assembler has to resolve.
+    """
+
+    def __init__(self):
+        self.names = {}
+        self.bytes_before = 0
+        self.bytes_after = 0
+        self._next_index = 0
+
+    def rename(self, asm_code: str) -> str:
+        renamed = _SYMBOL_PATTERN.sub(
+            self._rename_symbol, _COMMENT_PATTERN.sub("", asm_code)
+        )
+        self.bytes_before += len(asm_code.encode())
+        self.bytes_after += len(renamed.encode())
+        return renamed
+
+    def _rename_symbol(self, match) -> str:
+        symbol = match[2]
+        name = self.names.get(symbol)
+        if name is None:
+            if symbol in PREDEFINED_SYMBOLS:
+                return match[0]
+            name = SCRATCH_REGISTERS.get(symbol)
+            if name is None:
+                name = short_name(self._next_index)
+                self._next_index += 1
+            self.names[symbol] = name
+        return match[1] + name
+
+    @property
+    def symbol_map(self) -> dict:
+        """
+        Short name -> original name.
+        """
+        return {
+            name: symbol
+            for symbol, name in self.names.items()
+            if name not in PREDEFINED_SYMBOLS
+        }
+
+    def write_symbol_map(self, map_path: Path):
+        map_path.write_text(json.dumps(self.symbol_map, indent=1) + "\n")
+
+    def report(self) -> str:
+        symbol_map = self.symbol_map
+        return (
+            f"asm bytes: {self.bytes_before} -> {self.bytes_after}\n"
+            f"symbols: {len(symbol_map)} renamed,"
+            f" {len(self.names) - len(symbol_map)} replaced by scratch registers\n"
+            f"symbol name bytes: {sum(len(symbol) for symbol in symbol_map.values())}"
+            f" -> {sum(len(name) for name in symbol_map)}\n"
+        )
+
+
+class ShortSymbolSink(OutputSink):
+    """
+    Renames the symbols of the asm with shortener before passing it to sink,
+    lines split between chunks are held back until they are complete.
+    """
+
+    def __init__(
+        self,
+        sink: OutputSink,
+        shortener: SymbolShortener = None,
+        buffer_size: int = DEFAULT_BUFFER_SIZE,
+    ):
+        super().__init__(buffer_size)
+        self.sink = sink
+        self.shortener = shortener if shortener is not None else SymbolShortener()
+        self._partial_line = ""
+
+    def _write_chunk(self, chunk: str):
+        text = self._partial_line + chunk
+        end = text.rfind("\n") + 1
+        self._partial_line = text[end:]
+        self.sink.write(self.shortener.rename(text[:end]))
+
+    def _close(self):
+        self.sink.write(self.shortener.rename(self._partial_line))
+        self.sink.close()
+
+    def _abort(self):
+        self.sink.abort()
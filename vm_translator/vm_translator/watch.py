@@ -0,0 +1,263 @@
+import argparse
+import json
+import os
+import socket
+import socketserver
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+from vm_translator.code_writer import (
+    CodeShape,
+    COMPACT_SHAPE,
+    FAST_SHAPE,
+    HACK_ROM_SIZE,
+)
+from vm_translator.linker import link
+from vm_translator.objects import ObjectFile, compile_file
+from vm_translator.VMTranslator import translate
+
+
+DEFAULT_POLL_INTERVAL = 0.5
+
+
+@dataclass
+class Fragment:
+    """
+    ObjectFile of one VM file, signature is (mtime, size) of the file. The
+    parsed commands are not kept: relinking only needs the translated
+    object, and a changed file is parsed again anyway.
+    """
+
+    signature: tuple
+    object_file: ObjectFile
+
+
+class IncrementalBuild:
+    """
+    Keeps a Fragment per .vm file of project_dir. refresh() retranslates the
+    files whose modification time or size changed, link() joins the fragments
+    into the same program a full translation of the directory produces.
+    """
+
+    def __init__(
+        self,
+        project_dir: Path,
+        asm_path: Path = None,
+        default_shape: CodeShape = FAST_SHAPE,
+        rom_budget: int = HACK_ROM_SIZE,
+    ):
+        self.project_dir = project_dir
+        self.asm_path = asm_path or project_dir / f"{project_dir.name}.asm"
+        self.default_shape = default_shape
+        self.rom_budget = rom_budget
+        self.fragments = {}
+        self.code_size = None
+
+    def refresh(self) -> list:
+        """
+        Returns the translated and the removed files.
+        """
+        changed = []
+        fragments = {}
+        for vm_file in self.project_dir.glob("**/*.vm"):
+            stat = vm_file.stat()
+            signature = (stat.st_mtime_ns, stat.st_size)
+            fragment = self.fragments.get(vm_file)
+            if fragment is None or fragment.signature != signature:
+                fragment = Fragment(
+                    signature, compile_file(vm_file, self.default_shape)
+                )
+                changed.append(vm_file)
+            fragments[vm_file] = fragment
+        changed += [vm_file for vm_file in self.fragments if vm_file not in fragments]
+        self.fragments = fragments
+        return changed
+
+    def link(self, sink=None):
+        """
+        Writes the program to sink, asm_path by default. Calls of undefined
+        functions are allowed, as in a full translation.
+        """
+        self.code_size = link(
+            [fragment.object_file for fragment in self.fragments.values()],
+            self.asm_path,
+            sink,
+            default_shape=self.default_shape,
+            rom_budget=self.rom_budget,
+            allow_unresolved=True,
+        )
+
+
+class WatchDaemon:
+    """
+    Polls an IncrementalBuild every poll_interval seconds and relinks its
+    asm when a file changed. With socket_path it also answers JSON line
+    requests on a UNIX socket:
+    - {"request": "translate", "sources": {file name: VM code}, "bootstrap": true}
+    - {"request": "build"}: poll now, answers the changed files
+    - {"request": "status"}
+    Every answer has "ok", failed requests an "error" message.
+    """
+
+    def __init__(
+        self,
+        build: IncrementalBuild,
+        poll_interval: float = DEFAULT_POLL_INTERVAL,
+        socket_path: Path = None,
+        log=sys.stderr,
+    ):
+        self.build = build
+        self.poll_interval = poll_interval
+        self.socket_path = socket_path
+        self.log = log
+        self.linked = False
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._server = None
+        self._last_error = None
+
+    def poll_once(self) -> list:
+        with self._lock:
+            start = time.perf_counter()
+            changed = self.build.refresh()
+            if changed or not self.linked:
+                self.build.link()
+                self.linked = True
+                self._log(
+                    f"linked {self.build.asm_path} ({self.build.code_size.total} words)"
+                    f" after {len(changed)} changed files"
+                    f" in {1000 * (time.perf_counter() - start):.1f} ms"
+                )
+            return changed
+
+    def serve_forever(self):
+        if self.socket_path:
+            self._start_server()
+        try:
+            while not self._stopped.is_set():
+                try:
+                    self.poll_once()
+                    self._last_error = None
+                except Exception as error:
+                    if str(error) != self._last_error:
+                        self._log(f"build failed: {error}")
+                    self._last_error = str(error)
+                self._stopped.wait(self.poll_interval)
+        finally:
+            self._stop_server()
+
+    def stop(self):
+        self._stopped.set()
+
+    def handle_request(self, request: dict) -> dict:
+        try:
+            kind = request.get("request")
+            if kind == "translate":
+                result = translate(
+                    request["sources"],
+                    request.get("bootstrap", True),
+                    default_shape=self.build.default_shape,
+                    rom_budget=self.build.rom_budget,
+                )
+                return {
+                    "ok": True,
+                    "asm": result.asm,
+                    "rom_words": result.code_size.total,
+                }
+            if kind == "build":
+                changed = self.poll_once()
+                return {
+                    "ok": True,
+                    "changed": [str(vm_file) for vm_file in changed],
+                    "asm_path": str(self.build.asm_path),
+                    "rom_words": self.build.code_size.total,
+                }
+            if kind == "status":
+                return {
+                    "ok": True,
+                    "files": [
+                        fragment.object_file.namespace
+                        for fragment in self.build.fragments.values()
+                    ],
+                    "linked": self.linked,
+                }
+            return {"ok": False, "error": f"unknown request {kind}"}
+        except Exception as error:
+            return {"ok": False, "error": f"{type(error).__name__}: {error}"}
+
+    def _start_server(self):
+        daemon = self
+
+        class RequestHandler(socketserver.StreamRequestHandler):
+            def handle(self):
+                for line in self.rfile:
+                    try:
+                        answer = daemon.handle_request(json.loads(line))
+                    except json.JSONDecodeError as error:
+                        answer = {"ok": False, "error": f"invalid JSON: {error}"}
+                    self.wfile.write(json.dumps(answer).encode() + b"\n")
+
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        self._server = socketserver.ThreadingUnixStreamServer(
+            str(self.socket_path), RequestHandler
+        )
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        self._log(f"listening on {self.socket_path}")
+
+    def _stop_server(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            os.unlink(self.socket_path)
+            self._server = None
+
+    def _log(self, message: str):
+        print(message, file=self.log, flush=True)
+
+
+def send_request(socket_path: Path, request: dict) -> dict:
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(str(socket_path))
+        client.sendall(json.dumps(request).encode() + b"\n")
+        with client.makefile("rb") as answer:
+            return json.loads(answer.readline())
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(
+        description="Watch a VM project directory and keep its ASM file up to date"
+    )
+    arg_parser.add_argument("path", type=Path, help="directory of VM files")
+    arg_parser.add_argument("-o", "--output", type=Path, help="output ASM file")
+    arg_parser.add_argument(
+        "--interval", type=float, default=DEFAULT_POLL_INTERVAL, help="poll seconds"
+    )
+    arg_parser.add_argument(
+        "--socket", type=Path, help="answer translate requests on this UNIX socket"
+    )
+    arg_parser.add_argument(
+        "-Os",
+        dest="optimize_size",
+        action="store_true",
+        help="use the most compact code shapes everywhere",
+    )
+    args = arg_parser.parse_args()
+
+    watch_daemon = WatchDaemon(
+        IncrementalBuild(
+            args.path,
+            args.output,
+            COMPACT_SHAPE if args.optimize_size else FAST_SHAPE,
+        ),
+        args.interval,
+        args.socket,
+    )
+    try:
+        watch_daemon.serve_forever()
+    except KeyboardInterrupt:
+        pass